@@ -0,0 +1,266 @@
+import sys
+sys.path.append('../')
+
+# ==
+import re
+import time
+import math
+import hashlib
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+from modules.core import (
+    PresentationOutline, SectionOutline, MetaSlides, ContentSlides,
+    TitleSlide, AgendaSlide, SectionHeader, SectionTransitionSlides, SectionTransitionSlide, DetailedSectionHeader, ThankYouSlide,
+    SimpleContentSlide, TwoColumnsSlide, QuoteSlide, ImpressionSlide
+)
+from modules.components import set_component, reset_components
+from modules.search import CachedSearch, SearchScheduler
+
+# ==
+search_result_marker = "Fake search result"
+
+# == Utils functions
+def get_seed(text):
+    return int(hashlib.sha256(text.encode("utf-8")).hexdigest()[:8], 16)
+
+def make_sentence(seed, num_words = 12):
+    words = ["data", "model", "market", "growth", "energy", "design", "system", "network", "policy", "signal", "value", "risk"]
+
+    return " ".join(words[(seed + word_index * 7) % len(words)] for word_index in range(num_words)).capitalize() + "."
+
+def make_bullets(seed, num_bullets = 4):
+    # Mostly bullets, every third line is a paragraph without bullet
+    return "\n".join(f"{'>' if bullet_index % 3 == 2 else '-'} {make_sentence(seed + bullet_index)}" for bullet_index in range(num_bullets))
+
+def get_prompt_text(prompt_value):
+    return "\n".join(str(message.content) for message in prompt_value.to_messages())
+
+# == Fake clients
+class FakeChatModel():
+    # Stands in for ChatBedrock: deterministic structured outputs and tool calls, after a configurable latency
+    def __init__(self, latency = 0.05, num_sections = 5, slides_per_section = 3, search_rounds = 1):
+        self.latency = latency
+        self.num_sections = num_sections
+        self.slides_per_section = slides_per_section
+        self.search_rounds = search_rounds
+
+    def _make_outline(self, text):
+        seed = get_seed(text)
+
+        return PresentationOutline(
+            title = f"Presentation {seed % 1000}",
+            sections = [
+                SectionOutline(
+                    title = f"Section {section_index + 1} on {make_sentence(seed + section_index, 3)[:-1]}",
+                    objective = make_sentence(seed + section_index),
+                    subsections_title = [make_sentence(seed + section_index + subsection_index, 4)[:-1] for subsection_index in range(3)]
+                )
+                for section_index in range(self.num_sections)
+            ]
+        )
+
+    def _make_meta_slides(self, text):
+        section_titles = re.findall(r"^Section \d+: (.*)$", text, flags = re.MULTILINE) or [f"Section {section_index + 1}" for section_index in range(self.num_sections)]
+
+        return MetaSlides(
+            title_slide = TitleSlide(
+                master_title = "Fake presentation",
+                subtitle = make_sentence(get_seed(text), 6)
+            ),
+
+            agenda_slide = AgendaSlide(
+                sections_header = [SectionHeader(id = str(section_index + 1), title = title) for section_index, title in enumerate(section_titles)]
+            ),
+
+            section_transition_slides = SectionTransitionSlides(
+                slides = [
+                    SectionTransitionSlide(
+                        section_header = DetailedSectionHeader(id = str(section_index + 1), title = title, subtitle = make_sentence(get_seed(title), 5)),
+                        image = make_sentence(get_seed(title) + 1, 8)
+                    )
+                    for section_index, title in enumerate(section_titles)
+                ]
+            ),
+
+            thank_you_slide = ThankYouSlide(
+                thank_you_text = "Thank you!",
+                additional_info = "Questions?",
+                contact_information = "presenter@example.com"
+            )
+        )
+
+    def _make_content_slides(self, text):
+        seed = get_seed(text)
+        slide_makers = [
+            lambda slide_seed: SimpleContentSlide(title = make_sentence(slide_seed, 4)[:-1], content = make_bullets(slide_seed)),
+            lambda slide_seed: TwoColumnsSlide(
+                title = make_sentence(slide_seed, 4)[:-1],
+                column1_title = "Before", column1_content = make_bullets(slide_seed, 3),
+                column2_title = "After", column2_content = make_bullets(slide_seed + 1, 3)
+            ),
+            lambda slide_seed: QuoteSlide(quote = make_sentence(slide_seed), author = "Someone Famous"),
+            lambda slide_seed: ImpressionSlide(impression_text = f"{slide_seed % 100}%", description = make_sentence(slide_seed))
+        ]
+
+        return ContentSlides(
+            slides = [slide_makers[slide_index % len(slide_makers)](seed + slide_index) for slide_index in range(self.slides_per_section)]
+        )
+
+    def with_structured_output(self, schema):
+        makers = {
+            PresentationOutline: self._make_outline,
+            MetaSlides: self._make_meta_slides,
+            ContentSlides: self._make_content_slides
+        }
+
+        def invoke(prompt_value):
+            time.sleep(self.latency)
+
+            return makers[schema](get_prompt_text(prompt_value))
+
+        return RunnableLambda(invoke)
+
+    def bind_tools(self, tools):
+        tool_name = getattr(tools[0], "name", "duckduckgo_search")
+
+        def invoke(prompt_value):
+            time.sleep(self.latency)
+
+            text = get_prompt_text(prompt_value)
+
+            # Keep asking for searches until enough results are in the supporting documents
+            if text.count(search_result_marker) >= self.search_rounds:
+                return AIMessage(content = "The documents are sufficient.")
+
+            section_title = re.search(r"Section \d+: (.*)", text)
+            query = section_title.group(1) if section_title is not None else "background"
+
+            return AIMessage(
+                content = "More background is needed.",
+                tool_calls = [{"name": tool_name, "args": {"query": f"{query} round {text.count(search_result_marker)}"}, "id": f"call_{get_seed(text)}"}]
+            )
+
+        return RunnableLambda(invoke)
+
+class FakeSearchTool():
+    name = "duckduckgo_search"
+
+    def __init__(self, latency = 0.02, num_sentences = 20):
+        self.latency = latency
+        self.num_sentences = num_sentences
+
+    def invoke(self, query):
+        time.sleep(self.latency)
+
+        seed = get_seed(query)
+
+        return f"{search_result_marker} for {query}. " + " ".join(make_sentence(seed + sentence_index) for sentence_index in range(self.num_sentences))
+
+class HashEmbeddings(Embeddings):
+    # Feature hashing of the words, texts sharing words get similar vectors
+    def __init__(self, dimensions = 256):
+        self.dimensions = dimensions
+
+    def _embed(self, text):
+        vector = [0.0] * self.dimensions
+
+        for word in re.findall(r"\w+", text.lower()):
+            word_hash = get_seed(word)
+            vector[word_hash % self.dimensions] += 1.0 if word_hash & (1 << 31) else -1.0
+
+        norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+
+        return [value / norm for value in vector]
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+class NullCache():
+    # Every lookup misses, so repeated benchmark runs pay for every search
+    def get(self, key):
+        return None
+
+    def get_many(self, keys):
+        return {}
+
+    def set(self, key, value):
+        pass
+
+    def set_many(self, values):
+        pass
+
+# ==
+def install_fakes(llm_latency = 0.05, search_latency = 0.02, num_sections = 5, slides_per_section = 3, search_rounds = 1):
+    # Everything built from these clients (structured output makers, search scheduler) is rebuilt on next use
+    reset_components()
+
+    llm = FakeChatModel(
+        latency = llm_latency,
+        num_sections = num_sections,
+        slides_per_section = slides_per_section,
+        search_rounds = search_rounds
+    )
+
+    search_tool = FakeSearchTool(
+        latency = search_latency
+    )
+
+    set_component("llm", llm)
+    set_component("search_tool", search_tool)
+    set_component("embeddings", HashEmbeddings())
+
+    set_component("search_scheduler", SearchScheduler(
+        search = CachedSearch(
+            search_tool = search_tool,
+            cache = NullCache()
+        ),
+        rate = 1000.0,
+        burst = 1000
+    ))
+
+    return llm, search_tool
+
+def make_template(template_file):
+    # A template with the 8 prototype slides presentation2pptx expects, built from python-pptx's default layouts
+    from pptx import Presentation
+
+    template = Presentation()
+
+    # Title, Agenda, Section Transition, Thank You, Simple Content, Two Columns, Quote, Impression
+    for layout_index in [0, 4, 4, 7, 1, 4, 0, 2]:
+        template.slides.add_slide(template.slide_layouts[layout_index])
+
+    template.save(template_file)
+
+    return template_file
+
+def make_deck(num_slides, num_sections = 2):
+    # The default layouts only have room for 2 sections on the agenda slide
+    from modules.core import SlidesgenPresentation
+
+    llm = FakeChatModel(
+        num_sections = num_sections,
+        slides_per_section = max(1, (num_slides - 3 - num_sections) // num_sections)
+    )
+
+    outline = llm._make_outline("deck")
+    meta_slides = llm._make_meta_slides(outline.to_str())
+
+    slides = [meta_slides.title_slide, meta_slides.agenda_slide]
+
+    for section_index, section in enumerate(outline.sections):
+        slides.append(meta_slides.section_transition_slides.slides[section_index])
+        slides.extend(llm._make_content_slides(section.to_str(section_index + 1)).slides)
+
+    slides.append(meta_slides.thank_you_slide)
+
+    presentation = SlidesgenPresentation()
+    presentation.slides = slides
+
+    return presentation
@@ -0,0 +1,85 @@
+import sys
+sys.path.append('../')
+
+# ==
+from lxml import etree
+from pptx import Presentation
+
+from modules import converter
+
+# == Reference implementation
+def set_formatted_content_reference(shape, content):
+    # set_formatted_content as it was, one python-pptx property call at a time, kept to check the fast path against
+    if not shape.has_text_frame:
+        return
+
+    text_frame = shape.text_frame
+
+    for _ in range(len(text_frame.paragraphs)):
+        p = text_frame.paragraphs[0]
+        text_frame._element.remove(p._element)
+
+    lines = content.strip().split("\n")
+    for line in lines:
+        if line.startswith("-"):
+            p = text_frame.add_paragraph()
+            p.text = line[1:].strip()
+            p.level = 0
+            p.font.bold = None
+            p.font.size = None
+            p.space_after = 0
+            p.space_before = 0
+            p.alignment = None
+            p._element.set("marL", "0")
+
+        elif line.startswith(">"):
+            p = text_frame.add_paragraph()
+            p.text = line[1:].strip()
+            p.level = 0
+
+            # remove_all("buChar") without its "a:" prefix raised, what it meant to do
+            pPr = p._element.get_or_add_pPr()
+            for buChar in pPr.findall(f"{{{pPr.nsmap['a']}}}buChar"):
+                pPr.remove(buChar)
+
+        else:
+            p = text_frame.add_paragraph()
+            p.text = line.strip()
+            p.level = 0
+
+def render_with(set_formatted_content, renderer, presentation, output_file):
+    original_set_formatted_content = converter.set_formatted_content
+    converter.set_formatted_content = set_formatted_content
+
+    try:
+        renderer.render(presentation, output_file)
+
+    finally:
+        converter.set_formatted_content = original_set_formatted_content
+
+def get_slides_xml(pptx_file):
+    return [etree.tostring(slide._element) for slide in Presentation(pptx_file).slides]
+
+def check_same_output(renderer, presentation, reference_file, output_file):
+    render_with(set_formatted_content_reference, renderer, presentation, reference_file)
+    renderer.render(presentation, output_file)
+
+    reference_slides = get_slides_xml(reference_file)
+    slides = get_slides_xml(output_file)
+
+    mismatches = [slide_index for slide_index, (reference_slide, slide) in enumerate(zip(reference_slides, slides)) if reference_slide != slide]
+
+    if len(reference_slides) != len(slides) or len(mismatches) > 0:
+        raise AssertionError(f"Fast formatting differs from the reference on slides {mismatches}")
+
+def collect_text_frames(renderer, presentation, output_file):
+    # Renders the deck once and returns every (shape, text) the renderer filled, to time the filling alone
+    text_frames = []
+
+    render_with(lambda shape, content: text_frames.append((shape, content)), renderer, presentation, output_file)
+
+    return text_frames
+
+def fill_text_frames(set_formatted_content, text_frames):
+    for shape, content in text_frames:
+        set_formatted_content(shape, content)
@@ -0,0 +1,339 @@
+import os
+import sys
+sys.path.append('../')
+
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+os.environ.setdefault('ANONYMIZED_TELEMETRY', 'False')
+
+# ==
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+
+from langchain_core.documents import Document
+
+from benchmarks.fakes import install_fakes, make_template, make_deck, make_sentence
+
+# ==
+default_baseline_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+# == Utils functions
+def percentile(values, q):
+    # Linear interpolation between the closest ranks
+    sorted_values = sorted(values)
+    position = (len(sorted_values) - 1) * q
+    lower_index = int(position)
+    upper_index = min(lower_index + 1, len(sorted_values) - 1)
+
+    return sorted_values[lower_index] + (sorted_values[upper_index] - sorted_values[lower_index]) * (position - lower_index)
+
+def summarize(durations, num_items, unit):
+    mean_duration = sum(durations) / len(durations)
+
+    return {
+        "runs": len(durations),
+        "mean": mean_duration,
+        "p50": percentile(durations, 0.5),
+        "p90": percentile(durations, 0.9),
+        "p99": percentile(durations, 0.99),
+        "min": min(durations),
+        "max": max(durations),
+        "throughput": num_items / mean_duration if mean_duration > 0 else float("inf"),
+        "unit": unit
+    }
+
+def measure(run_once, repeat, warmup = 1, setup = None):
+    # setup runs outside of the timed section and returns what run_once needs
+    durations = []
+
+    for run_index in range(warmup + repeat):
+        state = setup() if setup is not None else None
+
+        start_time = time.perf_counter()
+        run_once(state)
+        duration = time.perf_counter() - start_time
+
+        if run_index >= warmup:
+            durations.append(duration)
+
+    return durations
+
+# == Benchmarks
+def benchmark_pipeline(args):
+    from modules.core import make_presentation
+
+    install_fakes(
+        llm_latency = args.llm_latency,
+        search_latency = args.search_latency,
+        num_sections = args.num_sections
+    )
+
+    provided_documents = [Document(page_content = make_sentence(document_index, 200)) for document_index in range(10)]
+
+    durations = measure(
+        run_once = lambda _: make_presentation(
+            user_instruction = "Make a presentation about renewable energy",
+            provided_documents = provided_documents,
+            max_concurrency = args.max_concurrency
+        ),
+        repeat = args.repeat
+    )
+
+    return summarize(durations, num_items = 1, unit = "decks")
+
+def benchmark_ingestion(args):
+    from modules.components import get_embeddings
+    from modules.vector_stores import ChromaDB
+    from modules.ingestion import BulkIngestor
+
+    install_fakes()
+
+    work_directory = tempfile.mkdtemp(prefix = "slidesgen_ingestion_")
+    documents_directory = os.path.join(work_directory, "documents")
+    os.makedirs(documents_directory)
+
+    # One file per page of about 3000 characters
+    for page_index in range(args.num_pages):
+        with open(os.path.join(documents_directory, f"page_{page_index}.txt"), 'w', encoding = "utf-8") as file:
+            file.write(f"Page {page_index}. " + " ".join(make_sentence(page_index * 100 + sentence_index) for sentence_index in range(40)))
+
+    def make_vector_store():
+        persist_directory = tempfile.mkdtemp(dir = work_directory)
+
+        return ChromaDB(
+            collection_name = "benchmark",
+            embeddings_provider = None,
+            embeddings_model_name = None,
+            persist_directory = persist_directory,
+            embeddings = get_embeddings()
+        )
+
+    try:
+        durations = measure(
+            run_once = lambda vector_store: BulkIngestor(
+                vector_store = vector_store,
+                num_workers = args.workers
+            ).ingest([documents_directory]),
+            setup = make_vector_store,
+            repeat = args.repeat
+        )
+
+    finally:
+        shutil.rmtree(work_directory, ignore_errors = True)
+
+    return summarize(durations, num_items = args.num_pages, unit = "pages")
+
+def benchmark_export(args):
+    from modules.converter import presentation2pptx
+
+    work_directory = tempfile.mkdtemp(prefix = "slidesgen_export_")
+    template_file = make_template(os.path.join(work_directory, "template.pptx"))
+
+    presentation = make_deck(args.num_slides)
+
+    try:
+        durations = measure(
+            run_once = lambda _: presentation2pptx(
+                presentation = presentation,
+                template_file = template_file,
+                output_file = os.path.join(work_directory, "output.pptx")
+            ),
+            repeat = args.repeat
+        )
+
+    finally:
+        shutil.rmtree(work_directory, ignore_errors = True)
+
+    return summarize(durations, num_items = len(presentation.slides), unit = "slides")
+
+def benchmark_export_lean(args):
+    # Same deck as the export benchmark, without prototype slides and written to memory
+    from modules.converter import PresentationRenderer
+
+    work_directory = tempfile.mkdtemp(prefix = "slidesgen_export_")
+    renderer = PresentationRenderer(make_template(os.path.join(work_directory, "template.pptx")))
+
+    presentation = make_deck(args.num_slides)
+
+    try:
+        durations = measure(
+            run_once = lambda _: renderer.render_to_bytes(presentation),
+            repeat = args.repeat
+        )
+
+    finally:
+        shutil.rmtree(work_directory, ignore_errors = True)
+
+    result = summarize(durations, num_items = len(presentation.slides), unit = "slides")
+    result["output_bytes"] = len(renderer.render_to_bytes(presentation))
+
+    return result
+
+def benchmark_formatting(args):
+    # Text filling of a large deck, with the fast path against the reference one property call at a time
+    from modules.converter import PresentationRenderer, set_formatted_content
+    from benchmarks.formatting import set_formatted_content_reference, check_same_output, collect_text_frames, fill_text_frames
+
+    work_directory = tempfile.mkdtemp(prefix = "slidesgen_formatting_")
+    renderer = PresentationRenderer(make_template(os.path.join(work_directory, "template.pptx")))
+
+    presentation = make_deck(args.num_large_slides)
+    output_file = os.path.join(work_directory, "output.pptx")
+
+    try:
+        check_same_output(renderer, presentation, os.path.join(work_directory, "reference.pptx"), output_file)
+
+        text_frames = collect_text_frames(renderer, presentation, output_file)
+
+    finally:
+        shutil.rmtree(work_directory, ignore_errors = True)
+
+    reference_durations = measure(
+        run_once = lambda _: fill_text_frames(set_formatted_content_reference, text_frames),
+        repeat = args.repeat
+    )
+
+    durations = measure(
+        run_once = lambda _: fill_text_frames(set_formatted_content, text_frames),
+        repeat = args.repeat
+    )
+
+    result = summarize(durations, num_items = len(presentation.slides), unit = "slides")
+    result["speedup"] = percentile(reference_durations, 0.5) / result["p50"]
+
+    return result
+
+def make_serialization_benchmark(encoding, operation):
+    # Encode or decode throughput of a large deck, in memory
+    def benchmark_serialization(args):
+        from modules import serialization
+
+        encode = getattr(serialization, f"encode_{encoding}")
+        decode = getattr(serialization, f"decode_{encoding}")
+
+        presentation = make_deck(args.num_serialized_slides)
+        data = encode(presentation)
+
+        if decode(data) != presentation:
+            raise RuntimeError(f"{encoding} does not round-trip the deck")
+
+        durations = measure(
+            run_once = (lambda _: encode(presentation)) if operation == "encode" else (lambda _: decode(data)),
+            repeat = args.repeat
+        )
+
+        result = summarize(durations, num_items = len(presentation.slides), unit = "slides")
+        result["output_bytes"] = len(data)
+
+        return result
+
+    return benchmark_serialization
+
+benchmarks = {
+    "pipeline": benchmark_pipeline,
+    "ingestion": benchmark_ingestion,
+    "export": benchmark_export,
+    "export_lean": benchmark_export_lean,
+    "formatting": benchmark_formatting,
+    "encode_json": make_serialization_benchmark("json", "encode"),
+    "decode_json": make_serialization_benchmark("json", "decode"),
+    "encode_msgpack": make_serialization_benchmark("msgpack", "encode"),
+    "decode_msgpack": make_serialization_benchmark("msgpack", "decode")
+}
+
+# ==
+def load_baseline(baseline_file):
+    if not os.path.exists(baseline_file):
+        return {}
+
+    with open(baseline_file, 'r', encoding = "utf-8") as file:
+        return json.load(file)["results"]
+
+def save_baseline(baseline_file, results, args):
+    baseline = {
+        "machine": {"python": platform.python_version(), "platform": platform.platform(), "cpu_count": os.cpu_count()},
+        "settings": {key: value for key, value in vars(args).items() if key not in ("benchmarks", "baseline", "save_baseline", "output")},
+        "results": results
+    }
+
+    with open(baseline_file, 'w', encoding = "utf-8") as file:
+        json.dump(baseline, file, indent = 2)
+
+def find_regressions(results, baseline, tolerance):
+    # A benchmark regresses when its median latency is more than `tolerance` above the baseline's
+    regressions = []
+
+    for name, result in results.items():
+        if name in baseline and result["p50"] > baseline[name]["p50"] * (1 + tolerance):
+            regressions.append(f"{name}: p50 {result['p50']:.3f}s vs baseline {baseline[name]['p50']:.3f}s")
+
+    return regressions
+
+def print_results(results, baseline):
+    print(f"{'benchmark':<16}{'p50':>10}{'p90':>10}{'p99':>10}{'mean':>10}{'throughput':>22}{'vs baseline':>14}")
+
+    for name, result in results.items():
+        change = f"{(result['p50'] / baseline[name]['p50'] - 1) * 100:+.1f}%" if name in baseline else "-"
+        throughput = f"{result['throughput']:.2f} {result['unit']}/s"
+
+        print(f"{name:<16}{result['p50']:>9.3f}s{result['p90']:>9.3f}s{result['p99']:>9.3f}s{result['mean']:>9.3f}s{throughput:>22}{change:>14}")
+
+        if "speedup" in result:
+            print(f"{'':<16}{result['speedup']:.2f}x faster than the reference implementation, same slide XML")
+
+def main():
+    parser = argparse.ArgumentParser(description = "Benchmark the pipeline, ingestion and export offline, with fake LLM, embeddings and search.")
+
+    parser.add_argument("benchmarks", nargs = "*", default = list(benchmarks), help = f"Any of {', '.join(benchmarks)}, all by default.")
+    parser.add_argument("--repeat", type = int, default = 5)
+
+    parser.add_argument("--llm-latency", type = float, default = 0.05, help = "Seconds per fake LLM call.")
+    parser.add_argument("--search-latency", type = float, default = 0.02, help = "Seconds per fake search.")
+    parser.add_argument("--num-sections", type = int, default = 5)
+    parser.add_argument("--max-concurrency", type = int, default = 4)
+
+    parser.add_argument("--num-pages", type = int, default = 200)
+    parser.add_argument("--workers", type = int, default = None)
+
+    parser.add_argument("--num-slides", type = int, default = 50)
+    parser.add_argument("--num-large-slides", type = int, default = 300, help = "Slides of the deck used by the formatting benchmark.")
+    parser.add_argument("--num-serialized-slides", type = int, default = 2000, help = "Slides of the deck used by the encode and decode benchmarks.")
+
+    parser.add_argument("--baseline", default = default_baseline_file)
+    parser.add_argument("--save-baseline", action = "store_true", help = "Store these results as the new baseline.")
+    parser.add_argument("--tolerance", type = float, default = 0.2, help = "Allowed slowdown of the median before failing.")
+    parser.add_argument("--output", default = None, help = "Also write the results to this JSON file.")
+
+    args = parser.parse_args()
+
+    unknown_benchmarks = [name for name in args.benchmarks if name not in benchmarks]
+
+    if len(unknown_benchmarks) > 0:
+        parser.error(f"Unknown benchmarks: {', '.join(unknown_benchmarks)}")
+
+    results = {name: benchmarks[name](args) for name in args.benchmarks}
+    baseline = load_baseline(args.baseline)
+
+    print_results(results, baseline)
+
+    if args.output:
+        with open(args.output, 'w', encoding = "utf-8") as file:
+            json.dump(results, file, indent = 2)
+
+    if args.save_baseline:
+        save_baseline(args.baseline, {**baseline, **results}, args)
+        print(f"Baseline saved to {args.baseline}")
+        return
+
+    regressions = find_regressions(results, baseline, args.tolerance)
+
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+
+    sys.exit(1 if len(regressions) > 0 else 0)
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,18 @@
 import os
 
+from uuid import uuid4
+
 from dotenv import load_dotenv
 load_dotenv(
     override = True
 )
 
 # ==
-from langchain_aws.chat_models.bedrock import ChatBedrock
-
-from modules.vector_stores import ChromaDB
+from modules.components import get_vector_store
 from modules.app_logging import setup_logging
 
-from modules.core import make_presentation
+from modules.core import SlidesgenPresentation, iter_presentation
+from modules.serialization import save_presentation
 
 # ==
 logger = setup_logging(__name__)
@@ -34,25 +35,13 @@ def setup_repo_structure():
         
 setup_repo_structure()
 
-# ==
-llm = ChatBedrock(
-    model_id = os.environ['BASE_LLM_ID'],
-    provider = "anthropic",
-    region_name = "us-east-1",
-    temperature = 0.7,
-    aws_access_key_id = os.environ['AWS_ACCESS_KEY'],
-    aws_secret_access_key = os.environ['AWS_SECRET_KEY']
-)
-
-vector_store = ChromaDB(
-    collection_name = "local_pdfs",
-    embeddings_provider = os.environ['EMBEDDING_PROVIDER'],
-    embeddings_model_name = os.environ['EMBEDDING_MODEL_NAME'],
-    persist_directory = os.environ['CHROMA_PERSIST_DIRECTORY']
-)
-   
 # == Utils functions
-def load_documents_from_file(file_path, criteria):                                
+def load_documents_from_file(file_path, criteria):
+    # (documents, file hashes): retrieval only looks at the chunks of the given files, not the whole store
+    from modules.ingestion import get_file_hashes
+
+    vector_store = get_vector_store()
+    
     if file_path.endswith(".txt"):
         vector_store.add_document_from_txt_file(
             document_file = file_path
@@ -62,40 +51,72 @@ def load_documents_from_file(file_path, criteria):
         vector_store.add_document_from_pdf_file(
             document_file = file_path
         )
+        
+    else: # Directory or glob of documents
+        from modules.ingestion import BulkIngestor
+        
+        BulkIngestor(vector_store = vector_store).ingest([file_path])
+    
+    file_hashes = get_file_hashes([file_path])
     
     documents = vector_store.similarity_search(
         query = criteria,
-        num_chunks = 2
+        num_chunks = 2,
+        file_hashes = file_hashes
     )
     
-    return documents
+    return documents, file_hashes
 
 # ==
 def main():  
     while True:
+        run_id = None
+        
         try:
             user_instruction = input("You: ")
                         
             is_uploading_file = input("With file? (y/n): ")
             
             documents = []
+            file_hashes = None
             if is_uploading_file.lower() == "y":
                 file_path = input("File path: ")
                                             
-                documents = load_documents_from_file(
+                documents, file_hashes = load_documents_from_file(
                     file_path = file_path,
                     criteria = user_instruction
                 )
+            
+            # Stage results are checkpointed under the run id, giving the id of a failed run resumes it
+            run_id = input("Run id to resume (empty for a new run): ").strip() or uuid4().hex
+            logger.info(f"Run id: {run_id}")
                             
-            presentation = make_presentation(
+            presentation = SlidesgenPresentation()
+            presentation.slides = []
+            
+            for slide in iter_presentation(
                 user_instruction = user_instruction,
-                provided_documents = documents
-            )
+                provided_documents = documents,
+                retrieval_file_hashes = file_hashes,
+                run_id = run_id
+            ):
+                logger.info(f"=== Slide {len(presentation.slides) + 1} ===\n{slide.to_str()}")
+                
+                presentation.slides.append(slide)
             
             logger.info(f"=== Final Presentation ===\n{presentation.to_str()}")
+            
+            save_presentation(presentation, "outputs/output.json")
+            logger.info("Presentation saved to outputs/output.json")
                                 
         except KeyboardInterrupt:
             break
+        
+        except Exception as e:
+            logger.error(f"Failed to make the presentation: {e}")
+            
+            if run_id is not None:
+                logger.info(f"Finished stages are saved, enter run id {run_id} to resume")
 
 if __name__ == "__main__":
     main()
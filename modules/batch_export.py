@@ -0,0 +1,155 @@
+import os
+import sys
+
+sys.path.append('../')
+
+# ==
+import glob
+import time
+import traceback
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from modules.app_logging import setup_logging
+
+# ==
+logger = setup_logging(__name__)
+
+# Saved presentations, see modules.serialization
+presentation_extensions = (".json", ".jsonl", ".msgpack")
+
+# == Utils functions
+def find_presentation_files(paths):
+    presentation_files = set()
+
+    for path in paths:
+        if os.path.isdir(path):
+            candidates = [candidate for extension in presentation_extensions for candidate in glob.glob(os.path.join(path, "**", f"*{extension}"), recursive = True)]
+
+        elif os.path.isfile(path):
+            candidates = [path]
+
+        else:
+            candidates = glob.glob(path, recursive = True)
+
+        for candidate in candidates:
+            if os.path.isfile(candidate) and candidate.lower().endswith(presentation_extensions):
+                presentation_files.add(os.path.abspath(candidate))
+
+    return sorted(presentation_files)
+
+def make_output_files(presentation_files, output_directory):
+    # <name>.json/.jsonl/.msgpack -> <name>.pptx, files sharing a name get a numbered suffix
+    output_files = {}
+    used_names = set()
+
+    for presentation_file in presentation_files:
+        name = os.path.splitext(os.path.basename(presentation_file))[0]
+        output_name = name
+        suffix = 1
+
+        while output_name in used_names:
+            output_name = f"{name}_{suffix}"
+            suffix += 1
+
+        used_names.add(output_name)
+        output_files[presentation_file] = os.path.join(output_directory, f"{output_name}.pptx")
+
+    return output_files
+
+def export_presentation_file(presentation_file, template_file, output_file, lean = False):
+    # Runs in a worker process, the renderer is cached per process so the template is only parsed once per worker
+    from modules.converter import get_renderer
+    from modules.serialization import load_presentation
+
+    start_time = time.perf_counter()
+
+    try:
+        presentation = load_presentation(presentation_file)
+
+        get_renderer(template_file).render(
+            presentation = presentation,
+            output_file = output_file,
+            lean = lean
+        )
+
+        return {
+            "file": presentation_file,
+            "output_file": output_file,
+            "num_slides": len(presentation.slides),
+            "elapsed_time": time.perf_counter() - start_time,
+            "error": None
+        }
+
+    except Exception as e:
+        return {
+            "file": presentation_file,
+            "output_file": None,
+            "num_slides": 0,
+            "elapsed_time": time.perf_counter() - start_time,
+            "error": "".join(traceback.format_exception_only(type(e), e)).strip()
+        }
+
+# ==
+class BatchExporter():
+    def __init__(self, template_file, output_directory, num_workers = None, max_tasks_per_child = 50, lean = False):
+        self._template_file = os.path.abspath(template_file)
+        self._output_directory = output_directory
+        self._lean = lean
+
+        self._num_workers = num_workers or os.cpu_count()
+        # Workers are replaced after this many decks, so memory held by python-pptx cannot grow without bound
+        self._max_tasks_per_child = max_tasks_per_child
+
+    def export(self, paths):
+        start_time = time.perf_counter()
+
+        presentation_files = find_presentation_files(paths)
+        output_files = make_output_files(presentation_files, self._output_directory)
+
+        os.makedirs(self._output_directory, exist_ok = True)
+
+        logger.info(f"Exporting {len(presentation_files)} presentations with {self._num_workers} workers ...")
+
+        results = []
+
+        with ProcessPoolExecutor(max_workers = self._num_workers, max_tasks_per_child = self._max_tasks_per_child) as executor:
+            futures = {
+                executor.submit(export_presentation_file, presentation_file, self._template_file, output_files[presentation_file], self._lean): presentation_file
+                for presentation_file in presentation_files
+            }
+
+            for future in as_completed(futures):
+                try:
+                    result = future.result()
+
+                except Exception as e: # The worker itself died, e.g. BrokenProcessPool
+                    result = {"file": futures[future], "output_file": None, "num_slides": 0, "elapsed_time": 0.0, "error": f"{type(e).__name__}: {e}"}
+
+                if result["error"] is not None:
+                    logger.error(f"Failed to export {result['file']}: {result['error']}")
+
+                results.append(result)
+
+        elapsed_time = time.perf_counter() - start_time
+
+        exported_results = [result for result in results if result["error"] is None]
+        num_slides = sum(result["num_slides"] for result in exported_results)
+
+        report = {
+            "num_files": len(presentation_files),
+            "num_exported": len(exported_results),
+            "num_failed": len(results) - len(exported_results),
+            "num_slides": num_slides,
+            "elapsed_time": elapsed_time,
+            "decks_per_second": len(exported_results) / elapsed_time if elapsed_time > 0 else 0.0,
+            "slides_per_second": num_slides / elapsed_time if elapsed_time > 0 else 0.0,
+            "errors": sorted(({"file": result["file"], "error": result["error"]} for result in results if result["error"] is not None), key = lambda error: error["file"])
+        }
+
+        logger.info(
+            f"Exported {report['num_exported']}/{report['num_files']} presentations ({num_slides} slides), "
+            f"{report['num_failed']} failed, in {elapsed_time:.1f}s: {report['decks_per_second']:.2f} decks/s"
+        )
+
+        return report
@@ -0,0 +1,264 @@
+import os
+import sys
+
+sys.path.append('../')
+
+# ==
+import json
+import time
+import hashlib
+import threading
+import traceback
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from pydantic import BaseModel, Field, ValidationError
+
+from modules.core import SlidesgenPresentation, iter_presentation, max_concurrency, retrieval_num_chunks
+from modules.components import get_vector_store, get_search_tool, set_component
+from modules.bedrock_llm import configure_llm_concurrency
+from modules.metrics import write_file_atomically
+from modules.app_logging import setup_logging
+
+# ==
+logger = setup_logging(__name__)
+
+status_file_name = "status.json"
+presentation_file_name = "presentation.json"
+pptx_file_name = "presentation.pptx"
+
+# ==
+class BatchJob(BaseModel):
+    id: str | None = Field(
+        default = None,
+        pattern = r"^[\w.-]+$",
+        description = "Id of the job, made from its content when missing. Also names its output directory."
+    )
+
+    instruction: str = Field(
+        description = "Instruction given to make_presentation."
+    )
+
+    documents: list[str] = Field(
+        default_factory = list,
+        description = "Files, directories or globs of .txt and .pdf documents."
+    )
+
+    template: str | None = Field(
+        default = None,
+        description = "Template .pptx file, the runner's one when missing."
+    )
+
+    def get_id(self) -> str:
+        # Stable across attempts, so a job keeps its status and checkpoints when the queue is run again
+        return self.id or hashlib.sha256(self.model_dump_json().encode("utf-8")).hexdigest()[:16]
+
+def read_jobs(jobs_file):
+    # (job id, job, error) per non-empty line, lines that are not a valid job come with their error instead
+    jobs = []
+
+    with open(jobs_file, 'r', encoding = "utf-8") as file:
+        for line_number, line in enumerate(file, start = 1):
+            if not line.strip():
+                continue
+
+            try:
+                job = BatchJob.model_validate_json(line)
+                jobs.append((job.get_id(), job, None))
+
+            except ValidationError as e:
+                jobs.append((f"line-{line_number}", None, f"Invalid job on line {line_number}: {e}"))
+
+    return jobs
+
+# ==
+class BatchJobRunner():
+    def __init__(
+        self, output_directory, template_file, num_workers = 4, max_concurrency = max_concurrency,
+        llm_max_concurrency = None, search_max_concurrency = None, num_chunks = 2, retrieval_num_chunks = retrieval_num_chunks
+    ):
+        # Jobs share every client of the process. llm_max_concurrency and search_max_concurrency bound the calls
+        # in flight across all jobs, whatever num_workers and the stage concurrency of each job (max_concurrency)
+        self._output_directory = output_directory
+        self._template_file = template_file
+        self._num_workers = num_workers
+        self._max_concurrency = max_concurrency
+        self._llm_max_concurrency = llm_max_concurrency
+        self._search_max_concurrency = search_max_concurrency
+        self._num_chunks = num_chunks
+        self._retrieval_num_chunks = retrieval_num_chunks
+
+        # Jobs add their documents to the one shared vector store, one ingestion at a time
+        self._ingestion_lock = threading.Lock()
+
+    def _get_job_file(self, job_id, file_name):
+        return os.path.join(self._output_directory, job_id, file_name)
+
+    def load_status(self, job_id):
+        status_file = self._get_job_file(job_id, status_file_name)
+
+        if not os.path.exists(status_file):
+            return None
+
+        with open(status_file, 'r', encoding = "utf-8") as file:
+            return json.load(file)
+
+    def _write_status(self, job_id, status):
+        write_file_atomically(self._get_job_file(job_id, status_file_name), json.dumps({"job_id": job_id, **status}, indent = 2))
+
+    def configure_limits(self):
+        if self._llm_max_concurrency is not None:
+            configure_llm_concurrency(self._llm_max_concurrency)
+
+        if self._search_max_concurrency is not None:
+            from modules.search import CachedSearch, SearchScheduler
+
+            set_component("search_scheduler", SearchScheduler(
+                search = CachedSearch(
+                    search_tool = get_search_tool()
+                ),
+                max_concurrency = self._search_max_concurrency
+            ))
+
+    def _load_documents(self, job):
+        # (documents, file hashes): only the chunks of the job's own files are retrieved, other jobs' documents
+        # share the store and would also change the inputs a failed job is resumed with
+        if len(job.documents) == 0:
+            return [], []
+
+        from modules.ingestion import BulkIngestor, get_file_hashes
+
+        vector_store = get_vector_store()
+
+        with self._ingestion_lock:
+            BulkIngestor(vector_store = vector_store).ingest(job.documents)
+
+        file_hashes = get_file_hashes(job.documents)
+
+        documents = vector_store.similarity_search(
+            query = job.instruction,
+            num_chunks = self._num_chunks,
+            file_hashes = file_hashes
+        )
+
+        return documents, file_hashes
+
+    def run_job(self, job_id, job, on_slide = None, run_metrics = None):
+        # on_slide is called with each slide as soon as it is made, run_metrics collects the stages and calls of the job
+        from modules.converter import presentation2pptx
+        from modules.serialization import save_presentation
+
+        start_time = time.perf_counter()
+
+        self._write_status(job_id, {"status": "running", "started_at": time.time()})
+
+        try:
+            presentation = SlidesgenPresentation()
+            documents, file_hashes = self._load_documents(job)
+
+            # The job id is also the run id: a failed job resumes from its checkpointed stages when run again
+            for slide in iter_presentation(
+                user_instruction = job.instruction,
+                provided_documents = documents,
+                max_concurrency = self._max_concurrency,
+                retrieval_num_chunks = self._retrieval_num_chunks,
+                retrieval_file_hashes = file_hashes,
+                run_metrics = run_metrics,
+                run_id = job_id
+            ):
+                presentation.slides.append(slide)
+
+                if on_slide is not None:
+                    on_slide(slide)
+
+            presentation_file = self._get_job_file(job_id, presentation_file_name)
+            pptx_file = self._get_job_file(job_id, pptx_file_name)
+
+            save_presentation(presentation, presentation_file)
+
+            presentation2pptx(
+                presentation = presentation,
+                template_file = job.template or self._template_file,
+                output_file = pptx_file
+            )
+
+            status = {
+                "status": "done",
+                "num_slides": len(presentation.slides),
+                "elapsed_time": time.perf_counter() - start_time,
+                "presentation_file": presentation_file,
+                "pptx_file": pptx_file,
+                "error": None
+            }
+
+        except Exception as e:
+            status = {
+                "status": "failed",
+                "num_slides": 0,
+                "elapsed_time": time.perf_counter() - start_time,
+                "error": "".join(traceback.format_exception_only(type(e), e)).strip()
+            }
+
+        self._write_status(job_id, status)
+
+        return status
+
+    def run(self, jobs_file):
+        start_time = time.perf_counter()
+
+        self.configure_limits()
+
+        jobs = {}
+        results = {}
+
+        for job_id, job, error in read_jobs(jobs_file):
+            if job_id in jobs or job_id in results:
+                logger.warning(f"Job {job_id} is listed more than once, it is only run once")
+                continue
+
+            if error is not None:
+                results[job_id] = {"status": "failed", "num_slides": 0, "elapsed_time": 0.0, "error": error}
+                self._write_status(job_id, results[job_id])
+
+            elif (self.load_status(job_id) or {}).get("status") == "done":
+                results[job_id] = {"status": "skipped", "num_slides": 0, "elapsed_time": 0.0, "error": None}
+
+            else:
+                jobs[job_id] = job
+
+        logger.info(f"Running {len(jobs)} jobs with {self._num_workers} workers, {len(results)} already done or invalid ...")
+
+        with ThreadPoolExecutor(max_workers = max(1, self._num_workers)) as executor:
+            futures = {executor.submit(self.run_job, job_id, job): job_id for job_id, job in jobs.items()}
+
+            for future in as_completed(futures):
+                job_id = futures[future]
+                results[job_id] = future.result()
+
+                if results[job_id]["error"] is not None:
+                    logger.error(f"Job {job_id} failed: {results[job_id]['error']}")
+
+                else:
+                    logger.info(f"Job {job_id} done: {results[job_id]['num_slides']} slides in {results[job_id]['elapsed_time']:.1f}s")
+
+        elapsed_time = time.perf_counter() - start_time
+
+        num_done = len([result for result in results.values() if result["status"] == "done"])
+
+        report = {
+            "num_jobs": len(results),
+            "num_done": num_done,
+            "num_skipped": len([result for result in results.values() if result["status"] == "skipped"]),
+            "num_failed": len([result for result in results.values() if result["status"] == "failed"]),
+            "num_slides": sum(result["num_slides"] for result in results.values()),
+            "elapsed_time": elapsed_time,
+            "jobs_per_hour": num_done / elapsed_time * 3600 if elapsed_time > 0 else 0.0,
+            "errors": sorted(({"job_id": job_id, "error": result["error"]} for job_id, result in results.items() if result["error"] is not None), key = lambda error: error["job_id"])
+        }
+
+        logger.info(
+            f"Ran {report['num_done']}/{report['num_jobs']} jobs ({report['num_slides']} slides), {report['num_skipped']} skipped, "
+            f"{report['num_failed']} failed, in {elapsed_time:.1f}s: {report['jobs_per_hour']:.1f} jobs/hour"
+        )
+
+        return report
@@ -1,23 +1,494 @@
+import os
+import json
+import time
+import random
+import asyncio
+import hashlib
 import functools
+import threading
 
-def safe_llm_call(retries = 2, fallback = None):
+from collections import deque
+from contextlib import contextmanager, asynccontextmanager
+
+from modules.caching import SQLiteCache
+from modules.metrics import track, add_count
+from modules.context import estimate_tokens
+from modules.app_logging import setup_logging
+
+# ==
+logger = setup_logging(__name__)
+
+# == LLM response cache
+class LLMCacheMiss(Exception):
+    pass
+
+# off: always call the LLM, on: reuse cached responses, replay: only serve cached responses
+llm_cache_mode = os.environ.get('LLM_CACHE_MODE', 'off').lower()
+
+llm_cache_file = os.environ.get('LLM_CACHE_FILE', 'database/llm_cache.sqlite')
+llm_cache_ttl = float(os.environ['LLM_CACHE_TTL']) if os.environ.get('LLM_CACHE_TTL') else None
+llm_cache_max_entries = int(os.environ.get('LLM_CACHE_MAX_ENTRIES', 10000))
+
+_llm_cache = None
+_llm_cache_lock = threading.Lock()
+
+def configure_llm_cache(mode, cache_file = None, ttl = None, max_entries = None):
+    global llm_cache_mode, llm_cache_file, llm_cache_ttl, llm_cache_max_entries, _llm_cache
+
+    if mode not in ("off", "on", "replay"):
+        raise ValueError(f"Unsupported LLM cache mode: {mode}")
+
+    with _llm_cache_lock:
+        llm_cache_mode = mode
+        llm_cache_file = cache_file or llm_cache_file
+        llm_cache_ttl = ttl if ttl is not None else llm_cache_ttl
+        llm_cache_max_entries = max_entries or llm_cache_max_entries
+
+        _llm_cache = None
+
+def get_llm_cache():
+    global _llm_cache
+
+    if llm_cache_mode == "off":
+        return None
+
+    with _llm_cache_lock:
+        if _llm_cache is None:
+            _llm_cache = SQLiteCache(
+                cache_file = llm_cache_file,
+                max_entries = llm_cache_max_entries,
+                ttl = llm_cache_ttl
+            )
+
+    return _llm_cache
+
+def make_cache_key(llm_or_chains, input):
+    from langchain_core.load import dumpd
+    from langchain_core.prompts import BasePromptTemplate
+    from langchain_core.runnables import RunnableSequence
+
+    steps = llm_or_chains.steps if isinstance(llm_or_chains, RunnableSequence) else [llm_or_chains]
+
+    # Key on the rendered messages rather than the raw input, so template edits invalidate the cache
+    if isinstance(steps[0], BasePromptTemplate):
+        messages = steps[0].invoke(input).to_messages()
+        model_steps = steps[1:]
+
+    else:
+        messages = input
+        model_steps = steps
+
+    # The serialized model carries its id, temperature and bound structured-output schema, secrets are masked
+    payload = json.dumps(
+        {
+            "model": [dumpd(step) for step in model_steps],
+            "messages": dumpd(messages)
+        },
+        sort_keys = True,
+        default = str
+    )
+
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+# == Retry policy
+llm_max_retries = int(os.environ.get('LLM_MAX_RETRIES', 2))
+llm_retry_base_delay = float(os.environ.get('LLM_RETRY_BASE_DELAY', 1.0))
+llm_retry_max_delay = float(os.environ.get('LLM_RETRY_MAX_DELAY', 30.0))
+
+circuit_breaker_failure_rate = float(os.environ.get('CIRCUIT_BREAKER_FAILURE_RATE', 0.5))
+circuit_breaker_window = int(os.environ.get('CIRCUIT_BREAKER_WINDOW', 20))
+circuit_breaker_cooldown = float(os.environ.get('CIRCUIT_BREAKER_COOLDOWN', 30.0))
+
+# Bedrock errors often reach us wrapped in a ValueError by langchain_aws, so match on names and messages too
+fatal_error_markers = ("validationexception", "accessdenied", "unrecognizedclient", "resourcenotfound", "outputparserexception")
+retryable_error_markers = ("throttl", "too many requests", "rate exceeded", "timeout", "timed out", "serviceunavailable", "service unavailable", "modelnotready", "internalserver", "connection")
+
+class LLMCallError(Exception):
+    pass
+
+class CircuitOpenError(LLMCallError):
+    pass
+
+def iter_error_chain(error):
+    seen = set()
+    
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        yield error
+        
+        error = error.__cause__ or error.__context__
+
+def is_retryable_error(error):
+    for chained_error in iter_error_chain(error):
+        if isinstance(chained_error, LLMCacheMiss) or type(chained_error).__name__ == "ValidationError":
+            return False
+        
+        error_code = getattr(chained_error, "response", {}).get("Error", {}).get("Code", "") if isinstance(getattr(chained_error, "response", None), dict) else ""
+        error_text = f"{type(chained_error).__name__} {error_code} {chained_error}".lower()
+        
+        if any(marker in error_text for marker in fatal_error_markers):
+            return False
+        
+        if any(marker in error_text for marker in retryable_error_markers) or isinstance(chained_error, (TimeoutError, ConnectionError)):
+            return True
+        
+    # Unknown errors are still retried, as they always were
+    return True
+
+class RetryPolicy():
+    def __init__(self, max_retries = llm_max_retries, base_delay = llm_retry_base_delay, max_delay = llm_retry_max_delay):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        
+    def get_delay(self, attempt):
+        # Exponential backoff with full jitter, so concurrent callers do not retry in lockstep
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+class CircuitBreaker():
+    def __init__(self, failure_rate = circuit_breaker_failure_rate, window = circuit_breaker_window, cooldown = circuit_breaker_cooldown, min_calls = 5):
+        self._failure_rate = failure_rate
+        self._cooldown = cooldown
+        self._min_calls = min_calls
+        
+        self._outcomes = deque(maxlen = window)
+        self._opened_at = None
+        self._is_half_open = False
+        self._probe_started_at = None
+        
+        self._lock = threading.Lock()
+        
+    @property
+    def is_open(self):
+        with self._lock:
+            return self._opened_at is not None
+        
+    def allow_request(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            
+            now = time.monotonic()
+            
+            if now - self._opened_at < self._cooldown:
+                return False
+            
+            # Cooldown is over: a single probe call goes through, the others are shed until its outcome closes or
+            # opens the circuit again. A probe that never reports back, e.g. cancelled, is replaced after another cooldown
+            if self._probe_started_at is not None and now - self._probe_started_at < self._cooldown:
+                return False
+            
+            self._is_half_open = True
+            self._probe_started_at = now
+            
+            return True
+        
+    def record(self, success):
+        with self._lock:
+            self._outcomes.append(success)
+            
+            if success:
+                self._opened_at = None
+                self._is_half_open = False
+                self._probe_started_at = None
+                return
+            
+            num_failures = sum(1 for outcome in self._outcomes if not outcome)
+            
+            if self._is_half_open or (len(self._outcomes) >= self._min_calls and num_failures / len(self._outcomes) >= self._failure_rate):
+                logger.error(f"Circuit breaker opened after {num_failures}/{len(self._outcomes)} failed LLM calls, shedding load for {self._cooldown}s")
+                
+                self._opened_at = time.monotonic()
+                self._is_half_open = False
+                self._probe_started_at = None
+                self._outcomes.clear()
+
+default_circuit_breaker = CircuitBreaker()
+
+# == LLM call metrics
+llm_call_stats = {
+    "calls": 0,
+    "retries": 0,
+    "failures": 0,
+    "circuit_rejections": 0,
+    "retry_wait_time": 0.0
+}
+
+_llm_call_stats_lock = threading.Lock()
+
+def record_llm_call_stat(name, value = 1):
+    with _llm_call_stats_lock:
+        llm_call_stats[name] += value
+        
+def get_llm_call_stats():
+    with _llm_call_stats_lock:
+        return dict(llm_call_stats)
+
+# == LLM calls
+def safe_llm_call(retries = None, fallback = None, policy = None, circuit_breaker = None):
+    policy = policy or RetryPolicy(max_retries = retries if retries is not None else llm_max_retries)
+    circuit_breaker = circuit_breaker or default_circuit_breaker
+    
+    def get_retry_delay(func, attempt, error):
+        is_retryable = is_retryable_error(error)
+        
+        # Only transient errors say something about the health of the service
+        if is_retryable:
+            circuit_breaker.record(success = False)
+            
+        if not is_retryable or attempt >= policy.max_retries:
+            logger.error(f"Attempt {attempt + 1} failed in {getattr(func, '__name__', func)}, giving up: {error}")
+            return None
+        
+        delay = policy.get_delay(attempt)
+        
+        record_llm_call_stat("retries")
+        record_llm_call_stat("retry_wait_time", delay)
+        
+        add_count("retries")
+        
+        logger.warning(f"Attempt {attempt + 1} failed in {getattr(func, '__name__', func)}, retrying in {delay:.1f}s: {error}")
+        
+        return delay
+    
+    def on_failure(func, error):
+        record_llm_call_stat("failures")
+        
+        if fallback is not None:
+            return fallback
+        
+        if isinstance(error, LLMCallError):
+            raise error
+        
+        raise LLMCallError(f"{getattr(func, '__name__', func)} failed: {error}") from error
+    
+    def on_circuit_open(func):
+        record_llm_call_stat("circuit_rejections")
+        
+        return CircuitOpenError(f"Circuit breaker is open, {getattr(func, '__name__', func)} was not called")
+    
     def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                record_llm_call_stat("calls")
+                
+                for attempt in range(policy.max_retries + 1):
+                    if not circuit_breaker.allow_request():
+                        return on_failure(func, on_circuit_open(func))
+                    
+                    try:
+                        response = await func(*args, **kwargs)
+                        circuit_breaker.record(success = True)
+                        
+                        return response
+                    
+                    except Exception as e:
+                        delay = get_retry_delay(func, attempt, e)
+                        
+                        if delay is None:
+                            return on_failure(func, e)
+                        
+                        await asyncio.sleep(delay)
+                        
+            return async_wrapper
+        
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
-            for attempt in range(retries + 1):
+            record_llm_call_stat("calls")
+            
+            for attempt in range(policy.max_retries + 1):
+                if not circuit_breaker.allow_request():
+                    return on_failure(func, on_circuit_open(func))
+                
                 try:
-                    return func(*args, **kwargs)
+                    response = func(*args, **kwargs)
+                    circuit_breaker.record(success = True)
+                    
+                    return response
                 
                 except Exception as e:
-                    print(f"[ERROR] Attempt {attempt + 1} failed in {func.__name__}: {e}")
+                    delay = get_retry_delay(func, attempt, e)
                     
-            print(f"[ERROR] All {retries + 1} attempts failed.")
-            return fallback
+                    if delay is None:
+                        return on_failure(func, e)
+                    
+                    time.sleep(delay)
         
         return wrapper
     
     return decorator
 
-@safe_llm_call(retries = 2, fallback = None)
-def invoke_llm_or_chains(llm_or_chains, input):
-    return llm_or_chains.invoke(input)
+# == Process-wide limit on LLM calls in flight, shared by every run, 0 for no limit
+llm_max_concurrency = int(os.environ.get('LLM_MAX_CONCURRENCY', 0))
+
+_llm_slots = threading.BoundedSemaphore(llm_max_concurrency) if llm_max_concurrency > 0 else None
+
+def configure_llm_concurrency(max_concurrency):
+    global llm_max_concurrency, _llm_slots
+
+    llm_max_concurrency = max_concurrency or 0
+    _llm_slots = threading.BoundedSemaphore(llm_max_concurrency) if llm_max_concurrency > 0 else None
+
+@contextmanager
+def acquire_llm_slot():
+    # Only held during a call attempt, not while waiting to retry. Time spent waiting is counted on the call
+    llm_slots = _llm_slots
+
+    if llm_slots is None:
+        yield
+        return
+
+    start_time = time.perf_counter()
+    llm_slots.acquire()
+    add_count("slot_wait_time", time.perf_counter() - start_time)
+
+    try:
+        yield
+
+    finally:
+        llm_slots.release()
+
+@asynccontextmanager
+async def aacquire_llm_slot():
+    llm_slots = _llm_slots
+
+    if llm_slots is None:
+        yield
+        return
+
+    # Polled so that the event loop is never blocked and a cancelled wait holds nothing
+    start_time = time.perf_counter()
+
+    while not llm_slots.acquire(blocking = False):
+        await asyncio.sleep(0.01)
+
+    add_count("slot_wait_time", time.perf_counter() - start_time)
+
+    try:
+        yield
+
+    finally:
+        llm_slots.release()
+
+@safe_llm_call()
+def _invoke_llm_or_chains(llm_or_chains, input):
+    with acquire_llm_slot():
+        return llm_or_chains.invoke(input)
+
+@safe_llm_call()
+async def _ainvoke_llm_or_chains(llm_or_chains, input):
+    async with aacquire_llm_slot():
+        return await llm_or_chains.ainvoke(input)
+
+def encode_response(response):
+    # JSON only, never pickle: messages through langchain's message dicts, structured outputs as their fields
+    from langchain_core.messages import BaseMessage, message_to_dict
+
+    if isinstance(response, BaseMessage):
+        entry = {"kind": "message", "value": message_to_dict(response)}
+
+    else:
+        entry = {"kind": "model", "value": response.model_dump(mode = "json")}
+
+    return json.dumps(entry, ensure_ascii = False).encode("utf-8")
+
+def decode_response(cached_response, output_type = None):
+    # Entries that no longer match the current classes are treated as misses rather than errors
+    from langchain_core.messages import messages_from_dict
+    from pydantic import ValidationError
+
+    try:
+        entry = json.loads(cached_response)
+
+        if entry["kind"] == "message":
+            return messages_from_dict([entry["value"]])[0]
+
+        if output_type is not None:
+            return output_type.model_validate(entry["value"])
+
+    except (ValueError, KeyError, TypeError, ValidationError) as e:
+        logger.warning(f"Ignoring unreadable cached LLM response: {type(e).__name__}: {e}")
+
+    return None
+
+def get_cached_response(llm_or_chains, input, output_type = None):
+    llm_cache = get_llm_cache()
+
+    if llm_cache is None:
+        return None, None
+
+    cache_key = make_cache_key(llm_or_chains, input)
+    cached_response = llm_cache.get(cache_key)
+    response = decode_response(cached_response, output_type) if cached_response is not None else None
+
+    if response is None and llm_cache_mode == "replay":
+        raise LLMCacheMiss(f"No cached LLM response for key {cache_key}")
+
+    return cache_key, response
+
+def set_cached_response(cache_key, response):
+    if cache_key is not None and response is not None:
+        get_llm_cache().set(cache_key, encode_response(response))
+
+def count_input_tokens(llm_or_chains, input):
+    from langchain_core.prompts import BasePromptTemplate
+    from langchain_core.runnables import RunnableSequence
+    
+    steps = llm_or_chains.steps if isinstance(llm_or_chains, RunnableSequence) else [llm_or_chains]
+    
+    if isinstance(steps[0], BasePromptTemplate):
+        messages = steps[0].invoke(input).to_messages()
+        
+        return sum(estimate_tokens(str(message.content)) for message in messages)
+    
+    return estimate_tokens(str(input))
+
+def count_output_tokens(response):
+    # Structured outputs come back without usage metadata, their size is estimated from the JSON
+    usage_metadata = getattr(response, "usage_metadata", None)
+    
+    if usage_metadata:
+        return usage_metadata["output_tokens"]
+    
+    if hasattr(response, "model_dump_json"):
+        return estimate_tokens(response.model_dump_json())
+    
+    return estimate_tokens(str(getattr(response, "content", response)))
+
+def record_llm_usage(counts, llm_or_chains, input, response, is_cached):
+    usage_metadata = getattr(response, "usage_metadata", None)
+    
+    counts["cache_hits"] = int(is_cached)
+    counts["input_tokens"] = usage_metadata["input_tokens"] if usage_metadata else count_input_tokens(llm_or_chains, input)
+    counts["output_tokens"] = count_output_tokens(response)
+
+def invoke_llm_or_chains(llm_or_chains, input, output_type = None):
+    # output_type is the pydantic model of structured outputs, needed to read them back from the cache
+    with track("llm", "invoke_llm_or_chains") as counts:
+        cache_key, response = get_cached_response(llm_or_chains, input, output_type)
+        is_cached = response is not None
+
+        if response is None:
+            response = _invoke_llm_or_chains(llm_or_chains, input)
+            
+            set_cached_response(cache_key, response)
+            
+        record_llm_usage(counts, llm_or_chains, input, response, is_cached)
+
+    return response
+
+async def ainvoke_llm_or_chains(llm_or_chains, input, output_type = None):
+    # output_type is the pydantic model of structured outputs, needed to read them back from the cache
+    with track("llm", "ainvoke_llm_or_chains") as counts:
+        cache_key, response = get_cached_response(llm_or_chains, input, output_type)
+        is_cached = response is not None
+
+        if response is None:
+            response = await _ainvoke_llm_or_chains(llm_or_chains, input)
+            
+            set_cached_response(cache_key, response)
+            
+        record_llm_usage(counts, llm_or_chains, input, response, is_cached)
+
+    return response
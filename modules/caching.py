@@ -0,0 +1,133 @@
+import os
+import time
+import sqlite3
+import threading
+
+# ==
+class SQLiteCache():
+    def __init__(self, cache_file, max_entries = 100000, ttl = None):
+        self._max_entries = max_entries
+        self._ttl = ttl
+
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+        cache_directory = os.path.dirname(cache_file)
+
+        if cache_directory and not os.path.exists(cache_directory):
+            os.makedirs(cache_directory, exist_ok = True)
+
+        self._connection = sqlite3.connect(
+            cache_file,
+            check_same_thread = False
+        )
+
+        # WAL lets several processes read while one of them writes
+        self._connection.execute("PRAGMA journal_mode = WAL")
+        self._connection.execute("PRAGMA synchronous = NORMAL")
+
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS cache_accessed_at ON cache (accessed_at)"
+        )
+        self._connection.commit()
+
+    def _is_expired(self, created_at, now):
+        return self._ttl is not None and now - created_at > self._ttl
+
+    def get_many(self, keys):
+        keys = list(dict.fromkeys(keys))
+        now = time.time()
+
+        found = {}
+        expired_keys = []
+
+        with self._lock:
+            # Stay below SQLite's limit on the number of query parameters
+            for batch_start in range(0, len(keys), 500):
+                batch_keys = keys[batch_start:batch_start + 500]
+
+                rows = self._connection.execute(
+                    f"SELECT key, value, created_at FROM cache WHERE key IN ({', '.join('?' * len(batch_keys))})",
+                    batch_keys
+                ).fetchall()
+
+                for key, value, created_at in rows:
+                    if self._is_expired(created_at, now):
+                        expired_keys.append(key)
+
+                    else:
+                        found[key] = value
+
+            if len(found) > 0:
+                self._connection.executemany(
+                    "UPDATE cache SET accessed_at = ? WHERE key = ?",
+                    [(now, key) for key in found]
+                )
+
+            if len(expired_keys) > 0:
+                self._connection.executemany(
+                    "DELETE FROM cache WHERE key = ?",
+                    [(key,) for key in expired_keys]
+                )
+
+            self._connection.commit()
+
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+
+        return found
+
+    def get(self, key, default = None):
+        return self.get_many([key]).get(key, default)
+
+    def set_many(self, items):
+        if len(items) == 0:
+            return
+
+        now = time.time()
+
+        with self._lock:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO cache (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                [(key, value, now, now) for key, value in items.items()]
+            )
+
+            self._evict()
+
+            self._connection.commit()
+
+    def set(self, key, value):
+        self.set_many({key: value})
+
+    def _evict(self):
+        # Least recently used entries go first once the cache is over its size bound
+        num_entries = self._connection.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+        if num_entries <= self._max_entries:
+            return
+
+        self._connection.execute(
+            "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY accessed_at ASC LIMIT ?)",
+            (num_entries - self._max_entries,)
+        )
+
+    def clear(self):
+        with self._lock:
+            self._connection.execute("DELETE FROM cache")
+            self._connection.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self)
+        }
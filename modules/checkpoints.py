@@ -0,0 +1,76 @@
+import os
+import json
+import time
+import hashlib
+
+from functools import lru_cache
+
+from pydantic import TypeAdapter
+
+from modules.metrics import write_file_atomically
+from modules.app_logging import setup_logging
+
+# ==
+logger = setup_logging(__name__)
+
+# Stage results of a run are saved under <directory>/<run id>/
+checkpoints_directory = os.environ.get('CHECKPOINTS_DIRECTORY', 'outputs/runs')
+
+run_file_name = "run.json"
+
+# == Utils functions
+@lru_cache(maxsize = None)
+def get_type_adapter(value_type):
+    return TypeAdapter(value_type)
+
+def make_inputs_hash(inputs):
+    return hashlib.sha256(json.dumps(inputs, sort_keys = True, ensure_ascii = False).encode("utf-8")).hexdigest()
+
+# ==
+class RunCheckpoints():
+    def __init__(self, run_id, directory = None):
+        self.run_id = run_id
+        self.directory = os.path.join(checkpoints_directory if directory is None else directory, run_id)
+
+    def _get_file(self, name):
+        return os.path.join(self.directory, f"{name}.json")
+
+    def start(self, inputs):
+        # A run id can only be resumed with the inputs it was started with, anything else would mix two decks
+        os.makedirs(self.directory, exist_ok = True)
+
+        run_file = os.path.join(self.directory, run_file_name)
+        inputs_hash = make_inputs_hash(inputs)
+
+        if os.path.exists(run_file):
+            with open(run_file, 'r', encoding = "utf-8") as file:
+                run = json.load(file)
+
+            if run["inputs_hash"] != inputs_hash:
+                raise ValueError(f"Run {self.run_id} was started with other inputs, use a new run id")
+
+            logger.info(f"Resuming run {self.run_id}, saved stages: {', '.join(self.list_stages()) or '-'}")
+
+            return True
+
+        write_file_atomically(run_file, json.dumps({"run_id": self.run_id, "started_at": time.time(), "inputs_hash": inputs_hash}, indent = 2).encode("utf-8"))
+
+        return False
+
+    def has(self, name):
+        return os.path.exists(self._get_file(name))
+
+    def list_stages(self):
+        if not os.path.isdir(self.directory):
+            return []
+
+        return sorted(os.path.splitext(file_name)[0] for file_name in os.listdir(self.directory) if file_name.endswith(".json") and file_name != run_file_name)
+
+    def save(self, name, value, value_type):
+        os.makedirs(self.directory, exist_ok = True)
+
+        write_file_atomically(self._get_file(name), get_type_adapter(value_type).dump_json(value))
+
+    def load(self, name, value_type):
+        with open(self._get_file(name), 'rb') as file:
+            return get_type_adapter(value_type).validate_json(file.read())
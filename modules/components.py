@@ -0,0 +1,173 @@
+import os
+import threading
+
+# == Component registry
+# Clients are built on first use and shared by the whole process, heavy imports happen in the factories
+_components = {}
+_components_lock = threading.Lock()
+
+# Each component is built once, under its own lock, so a slow build never blocks lookups of the others
+_build_locks = {}
+
+# Name -> names of the components built from it, e.g. "llm" -> {"presentation_outliner", ...}
+_dependents = {}
+_building = threading.local()
+
+# Name -> version, bumped whenever the component is replaced or invalidated, so a build started before is not kept
+_versions = {}
+
+def _record_dependency(name):
+    # The component this thread is building, if any, is made from `name`
+    building_names = getattr(_building, "names", [])
+
+    if len(building_names) > 0:
+        with _components_lock:
+            _dependents.setdefault(name, set()).add(building_names[-1])
+
+def _invalidate_dependents(name):
+    # Must be called with the components lock held
+    for dependent_name in _dependents.pop(name, set()):
+        _components.pop(dependent_name, None)
+        _versions[dependent_name] = _versions.get(dependent_name, 0) + 1
+        _invalidate_dependents(dependent_name)
+
+def get_component(name, factory):
+    _record_dependency(name)
+
+    with _components_lock:
+        if name in _components:
+            return _components[name]
+
+        build_lock = _build_locks.setdefault(name, threading.Lock())
+
+    with build_lock:
+        with _components_lock:
+            if name in _components:
+                return _components[name]
+
+            version = _versions.get(name, 0)
+
+        if not hasattr(_building, "names"):
+            _building.names = []
+
+        _building.names.append(name)
+
+        try:
+            component = factory()
+
+        finally:
+            _building.names.pop()
+
+        with _components_lock:
+            if _versions.get(name, 0) == version:
+                _components[name] = component
+
+        return component
+
+def set_component(name, component):
+    # Lets callers (tests, benchmarks, services) plug in their own clients before first use.
+    # Components built from the replaced one are rebuilt on next use
+    with _components_lock:
+        _invalidate_dependents(name)
+        _components[name] = component
+        _versions[name] = _versions.get(name, 0) + 1
+
+def reset_components():
+    with _components_lock:
+        for name in set(_components) | set(_build_locks):
+            _versions[name] = _versions.get(name, 0) + 1
+
+        _components.clear()
+        _dependents.clear()
+
+# == Factories
+def make_llm():
+    from langchain_aws.chat_models.bedrock import ChatBedrock
+
+    return ChatBedrock(
+        model_id = os.environ['BASE_LLM_ID'],
+        provider = "anthropic",
+        region_name = "us-east-1",
+        temperature = 0.7,
+        aws_access_key_id = os.environ['AWS_ACCESS_KEY'],
+        aws_secret_access_key = os.environ['AWS_SECRET_KEY']
+    )
+
+def make_embeddings():
+    from modules.embeddings import get_embedding_model
+
+    return get_embedding_model(
+        provider = os.environ['EMBEDDING_PROVIDER'],
+        model_name = os.environ['EMBEDDING_MODEL_NAME']
+    )
+
+def make_vector_store():
+    from modules.vector_stores import ChromaDB
+
+    return ChromaDB(
+        collection_name = "local_pdfs",
+        embeddings_provider = os.environ['EMBEDDING_PROVIDER'],
+        embeddings_model_name = os.environ['EMBEDDING_MODEL_NAME'],
+        persist_directory = os.environ['CHROMA_PERSIST_DIRECTORY'],
+        embeddings = get_embeddings()
+    )
+
+def make_search_tool():
+    from langchain_community.tools import DuckDuckGoSearchRun
+
+    return DuckDuckGoSearchRun(
+        num_results = 3
+    )
+
+def make_search_scheduler():
+    from modules.search import CachedSearch, SearchScheduler
+
+    # Shared by all sections, so concurrent enrichments stay within a single rate budget
+    return SearchScheduler(
+        search = CachedSearch(
+            search_tool = get_search_tool()
+        )
+    )
+
+def make_text_splitter():
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    return RecursiveCharacterTextSplitter(
+        chunk_size = 2048,
+        chunk_overlap = 128
+    )
+
+def make_prompt_registry():
+    from modules.prompts import PromptRegistry
+
+    return PromptRegistry()
+
+def make_context_packer():
+    from modules.context import ContextPacker
+
+    return ContextPacker()
+
+# == Getters
+def get_llm():
+    return get_component("llm", make_llm)
+
+def get_embeddings():
+    return get_component("embeddings", make_embeddings)
+
+def get_vector_store():
+    return get_component("vector_store", make_vector_store)
+
+def get_search_tool():
+    return get_component("search_tool", make_search_tool)
+
+def get_search_scheduler():
+    return get_component("search_scheduler", make_search_scheduler)
+
+def get_text_splitter():
+    return get_component("text_splitter", make_text_splitter)
+
+def get_prompt_registry():
+    return get_component("prompt_registry", make_prompt_registry)
+
+def get_context_packer():
+    return get_component("context_packer", make_context_packer)
@@ -0,0 +1,12 @@
+from concurrent.futures import ThreadPoolExecutor
+
+# ==
+def map_in_order(func, items, max_concurrency = 1):
+    items = list(items)
+
+    if max_concurrency <= 1 or len(items) <= 1:
+        return [func(item) for item in items]
+
+    # executor.map yields results in submission order
+    with ThreadPoolExecutor(max_workers = min(max_concurrency, len(items))) as executor:
+        return list(executor.map(func, items))
@@ -0,0 +1,220 @@
+import os
+import re
+import math
+import time
+
+from collections import Counter
+
+from modules.metrics import record
+from modules.app_logging import setup_logging
+
+# ==
+logger = setup_logging(__name__)
+
+# Token budget of the context packed into each LLM stage, keyed by prompt name
+context_budgets = {
+    "presentation_outliner": int(os.environ.get('CONTEXT_BUDGET_PRESENTATION_OUTLINER', 12000)),
+    "documents_enricher": int(os.environ.get('CONTEXT_BUDGET_DOCUMENTS_ENRICHER', 8000)),
+    "meta_slides_maker": int(os.environ.get('CONTEXT_BUDGET_META_SLIDES_MAKER', 4000)),
+    "slides_planner": int(os.environ.get('CONTEXT_BUDGET_SLIDES_PLANNER', 8000))
+}
+
+# 1.0 ranks on relevance only, lower values favour chunks that add something new
+context_diversity = float(os.environ.get('CONTEXT_DIVERSITY', 0.7))
+context_duplicate_threshold = float(os.environ.get('CONTEXT_DUPLICATE_THRESHOLD', 0.9))
+
+documents_separator = "\n\n---\n\n"
+no_documents_text = "No documents provided."
+
+# == Utils functions
+def estimate_tokens(text):
+    return len(text) // 4 + 1
+
+def tokenize(text):
+    return re.findall(r"\w+", text.lower())
+
+def truncate_to_tokens(text, max_tokens):
+    max_chars = max(0, (max_tokens - 1) * 4)
+
+    return text if len(text) <= max_chars else text[:max_chars]
+
+def make_tfidf_vectors(texts):
+    term_counts = [Counter(tokenize(text)) for text in texts]
+    document_frequencies = Counter(term for counts in term_counts for term in counts)
+
+    num_texts = len(texts)
+    vectors = []
+
+    for counts in term_counts:
+        vector = {term: count * (math.log((num_texts + 1) / (document_frequencies[term] + 1)) + 1) for term, count in counts.items()}
+        norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+
+        vectors.append({term: weight / norm for term, weight in vector.items()} if norm > 0 else {})
+
+    return vectors
+
+def cosine_similarity(vector1, vector2):
+    # Vectors are already normalized
+    if len(vector1) > len(vector2):
+        vector1, vector2 = vector2, vector1
+
+    return sum(weight * vector2.get(term, 0.0) for term, weight in vector1.items())
+
+# ==
+class PackedContext():
+    def __init__(self, text, report):
+        self.text = text
+        self.report = report
+
+class ContextPacker():
+    def __init__(self, budgets = None, diversity = context_diversity, duplicate_threshold = context_duplicate_threshold):
+        self._budgets = dict(context_budgets if budgets is None else budgets)
+        self._diversity = diversity
+        self._duplicate_threshold = duplicate_threshold
+
+    def get_budget(self, stage):
+        return self._budgets[stage]
+
+    def _iter_ranked(self, texts, query, duplicate_indices):
+        # Maximal marginal relevance on lexical TF-IDF vectors, near-duplicates of a picked chunk are set aside
+        # into duplicate_indices. Yields each pick with the indices still to rank: every pick costs a similarity
+        # per remaining chunk, so callers stop as soon as they have enough
+        vectors = make_tfidf_vectors(texts + [query])
+        query_vector = vectors.pop()
+
+        relevances = [cosine_similarity(vector, query_vector) for vector in vectors]
+        max_similarities = [0.0] * len(texts)
+
+        remaining_indices = list(range(len(texts)))
+
+        while len(remaining_indices) > 0:
+            best_index = max(
+                remaining_indices,
+                key = lambda index: (self._diversity * relevances[index] - (1 - self._diversity) * max_similarities[index], -index)
+            )
+
+            remaining_indices.remove(best_index)
+
+            for index in list(remaining_indices):
+                similarity = cosine_similarity(vectors[index], vectors[best_index])
+
+                if similarity >= self._duplicate_threshold:
+                    remaining_indices.remove(index)
+                    duplicate_indices.append(index)
+
+                else:
+                    max_similarities[index] = max(max_similarities[index], similarity)
+
+            yield best_index, remaining_indices
+
+    def pack(self, documents, query, stage):
+        start_time = time.perf_counter()
+        max_tokens = self.get_budget(stage)
+
+        texts = [document.page_content for document in documents]
+        num_tokens = [estimate_tokens(text) for text in texts]
+
+        duplicate_indices = []
+
+        packed_texts = []
+        packed_tokens = 0
+        dropped_tokens = 0
+        num_truncated = 0
+        num_over_budget = 0
+
+        separator_tokens = estimate_tokens(documents_separator)
+
+        for index, remaining_indices in self._iter_ranked(texts, query, duplicate_indices):
+            needed_tokens = num_tokens[index] + (separator_tokens if len(packed_texts) > 0 else 0)
+
+            if packed_tokens + needed_tokens <= max_tokens:
+                packed_texts.append(texts[index])
+                packed_tokens += needed_tokens
+
+            elif len(packed_texts) == 0:
+                # The most relevant chunk alone is over budget: better a cut chunk than no context at all
+                packed_texts.append(truncate_to_tokens(texts[index], max_tokens))
+                packed_tokens += estimate_tokens(packed_texts[-1])
+                dropped_tokens += num_tokens[index] - estimate_tokens(packed_texts[-1])
+                num_truncated += 1
+
+            else:
+                dropped_tokens += num_tokens[index]
+                num_over_budget += 1
+
+            # Once none of the chunks left could fit, they are not worth ranking
+            if len(remaining_indices) > 0 and max_tokens - packed_tokens - separator_tokens < min(num_tokens[remaining_index] for remaining_index in remaining_indices):
+                dropped_tokens += sum(num_tokens[remaining_index] for remaining_index in remaining_indices)
+                num_over_budget += len(remaining_indices)
+                break
+
+        dropped_tokens += sum(num_tokens[index] for index in duplicate_indices)
+
+        report = {
+            "stage": stage,
+            "budget": max_tokens,
+            "num_documents": len(texts),
+            "num_packed": len(packed_texts),
+            "num_duplicates": len(duplicate_indices),
+            "num_over_budget": num_over_budget,
+            "num_truncated": num_truncated,
+            "total_tokens": sum(num_tokens),
+            "packed_tokens": packed_tokens,
+            "dropped_tokens": dropped_tokens
+        }
+
+        logger.info(
+            f"Packed {report['num_packed']}/{report['num_documents']} documents for {stage}: "
+            f"{packed_tokens}/{max_tokens} tokens used, {dropped_tokens} tokens dropped "
+            f"({report['num_duplicates']} near-duplicates, {num_over_budget} over budget)"
+        )
+
+        text = documents_separator.join(packed_texts) if len(packed_texts) > 0 else no_documents_text
+
+        record(
+            kind = "context",
+            name = stage,
+            duration = time.perf_counter() - start_time,
+            counts = {"documents": len(packed_texts), "packed_tokens": packed_tokens, "dropped_tokens": dropped_tokens}
+        )
+
+        return PackedContext(
+            text = text,
+            report = report
+        )
+
+    def fit(self, text, stage):
+        # For stages whose context is a single text, e.g. the outline given to the meta slides maker
+        max_tokens = self.get_budget(stage)
+        total_tokens = estimate_tokens(text)
+
+        fitted_text = truncate_to_tokens(text, max_tokens) if total_tokens > max_tokens else text
+        packed_tokens = estimate_tokens(fitted_text)
+
+        report = {
+            "stage": stage,
+            "budget": max_tokens,
+            "num_documents": 1,
+            "num_packed": 1,
+            "num_duplicates": 0,
+            "num_over_budget": 0,
+            "num_truncated": int(fitted_text != text),
+            "total_tokens": total_tokens,
+            "packed_tokens": packed_tokens,
+            "dropped_tokens": total_tokens - packed_tokens
+        }
+
+        if report["num_truncated"] > 0:
+            logger.warning(f"Context of {stage} cut from {total_tokens} to {packed_tokens} tokens to fit its budget")
+
+        record(
+            kind = "context",
+            name = stage,
+            duration = 0.0,
+            counts = {"documents": 1, "packed_tokens": packed_tokens, "dropped_tokens": report["dropped_tokens"]}
+        )
+
+        return PackedContext(
+            text = fitted_text,
+            report = report
+        )
@@ -1,7 +1,20 @@
+import os
+import re
+import threading
+
+from io import BytesIO
+from xml.sax.saxutils import escape
+
 from pptx import Presentation
+from pptx.oxml import parse_xml
+from pptx.oxml.ns import nsdecls
 
+from modules.app_logging import setup_logging
 from modules.core import SlidesgenPresentation, TitleSlide, AgendaSlide, SimpleContentSlide, TwoColumnsSlide, QuoteSlide, ImpressionSlide, SectionTransitionSlide, ThankYouSlide
 
+# ==
+logger = setup_logging(__name__)
+
 # ==
 def update_text_content_of_shape(shape, text: str):
     if shape.has_text_frame:
@@ -19,130 +32,199 @@ def update_text_content_of_shape(shape, text: str):
         run = p.add_run()
         run.text = text
 
+# == Text formatting
+# Paragraph properties of the "-" bullet lines: template format, no spacing nor indent
+bullet_paragraph_xml = '<a:p marL="0"><a:pPr><a:spcBef><a:spcPts val="0"/></a:spcBef><a:spcAft><a:spcPts val="0"/></a:spcAft><a:defRPr/></a:pPr>{runs}</a:p>'
+plain_paragraph_xml = '<a:p><a:pPr/>{runs}</a:p>'
+
+def escape_ctrl_chars(text):
+    # Same escaping as python-pptx, e.g. BEL becomes "_x0007_"
+    return re.sub(r"([\x00-\x08\x0B-\x1F])", lambda match: "_x%04X_" % ord(match.group(1)), text)
+
+def make_runs_xml(text):
+    # Same runs as setting paragraph.text: no empty run, vertical tabs become line breaks
+    runs_xml = []
+    
+    for run_index, run_text in enumerate(re.split("\n|\v", text)):
+        if run_index > 0:
+            runs_xml.append("<a:br/>")
+            
+        if run_text:
+            runs_xml.append(f"<a:r><a:t>{escape(escape_ctrl_chars(run_text))}</a:t></a:r>")
+            
+    return "".join(runs_xml)
+
+def make_paragraph_xml(line):
+    if line.startswith("-"):
+        return bullet_paragraph_xml.format(runs = make_runs_xml(line[1:].strip()))
+    
+    if line.startswith(">"):
+        # New paragraph without bullet
+        return plain_paragraph_xml.format(runs = make_runs_xml(line[1:].strip()))
+    
+    # fallback: treat as paragraph
+    return plain_paragraph_xml.format(runs = make_runs_xml(line.strip()))
+
 def set_formatted_content(shape, content):
     if not shape.has_text_frame:
         return
     
-    text_frame = shape.text_frame
-
+    text_body = shape.text_frame._txBody
+    
     # Clear all paragraphs
-    for _ in range(len(text_frame.paragraphs)):
-        p = text_frame.paragraphs[0]
-        text_frame._element.remove(p._element)
+    for p in text_body.p_lst:
+        text_body.remove(p)
+        
+    # The paragraphs of the whole text are built as one XML string and parsed at once
+    paragraphs_xml = "".join(make_paragraph_xml(line) for line in content.strip().split("\n"))
+    
+    text_body.extend(parse_xml(f"<a:txBody {nsdecls('a')}>{paragraphs_xml}</a:txBody>"))
+    
+# == Slide renderers
+# Slide type -> (index of its prototype slide in the template, function returning the text of each shape)
+slide_renderers = {}
 
-    lines = content.strip().split("\n")
-    for line in lines:
-        if line.startswith("-"):
-            p = text_frame.add_paragraph()
-            p.text = line[1:].strip()
-            p.level = 0
-            p.font.bold = None  # use template format
-            p.font.size = None
-            p.space_after = 0
-            p.space_before = 0
-            p.alignment = None
-            p._element.set("marL", "0")  # Optional: remove indent
+def register_slide_renderer(slide_type, prototype_index):
+    def decorator(get_texts):
+        slide_renderers[slide_type] = (prototype_index, get_texts)
+        
+        return get_texts
+    
+    return decorator
+
+@register_slide_renderer(TitleSlide, 0)
+def get_title_slide_texts(slide):
+    return [slide.master_title, slide.subtitle]
+
+@register_slide_renderer(AgendaSlide, 1)
+def get_agenda_slide_texts(slide):
+    return [text for section_header in slide.sections_header for text in (section_header.id, section_header.title)]
+
+@register_slide_renderer(SectionTransitionSlide, 2)
+def get_section_transition_slide_texts(slide):
+    return [slide.section_header.id, slide.section_header.title, slide.section_header.subtitle, slide.image]
+
+@register_slide_renderer(ThankYouSlide, 3)
+def get_thank_you_slide_texts(slide):
+    return [slide.thank_you_text, slide.additional_info, slide.contact_information]
+
+@register_slide_renderer(SimpleContentSlide, 4)
+def get_simple_content_slide_texts(slide):
+    return [slide.title, slide.content]
+
+@register_slide_renderer(TwoColumnsSlide, 5)
+def get_two_columns_slide_texts(slide):
+    return [slide.title, slide.column1_title, slide.column1_content, slide.column2_title, slide.column2_content]
+
+@register_slide_renderer(QuoteSlide, 6)
+def get_quote_slide_texts(slide):
+    return [slide.quote, slide.author]
+
+@register_slide_renderer(ImpressionSlide, 7)
+def get_impression_slide_texts(slide):
+    return [slide.impression_text, slide.description]
+
+# ==
+class PresentationRenderer():
+    def __init__(self, template_file):
+        # The template is read and parsed once, every render opens its own copy from the bytes
+        with open(template_file, 'rb') as file:
+            self._template_bytes = file.read()
             
-        elif line.startswith(">"):
-            p = text_frame.add_paragraph()
-            p.text = line[1:].strip()
-            p.level = 0
-            p._element.get_or_add_pPr().remove_all("buChar")  # remove bullet if any
+        template = Presentation(BytesIO(self._template_bytes))
+        
+        self._layouts = {} # slide type -> (master index, layout index, number of shapes on a new slide)
+        
+        for slide_type, (prototype_index, _) in slide_renderers.items():
+            if prototype_index >= len(template.slides):
+                logger.warning(f"Template {template_file} has no prototype slide {prototype_index}, {slide_type.__name__} will be skipped")
+                continue
             
-        else:
-            # fallback: treat as paragraph
-            p = text_frame.add_paragraph()
-            p.text = line.strip()
-            p.level = 0
+            self._layouts[slide_type] = self._find_layout(template, template.slides[prototype_index].slide_layout)
             
-def presentation2pptx(presentation: SlidesgenPresentation, template_file: str, output_file: str):
-    template = Presentation(
-        pptx = template_file
-    )
+    @staticmethod
+    def _find_layout(template, slide_layout):
+        for master_index, slide_master in enumerate(template.slide_masters):
+            for layout_index, layout in enumerate(slide_master.slide_layouts):
+                if layout.part is slide_layout.part:
+                    return master_index, layout_index, len(list(layout.iter_cloneable_placeholders()))
+                
+        raise ValueError(f"Layout {slide_layout.name} not found in the template")
+            
+    @staticmethod
+    def _drop_slides(template):
+        # Once nothing refers to them, the slides and the media only they use are left out of the saved file
+        slide_id_list = template.slides._sldIdLst
         
-    template_slides = template.slides
-    
-    for slide_index, slide in enumerate(presentation.slides):
-        try:
-            if isinstance(slide, TitleSlide):
-                template_layout = template_slides[0].slide_layout
-                template.slides.add_slide(template_layout)
-                
-                template.slides[-1].name = f"{slide_index}"
-                set_formatted_content(template.slides[-1].shapes[0], slide.master_title)
-                set_formatted_content(template.slides[-1].shapes[1], slide.subtitle)
-                      
-            elif isinstance(slide, AgendaSlide):
-                template_layout = template_slides[1].slide_layout
-                template.slides.add_slide(template_layout)
-                
-                template.slides[-1].name = f"{slide_index}"
-                for section_index, section_header in enumerate(slide.sections_header):
-                    set_formatted_content(template.slides[-1].shapes[section_index * 2], section_header.id)
-                    set_formatted_content(template.slides[-1].shapes[section_index * 2 + 1], section_header.title)
+        for slide_id in list(slide_id_list):
+            slide_id_list.remove(slide_id)
+            template.part.drop_rel(slide_id.rId)
             
-            elif isinstance(slide, SectionTransitionSlide):
-                template_layout = template_slides[2].slide_layout
-                template.slides.add_slide(template_layout)
-                
-                template.slides[-1].name = f"{slide_index}"
-                
-                set_formatted_content(template.slides[-1].shapes[0], slide.section_header.id)
-                set_formatted_content(template.slides[-1].shapes[1], slide.section_header.title)
-                set_formatted_content(template.slides[-1].shapes[2], slide.section_header.subtitle)
-                set_formatted_content(template.slides[-1].shapes[3], slide.image)
-
-            elif isinstance(slide, ThankYouSlide):
-                template_layout = template_slides[3].slide_layout
-                template.slides.add_slide(template_layout)
-                
-                template.slides[-1].name = f"{slide_index}"
-                
-                set_formatted_content(template.slides[-1].shapes[0], slide.thank_you_text)
-                set_formatted_content(template.slides[-1].shapes[1], slide.additional_info)
-                set_formatted_content(template.slides[-1].shapes[2], slide.contact_information)
-                
-            elif isinstance(slide, SimpleContentSlide):
-                template_layout = template_slides[4].slide_layout
-                template.slides.add_slide(template_layout)
-                
-                template.slides[-1].name = f"{slide_index}"
-                
-                set_formatted_content(template.slides[-1].shapes[0], slide.title)
-                set_formatted_content(template.slides[-1].shapes[1], slide.content)
-                
-            elif isinstance(slide, TwoColumnsSlide):
-                template_layout = template_slides[5].slide_layout
-                template.slides.add_slide(template_layout)
-                
-                template.slides[-1].name = f"{slide_index}"
-                set_formatted_content(template.slides[-1].shapes[0], slide.title)
-                set_formatted_content(template.slides[-1].shapes[1], slide.column1_title)
-                set_formatted_content(template.slides[-1].shapes[2], slide.column1_content)
-                set_formatted_content(template.slides[-1].shapes[3], slide.column2_title)
-                set_formatted_content(template.slides[-1].shapes[4], slide.column2_content)
-
-            elif isinstance(slide, QuoteSlide):
-                template_layout = template_slides[6].slide_layout
-                template.slides.add_slide(template_layout)
-                
-                template.slides[-1].name = f"{slide_index}"
-                
-                set_formatted_content(template.slides[-1].shapes[0], slide.quote)
-                set_formatted_content(template.slides[-1].shapes[1], slide.author)
-                
-            elif isinstance(slide, ImpressionSlide):
-                template_layout = template_slides[7].slide_layout
-                template.slides.add_slide(template_layout)
-                
-                template.slides[-1].name = f"{slide_index}"
-                
-                set_formatted_content(template.slides[-1].shapes[0], slide.impression_text)
-                set_formatted_content(template.slides[-1].shapes[1], slide.description)
-                
-        except Exception as e:
-            print(e)
+    def render(self, presentation: SlidesgenPresentation, output_file, lean = False):
+        # output_file is a path or a writable binary stream, lean leaves the template's prototype slides out
+        template = Presentation(BytesIO(self._template_bytes))
+        
+        layouts = {
+            slide_type: template.slide_masters[master_index].slide_layouts[layout_index]
+            for slide_type, (master_index, layout_index, _) in self._layouts.items()
+        }
+        
+        if lean:
+            self._drop_slides(template)
+        
+        for slide_index, slide in enumerate(presentation.slides):
+            if type(slide) not in layouts:
+                logger.warning(f"Slide {slide_index}: no layout for {type(slide).__name__}, skipped")
+                continue
+            
+            texts = slide_renderers[type(slide)][1](slide)
+            num_shapes = self._layouts[type(slide)][2]
+            
+            if len(texts) > num_shapes:
+                logger.warning(f"Slide {slide_index}: {type(slide).__name__} layout has {num_shapes} shapes for {len(texts)} texts, the rest is dropped")
             
-    template.save(
-        file = output_file
+            new_slide = template.slides.add_slide(layouts[type(slide)])
+            new_slide.name = f"{slide_index}"
+            
+            for shape, text in zip(new_slide.shapes, texts):
+                set_formatted_content(shape, text)
+                
+        template.save(output_file)
+        
+    def render_to_bytes(self, presentation: SlidesgenPresentation, lean = True):
+        output = BytesIO()
+        
+        self.render(
+            presentation = presentation,
+            output_file = output,
+            lean = lean
+        )
+        
+        return output.getvalue()
+
+_renderers = {} # template file -> (mtime, renderer)
+_renderers_lock = threading.Lock()
+
+def get_renderer(template_file):
+    # Renderers are shared per template file, and rebuilt when the file changes
+    mtime = os.stat(template_file).st_mtime_ns
+    
+    with _renderers_lock:
+        cached_renderer = _renderers.get(template_file)
+        
+        if cached_renderer is not None and cached_renderer[0] == mtime:
+            return cached_renderer[1]
+        
+    renderer = PresentationRenderer(template_file)
+    
+    with _renderers_lock:
+        _renderers[template_file] = (mtime, renderer)
+        
+    return renderer
+
+def presentation2pptx(presentation: SlidesgenPresentation, template_file: str, output_file, lean: bool = False):
+    get_renderer(template_file).render(
+        presentation = presentation,
+        output_file = output_file,
+        lean = lean
     )
@@ -1,51 +1,56 @@
 import os
 import sys
+import hashlib
 
 sys.path.append('../')
 
 # == Import
-import time
-
 from pydantic import BaseModel, Field
 
-from langchain_aws.chat_models.bedrock import ChatBedrock
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.prompts import ChatPromptTemplate
-from langchain_community.tools import DuckDuckGoSearchRun
-
-from modules.vector_stores import ChromaDB
+from modules.components import get_component, get_prompt_registry, get_context_packer, get_llm, get_vector_store, get_search_tool, get_search_scheduler, get_text_splitter
 from modules.bedrock_llm import invoke_llm_or_chains
+from modules.pipeline import Stage, StageGraph
+from modules.context import estimate_tokens
+from modules.metrics import RunMetrics, export_run
+from modules.checkpoints import RunCheckpoints
+from modules.search import deduplicate_documents
 
 from modules.app_logging import setup_logging
 
 # == Setup logging
 logger = setup_logging(__name__)
 
-# == Init components
-llm = ChatBedrock(
-    model_id = os.environ['BASE_LLM_ID'],
-    provider = "anthropic",
-    region_name = "us-east-1",
-    temperature = 0.7,
-    aws_access_key_id = os.environ['AWS_ACCESS_KEY'],
-    aws_secret_access_key = os.environ['AWS_SECRET_KEY']
-)
-
-vector_store = ChromaDB(
-    collection_name = "local_pdfs",
-    embeddings_provider = os.environ['EMBEDDING_PROVIDER'],
-    embeddings_model_name = os.environ['EMBEDDING_MODEL_NAME'],
-    persist_directory = os.environ['CHROMA_PERSIST_DIRECTORY']
-)
-
-text_splitter = RecursiveCharacterTextSplitter(
-    chunk_size = 2048,
-    chunk_overlap = 128
-)
+# == Settings
+max_concurrency = int(os.environ.get('MAX_CONCURRENCY', 4))
+
+# Per-section retrieval, disabled when RETRIEVAL_NUM_CHUNKS is 0
+retrieval_num_chunks = int(os.environ.get('RETRIEVAL_NUM_CHUNKS', 0))
+retrieval_max_tokens = int(os.environ.get('RETRIEVAL_MAX_TOKENS', 8000))
 
 # == Utils functions
-def make_documents_str(documents):
-    return "\n\n---\n\n".join([doc.page_content for doc in documents]) if len(documents) > 0 else "No documents provided."
+def retrieve_section_documents(section, num_chunks, max_tokens, file_hashes = None, run_id = None):
+    # Copy the result, the cached list must not be extended by enrich_documents.
+    # file_hashes keeps the search to the files of this run when the store is shared, e.g. by batch jobs,
+    # run_id adds the web search results stored by this run
+    documents = list(get_vector_store().similarity_search(
+        query = section.to_query(),
+        num_chunks = num_chunks,
+        file_hashes = file_hashes,
+        run_id = run_id
+    ))
+    
+    selected_documents = []
+    num_tokens = 0
+    
+    for document in documents:
+        num_tokens += estimate_tokens(document.page_content)
+        
+        if num_tokens > max_tokens and len(selected_documents) > 0:
+            break
+        
+        selected_documents.append(document)
+        
+    return selected_documents
 
 # == Presentation Outliner
 class SectionOutline(BaseModel):
@@ -71,6 +76,12 @@ class SectionOutline(BaseModel):
             
         return "\n".join(lines)
     
+    def to_query(self) -> str:
+        return "\n".join([self.title, self.objective, *self.subsections_title])
+    
+    def to_hash(self) -> str:
+        return hashlib.sha256(self.model_dump_json().encode("utf-8")).hexdigest()
+    
 class PresentationOutline(BaseModel):
     title: str = Field(
         description = "Title of the presentation."
@@ -84,87 +95,76 @@ class PresentationOutline(BaseModel):
         result = f"Title: {self.title}\n\n" + "\n\n".join(section.to_str(i + 1) for i, section in enumerate(self.sections))
         return result
 
-presentation_outliner = llm.with_structured_output(
-    schema = PresentationOutline
-)
+def get_presentation_outliner():
+    return get_component("presentation_outliner", lambda: get_llm().with_structured_output(
+        schema = PresentationOutline
+    ))
 
 def outline_presentation(user_instruction, provided_documents):
-    with open('prompts/presentation_outliner.txt', 'r') as file:
-        system_prompt = file.read()
-        
-    messages = [
-        {
-            "role": "system", "content": system_prompt
-        },
-        
-        {
-            "role": "human", "content": "Here is the related documents and the user's instruction:\n\n Documents: {provided_documents}\n\n### Instruction: {user_instruction}"
-        }
-    ]
-    
-    prompt = ChatPromptTemplate.from_messages(messages)
+    chains = get_prompt_registry().get_chain(
+        prompt_name = "presentation_outliner",
+        human_message = "Here is the related documents and the user's instruction:\n\n Documents: {provided_documents}\n\n### Instruction: {user_instruction}",
+        runnable = get_presentation_outliner()
+    )
     
-    chains = prompt | presentation_outliner
+    documents_context = get_context_packer().pack(
+        documents = provided_documents,
+        query = user_instruction,
+        stage = "presentation_outliner"
+    )
     
     response = invoke_llm_or_chains(
         llm_or_chains = chains,
         
         input = {
             "user_instruction": user_instruction,
-            "provided_documents": make_documents_str(provided_documents)
-        }
+            "provided_documents": documents_context.text
+        },
+
+        output_type = PresentationOutline
     )
     
     return response
 
 # == Documents Enricher
-search_tool = DuckDuckGoSearchRun(
-    num_results = 3
-)
-
-documents_enricher = llm.bind_tools(
-    [search_tool]
-)
+def get_documents_enricher():
+    return get_component("documents_enricher", lambda: get_llm().bind_tools(
+        [get_search_tool()]
+    ))
 
 def enrich_documents(section_outline, provided_documents, max_depth = 3):
-    with open('prompts/slides_planner.txt', 'r') as file:
-        system_prompt = file.read()
-        
-    messages = [
-        {
-            "role": "system", "content": system_prompt
-        },
-        
-        {
-            "role": "human", "content": "Here is the section outline and provided documents:\n\n### Outline: {section_outline}\n\n### Supporting documents: {documents_str}"
-        }
-    ]
-    
-    prompt = ChatPromptTemplate.from_messages(messages)
-    
-    chains = prompt | documents_enricher
+    chains = get_prompt_registry().get_chain(
+        prompt_name = "documents_enricher",
+        human_message = "Here is the section outline and provided documents:\n\n### Outline: {section_outline}\n\n### Supporting documents: {documents_str}",
+        runnable = get_documents_enricher()
+    )
         
     for search_index in range(max_depth):    
+        documents_context = get_context_packer().pack(
+            documents = provided_documents,
+            query = section_outline,
+            stage = "documents_enricher"
+        )
+        
         response = invoke_llm_or_chains(
             llm_or_chains = chains,
             input = {
                 "section_outline": section_outline,
-                "documents_str": make_documents_str(provided_documents)
+                "documents_str": documents_context.text
             }
         )
                 
-        for tool_call in response.tool_calls:
-            try:
-                search_result = search_tool.invoke(tool_call)
-                
-                documents = text_splitter.create_documents([search_result.content])
-                
-                provided_documents.extend(documents)
+        search_results = get_search_scheduler().search_many(
+            queries = [tool_call["args"]["query"] for tool_call in response.tool_calls]
+        )
+        
+        for search_result in search_results:
+            if search_result is None: # Failed or timed out, already logged
+                continue
             
-            except Exception as e:
-                logger.error(f"Error: {e}")
-                
-                time.sleep(60) # Timeout for resetting DuckDuckGo rate limit
+            documents = get_text_splitter().create_documents([search_result])
+            
+            provided_documents.extend(deduplicate_documents(provided_documents, documents))
             
         if len(response.tool_calls) == 0: # Documents are sufficient
             break
@@ -361,133 +361,443 @@ class ContentSlides(BaseModel):
     def to_str(self) -> str:
         return "\n\n".join(slide.to_str() for slide in self.slides)
         
-meta_slides_maker = llm.with_structured_output(
-    schema = MetaSlides
-)
+def get_meta_slides_maker():
+    return get_component("meta_slides_maker", lambda: get_llm().with_structured_output(
+        schema = MetaSlides
+    ))
 
-content_slides_maker = llm.with_structured_output(
-    schema = ContentSlides
-)
+def get_content_slides_maker():
+    return get_component("content_slides_maker", lambda: get_llm().with_structured_output(
+        schema = ContentSlides
+    ))
 
 def make_meta_slides(user_instruction: str, presentation_outline: PresentationOutline):
-    with open('prompts/meta_slides_maker.txt', 'r') as file:
-        system_prompt = file.read()
-        
-    messages = [
-        {
-            "role": "system", "content": system_prompt
-        },
-        
-        {
-            "role": "human", "content": "Here is the presentation outline and user's instruction.\n### Outline: {presentation_outline}\n\n### User's instruction: {user_instruction}"
-        },
-    ]
-    
-    prompt = ChatPromptTemplate.from_messages(messages)
-    
-    chains = prompt | meta_slides_maker
+    chains = get_prompt_registry().get_chain(
+        prompt_name = "meta_slides_maker",
+        human_message = "Here is the presentation outline and user's instruction.\n### Outline: {presentation_outline}\n\n### User's instruction: {user_instruction}",
+        runnable = get_meta_slides_maker()
+    )
+
+    outline_context = get_context_packer().fit(
+        text = presentation_outline.to_str(),
+        stage = "meta_slides_maker"
+    )
 
     response = invoke_llm_or_chains(
         llm_or_chains = chains,
         
         input = {
             "user_instruction": user_instruction,
-            "presentation_outline": presentation_outline
-        }
+            "presentation_outline": outline_context.text
+        },
+
+        output_type = MetaSlides
     )
     
     return response
 
 def make_content_slides(section_outline, provided_documents):
-    with open('prompts/slides_planner.txt', 'r') as file:
-        system_prompt = file.read()
-        
-    messages = [
-        {
-            "role": "system", "content": system_prompt
-        },
-        
-        {
-            "role": "human", "content": "Here is the section outline and supporting documents.\n### Outline: {section_outline}\n\n### Supporting documents: {provided_documents}"
-        },
-    ]
-    
-    prompt = ChatPromptTemplate.from_messages(messages)
-    
-    chains = prompt | content_slides_maker
+    chains = get_prompt_registry().get_chain(
+        prompt_name = "slides_planner",
+        human_message = "Here is the section outline and supporting documents.\n### Outline: {section_outline}\n\n### Supporting documents: {provided_documents}",
+        runnable = get_content_slides_maker()
+    )
+
+    documents_context = get_context_packer().pack(
+        documents = provided_documents,
+        query = section_outline,
+        stage = "slides_planner"
+    )
 
     response = invoke_llm_or_chains(
         llm_or_chains = chains,
         
         input = {
-            "provided_documents": provided_documents,
+            "provided_documents": documents_context.text,
             "section_outline": section_outline
-        }
+        },
+
+        output_type = ContentSlides
     )
     
     return response
 
 # == Core functions
-class SlidesgenPresentation():
-    slides: list[TitleSlide | AgendaSlide | SectionTransitionSlides | SimpleContentSlide | QuoteSlide | ImpressionSlide | TwoColumnsSlide | ThankYouSlide]
+class SlidesgenPresentation(BaseModel):
+    slides: list[TitleSlide | AgendaSlide | SectionTransitionSlide | SimpleContentSlide | QuoteSlide | ImpressionSlide | TwoColumnsSlide | ThankYouSlide] = Field(
+        default_factory = list,
+        description = "Slides of the presentation, in order."
+    )
     
     def to_str(self) -> str:
         return "\n\n".join(slide.to_str() for slide in self.slides)
 
-def combine_slides(meta_slides: MetaSlides, sections: list[ContentSlides]):
-    slides = []
-    
-    slides.append(meta_slides.title_slide)
-    slides.append(meta_slides.agenda_slide)
+def iter_combined_slides(meta_slides: MetaSlides, sections):
+    yield meta_slides.title_slide
+    yield meta_slides.agenda_slide
     
+    # sections may be a lazy iterable, each section is only pulled once the previous one is out
     for section_index, section in enumerate(sections):
-        slides.append(meta_slides.section_transition_slides.slides[section_index])
-        slides.extend(section.slides)
+        yield meta_slides.section_transition_slides.slides[section_index]
+        yield from section.slides
         
-    slides.append(meta_slides.thank_you_slide)
-    
-    return slides
+    yield meta_slides.thank_you_slide
 
-def make_presentation(user_instruction, provided_documents):
-    logger.info("Step 1: Outlining presentation ...")
-    presentation_outline = outline_presentation(
-        user_instruction = user_instruction,
-        provided_documents = provided_documents
-    )
-    
-    logger.info(f"=== Presentation Outline ===\n{presentation_outline.to_str()}")
+def combine_slides(meta_slides: MetaSlides, sections: list[ContentSlides]):
+    return list(iter_combined_slides(
+        meta_slides = meta_slides,
+        sections = sections
+    ))
 
-    logger.info(f"Step 2: Making Meta Slides ...")
-    meta_slides = make_meta_slides(
-        user_instruction = user_instruction,
-        presentation_outline = presentation_outline
-    )
+def build_presentation_graph(
+    user_instruction, provided_documents, num_sections,
+    retrieval_num_chunks = retrieval_num_chunks, retrieval_max_tokens = retrieval_max_tokens, retrieval_file_hashes = None, retrieval_run_id = None, max_depth = 3
+):
+    from langchain_core.documents import Document
+    
+    # With retrieval on, each section only sees its top chunks from the vector store instead of every document
+    use_retrieval = retrieval_num_chunks > 0
+    
+    def get_section_documents(section):
+        if not use_retrieval:
+            return list(provided_documents)
         
-    logger.info("Step 3: Enriching Documents ...")
+        return retrieve_section_documents(
+            section = section,
+            num_chunks = retrieval_num_chunks,
+            max_tokens = retrieval_max_tokens,
+            file_hashes = retrieval_file_hashes,
+            run_id = retrieval_run_id
+        )
     
-    for section_index, section in enumerate(presentation_outline.sections):
-        provided_documents = enrich_documents(
-            section_outline = section.to_str(section_index + 1),
+    def make_outline():
+        logger.info("Outlining presentation ...")
+        
+        presentation_outline = outline_presentation(
+            user_instruction = user_instruction,
             provided_documents = provided_documents
         )
+        
+        logger.info(f"=== Presentation Outline ===\n{presentation_outline.to_str()}")
+        
+        return presentation_outline
     
-    logger.info("Step 4: Making Content Slides ...")  
-    sections = []
-                     
-    for section_index, section in enumerate(presentation_outline.sections):
-        content_slides = make_content_slides(
-            section_outline = section.to_str(section_index + 1),
-            provided_documents = provided_documents
+    def make_meta(presentation_outline):
+        logger.info("Making Meta Slides ...")
+        
+        return make_meta_slides(
+            user_instruction = user_instruction,
+            presentation_outline = presentation_outline
+        )
+    
+    def make_section_stages(section_index):
+        def enrich_section(presentation_outline):
+            logger.info(f"Enriching Documents of section {section_index + 1} ...")
+            
+            section = presentation_outline.sections[section_index]
+            section_documents = get_section_documents(section)
+            
+            enriched_documents = enrich_documents(
+                section_outline = section.to_str(section_index + 1),
+                provided_documents = list(section_documents),
+                max_depth = max_depth
+            )
+            
+            new_documents = enriched_documents[len(section_documents):]
+            
+            # Web search results are stored for the other sections of this run only
+            if use_retrieval:
+                get_vector_store().add_documents(new_documents, run_id = retrieval_run_id)
+            
+            return new_documents
+        
+        def make_section_slides(presentation_outline, new_documents):
+            logger.info(f"Making Content Slides of section {section_index + 1} ...")
+            
+            section = presentation_outline.sections[section_index]
+            section_documents = get_section_documents(section)
+            
+            # Content slides only wait for their own section's enrichment, whose chunks are always passed on
+            # rather than left to the retrieval to find again
+            return make_content_slides(
+                section_outline = section.to_str(section_index + 1),
+                provided_documents = section_documents + deduplicate_documents(section_documents, new_documents)
+            )
+        
+        return [
+            Stage(
+                name = f"enriched_documents_{section_index}",
+                func = enrich_section,
+                inputs = ["presentation_outline"],
+                estimated_duration = max_depth,
+                output_type = list[Document]
+            ),
+            
+            Stage(
+                name = f"content_slides_{section_index}",
+                func = make_section_slides,
+                inputs = {"presentation_outline": "presentation_outline", "new_documents": f"enriched_documents_{section_index}"},
+                output_type = ContentSlides
+            )
+        ]
+    
+    stages = [
+        Stage(
+            name = "presentation_outline",
+            func = make_outline,
+            output_type = PresentationOutline
+        ),
+        
+        Stage(
+            name = "meta_slides",
+            func = make_meta,
+            inputs = ["presentation_outline"],
+            output_type = MetaSlides
         )
+    ]
+    
+    for section_index in range(num_sections):
+        stages.extend(make_section_stages(section_index))
         
-        sections.append(content_slides)
+    return StageGraph(stages)
+
+def describe_presentation_pipeline(num_sections = 5, durations = None):
+    # Dry run: no LLM call is made, durations default to the estimated number of LLM calls per stage
+    graph = build_presentation_graph(
+        user_instruction = None,
+        provided_documents = [],
+        num_sections = num_sections
+    )
+    
+    return graph.describe(durations)
+
+def iter_presentation(
+    user_instruction, provided_documents,
+    max_concurrency = max_concurrency, retrieval_num_chunks = retrieval_num_chunks, retrieval_max_tokens = retrieval_max_tokens,
+    retrieval_file_hashes = None, run_metrics = None, run_id = None
+):
+    # Timings, tokens and call counts of the run are collected on run_metrics, then exported once it is over.
+    # With a run_id, every stage result is checkpointed under that id: calling again with the same id after a failure
+    # only runs the stages that were not done. retrieval_file_hashes keeps the per-section retrieval to the chunks of these files
+    run_metrics = run_metrics or RunMetrics(run_id = run_id)
+    checkpoints = RunCheckpoints(run_id) if run_id is not None else None
+    
+    try:
+        if checkpoints is not None:
+            checkpoints.start({
+                "user_instruction": user_instruction,
+                "provided_documents": [document.page_content for document in provided_documents]
+            })
         
-    logger.info(f"Step 5: Combining all slides together ...")
+        yield from _iter_presentation(
+            user_instruction = user_instruction,
+            provided_documents = provided_documents,
+            max_concurrency = max_concurrency,
+            retrieval_num_chunks = retrieval_num_chunks,
+            retrieval_max_tokens = retrieval_max_tokens,
+            retrieval_file_hashes = retrieval_file_hashes,
+            run_metrics = run_metrics,
+            checkpoints = checkpoints
+        )
+        
+    finally:
+        export_run(run_metrics)
+
+def _iter_presentation(
+    user_instruction, provided_documents, max_concurrency, retrieval_num_chunks, retrieval_max_tokens, retrieval_file_hashes, run_metrics, checkpoints,
+    presentation_outline = None, reused_values = None
+):
+    # The number of sections is only known once the outline is done, so it runs before the full graph is built
+    if presentation_outline is None:
+        outline_graph = build_presentation_graph(
+            user_instruction = user_instruction,
+            provided_documents = provided_documents,
+            num_sections = 0
+        )
+        
+        presentation_outline = outline_graph.run(targets = ["presentation_outline"], run_metrics = run_metrics, checkpoints = checkpoints)["presentation_outline"]
     
-    presentation = SlidesgenPresentation()
-    presentation.slides = combine_slides(
-        meta_slides = meta_slides,
-        sections = sections
+    graph = build_presentation_graph(
+        user_instruction = user_instruction,
+        provided_documents = provided_documents,
+        num_sections = len(presentation_outline.sections),
+        retrieval_num_chunks = retrieval_num_chunks,
+        retrieval_max_tokens = retrieval_max_tokens,
+        retrieval_file_hashes = retrieval_file_hashes,
+        retrieval_run_id = run_metrics.run_id
     )
+    
+    values = {"presentation_outline": presentation_outline, **(reused_values or {})}
+    
+    if checkpoints is not None:
+        graph.save_checkpoints(values, checkpoints)
+    
+    num_emitted_sections = -1 # Title and agenda slides are not out yet
+    
+    def iter_ready_slides():
+        nonlocal num_emitted_sections
+        
+        if "meta_slides" not in values:
+            return
+        
+        meta_slides = values["meta_slides"]
+        
+        if num_emitted_sections < 0:
+            yield meta_slides.title_slide
+            yield meta_slides.agenda_slide
+            
+            num_emitted_sections = 0
+            
+        while f"content_slides_{num_emitted_sections}" in values:
+            yield meta_slides.section_transition_slides.slides[num_emitted_sections]
+            yield from values[f"content_slides_{num_emitted_sections}"].slides
+            
+            num_emitted_sections += 1
+    
+    # Reused stages may already be enough for the first slides
+    yield from iter_ready_slides()
+    
+    # Stages finish in any order, slides are yielded in presentation order as soon as they are ready
+    for name, value in graph.iter_run(
+        initial_values = values,
+        max_concurrency = max_concurrency,
+        run_metrics = run_metrics,
+        checkpoints = checkpoints
+    ):
+        values[name] = value
+        
+        yield from iter_ready_slides()
+            
+    yield values["meta_slides"].thank_you_slide
+
+def make_presentation(
+    user_instruction, provided_documents,
+    max_concurrency = max_concurrency, retrieval_num_chunks = retrieval_num_chunks, retrieval_max_tokens = retrieval_max_tokens,
+    retrieval_file_hashes = None, run_metrics = None, run_id = None
+):
+    slides = list(iter_presentation(
+        user_instruction = user_instruction,
+        provided_documents = provided_documents,
+        max_concurrency = max_concurrency,
+        retrieval_num_chunks = retrieval_num_chunks,
+        retrieval_max_tokens = retrieval_max_tokens,
+        retrieval_file_hashes = retrieval_file_hashes,
+        run_metrics = run_metrics,
+        run_id = run_id
+    ))
+    
+    logger.info(f"Combining all slides together ...")
+    
+    presentation = SlidesgenPresentation()
+    presentation.slides = slides
         
     return presentation
+
+# == Incremental regeneration
+def load_run_values(run_id):
+    # Stage results checkpointed by a run, the outline under "presentation_outline" is the one to edit
+    checkpoints = RunCheckpoints(run_id)
+    
+    if not checkpoints.has("presentation_outline"):
+        raise ValueError(f"Run {run_id} has no saved outline")
+    
+    presentation_outline = checkpoints.load("presentation_outline", PresentationOutline)
+    
+    graph = build_presentation_graph(
+        user_instruction = None,
+        provided_documents = [],
+        num_sections = len(presentation_outline.sections)
+    )
+    
+    return graph.load_checkpoints(checkpoints)
+
+def get_reusable_values(previous_values, presentation_outline):
+    # Results of a previous run that still hold for presentation_outline: enriched documents and content slides of each
+    # section whose outline is unchanged, wherever it moved, and meta slides if titles and their order are the same
+    previous_outline = previous_values["presentation_outline"]
+    previous_indices = {}
+    
+    for section_index, section in enumerate(previous_outline.sections):
+        previous_indices.setdefault(section.to_hash(), []).append(section_index)
+        
+    reusable_values = {}
+    
+    for section_index, section in enumerate(presentation_outline.sections):
+        matching_indices = previous_indices.get(section.to_hash(), [])
+        
+        if len(matching_indices) == 0:
+            continue
+        
+        previous_index = matching_indices.pop(0)
+        
+        for stage_name in ("enriched_documents", "content_slides"):
+            if f"{stage_name}_{previous_index}" in previous_values:
+                reusable_values[f"{stage_name}_{section_index}"] = previous_values[f"{stage_name}_{previous_index}"]
+                
+    get_titles = lambda outline: (outline.title, [section.title for section in outline.sections])
+    
+    if "meta_slides" in previous_values and get_titles(previous_outline) == get_titles(presentation_outline):
+        reusable_values["meta_slides"] = previous_values["meta_slides"]
+        
+    return reusable_values
+
+def iter_regenerated_presentation(
+    user_instruction, provided_documents, presentation_outline, previous_run_id, run_id,
+    max_concurrency = max_concurrency, retrieval_num_chunks = retrieval_num_chunks, retrieval_max_tokens = retrieval_max_tokens,
+    retrieval_file_hashes = None, run_metrics = None
+):
+    # Makes the presentation of an edited outline as a new run, only changed and added sections are enriched and made again.
+    # The new run is checkpointed like any other, so it can be resumed or be the previous run of the next edit
+    run_metrics = run_metrics or RunMetrics(run_id = run_id)
+    checkpoints = RunCheckpoints(run_id)
+    
+    try:
+        checkpoints.start({
+            "user_instruction": user_instruction,
+            "provided_documents": [document.page_content for document in provided_documents],
+            "presentation_outline": presentation_outline.model_dump(),
+            "previous_run_id": previous_run_id
+        })
+        
+        reused_values = get_reusable_values(load_run_values(previous_run_id), presentation_outline)
+        
+        num_reused_sections = len([name for name in reused_values if name.startswith("content_slides_")])
+        
+        logger.info(
+            f"Regenerating {len(presentation_outline.sections) - num_reused_sections}/{len(presentation_outline.sections)} sections of run {previous_run_id}, "
+            f"{'reusing' if 'meta_slides' in reused_values else 'remaking'} meta slides"
+        )
+        
+        yield from _iter_presentation(
+            user_instruction = user_instruction,
+            provided_documents = provided_documents,
+            max_concurrency = max_concurrency,
+            retrieval_num_chunks = retrieval_num_chunks,
+            retrieval_max_tokens = retrieval_max_tokens,
+            retrieval_file_hashes = retrieval_file_hashes,
+            run_metrics = run_metrics,
+            checkpoints = checkpoints,
+            presentation_outline = presentation_outline,
+            reused_values = reused_values
+        )
+        
+    finally:
+        export_run(run_metrics)
+
+def regenerate_presentation(
+    user_instruction, provided_documents, presentation_outline, previous_run_id, run_id,
+    max_concurrency = max_concurrency, retrieval_num_chunks = retrieval_num_chunks, retrieval_max_tokens = retrieval_max_tokens,
+    retrieval_file_hashes = None, run_metrics = None
+):
+    return SlidesgenPresentation(slides = list(iter_regenerated_presentation(
+        user_instruction = user_instruction,
+        provided_documents = provided_documents,
+        presentation_outline = presentation_outline,
+        previous_run_id = previous_run_id,
+        run_id = run_id,
+        max_concurrency = max_concurrency,
+        retrieval_num_chunks = retrieval_num_chunks,
+        retrieval_max_tokens = retrieval_max_tokens,
+        retrieval_file_hashes = retrieval_file_hashes,
+        run_metrics = run_metrics
+    )))
@@ -1,6 +1,92 @@
 import os
+import hashlib
 
-def get_embedding_model(provider, model_name):
+from array import array
+
+from langchain_core.embeddings import Embeddings
+
+from modules.caching import SQLiteCache
+
+# ==
+class CachedEmbeddings(Embeddings):
+    def __init__(self, embeddings, provider, model_name, cache):
+        self._embeddings = embeddings
+        self._provider = provider
+        self._model_name = model_name
+        self._cache = cache
+
+    def _make_key(self, text, kind):
+        # Some models embed queries differently from documents, keep them apart
+        return hashlib.sha256(f"{self._provider}\0{self._model_name}\0{kind}\0{text}".encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _to_bytes(vector):
+        return array('f', vector).tobytes()
+
+    @staticmethod
+    def _from_bytes(value):
+        vector = array('f')
+        vector.frombytes(value)
+
+        return vector.tolist()
+
+    def embed_documents(self, texts):
+        keys = [self._make_key(text, "document") for text in texts]
+        cached = self._cache.get_many(keys)
+
+        # Embed each missing text once, even if it shows up several times in the batch
+        missing_texts = {}
+
+        for key, text in zip(keys, texts):
+            if key not in cached:
+                missing_texts[key] = text
+
+        if len(missing_texts) > 0:
+            vectors = self._embeddings.embed_documents(list(missing_texts.values()))
+            new_values = {key: self._to_bytes(vector) for key, vector in zip(missing_texts, vectors)}
+
+            self._cache.set_many(new_values)
+            cached.update(new_values)
+
+        return [self._from_bytes(cached[key]) for key in keys]
+
+    def embed_query(self, text):
+        key = self._make_key(text, "query")
+        value = self._cache.get(key)
+
+        if value is None:
+            value = self._to_bytes(self._embeddings.embed_query(text))
+
+            self._cache.set(key, value)
+
+        return self._from_bytes(value)
+
+    def stats(self):
+        return self._cache.stats()
+
+# ==
+def get_embedding_model(provider, model_name, cache_file = None):
+    embeddings = get_remote_embedding_model(
+        provider = provider,
+        model_name = model_name
+    )
+
+    cache_file = cache_file or os.environ.get('EMBEDDING_CACHE_FILE')
+
+    if not cache_file:
+        return embeddings
+
+    return CachedEmbeddings(
+        embeddings = embeddings,
+        provider = provider,
+        model_name = model_name,
+        cache = SQLiteCache(
+            cache_file = cache_file,
+            max_entries = int(os.environ.get('EMBEDDING_CACHE_MAX_ENTRIES', 500000))
+        )
+    )
+
+def get_remote_embedding_model(provider, model_name):
     if provider == "openai":
         from langchain_openai.embeddings import OpenAIEmbeddings
         
@@ -0,0 +1,245 @@
+import os
+import sys
+
+sys.path.append('../')
+
+# ==
+import glob
+import time
+import multiprocessing
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from modules.vector_stores import hash_file, load_txt_file, load_pdf_file
+from modules.concurrency import map_in_order
+from modules.app_logging import setup_logging
+
+# ==
+logger = setup_logging(__name__)
+
+document_loaders = {
+    ".txt": load_txt_file,
+    ".pdf": load_pdf_file
+}
+
+# == Utils functions
+def find_document_files(paths):
+    document_files = set()
+
+    for path in paths:
+        if os.path.isdir(path):
+            candidates = glob.glob(os.path.join(path, "**", "*"), recursive = True)
+
+        elif os.path.isfile(path):
+            candidates = [path]
+
+        else:
+            candidates = glob.glob(path, recursive = True)
+
+        for candidate in candidates:
+            if os.path.isfile(candidate) and os.path.splitext(candidate)[1].lower() in document_loaders:
+                document_files.add(os.path.abspath(candidate))
+
+    return sorted(document_files)
+
+def get_file_hashes(paths):
+    # Content hashes of the documents found under paths, as stored in the file_hash metadata of their chunks
+    return sorted({hash_file(document_file) for document_file in find_document_files(paths)})
+
+def parse_document_file(document_file, chunk_size, chunk_overlap, indexed_hashes):
+    # Runs in a worker process: hash, load and chunk a single file
+    file_hash = hash_file(document_file)
+
+    if file_hash in indexed_hashes:
+        return document_file, file_hash, None
+
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size = chunk_size,
+        chunk_overlap = chunk_overlap
+    )
+
+    load_texts = document_loaders[os.path.splitext(document_file)[1].lower()]
+
+    chunks = []
+    for text in load_texts(document_file):
+        chunks.extend(text_splitter.split_text(text))
+
+    return document_file, file_hash, chunks
+
+def make_batches(items, batch_size):
+    return [items[batch_start:batch_start + batch_size] for batch_start in range(0, len(items), batch_size)]
+
+# ==
+class BulkIngestor():
+    def __init__(
+        self,
+        vector_store,
+        num_workers = None, embedding_batch_size = 64, max_concurrency = 4, write_batch_size = 4096
+    ):
+        self._vector_store = vector_store
+
+        self._num_workers = num_workers or os.cpu_count()
+        self._embedding_batch_size = embedding_batch_size
+        self._max_concurrency = max_concurrency
+        self._write_batch_size = write_batch_size
+
+        self._pending_chunks = []
+        self._num_pending_chunks = {}
+        self._parsed_files = {}
+
+        self._num_files = 0
+        self._num_chunks = 0
+
+    def _flush(self):
+        if len(self._pending_chunks) == 0:
+            return
+
+        texts = [text for _, _, _, text in self._pending_chunks]
+
+        # Embedding requests go out concurrently, the whole buffer is written to Chroma at once
+        embeddings = []
+        for batch_embeddings in map_in_order(
+            func = self._vector_store.embeddings.embed_documents,
+            items = make_batches(texts, self._embedding_batch_size),
+            max_concurrency = self._max_concurrency
+        ):
+            embeddings.extend(batch_embeddings)
+
+        self._vector_store.upsert_embedded_chunks(
+            ids = [f"{file_hash}-{chunk_index}" for _, file_hash, chunk_index, _ in self._pending_chunks],
+            texts = texts,
+            embeddings = embeddings,
+            metadatas = [{"source": document_file, "file_hash": file_hash} for document_file, file_hash, _, _ in self._pending_chunks]
+        )
+
+        # Files are only recorded as indexed once all of their chunks are written
+        completed_files = {}
+
+        for document_file, _, _, _ in self._pending_chunks:
+            self._num_pending_chunks[document_file] -= 1
+
+            if self._num_pending_chunks[document_file] == 0:
+                completed_files[document_file] = self._parsed_files.pop(document_file)
+                del self._num_pending_chunks[document_file]
+
+        self._vector_store.record_indexed_files(completed_files)
+
+        self._num_chunks += len(self._pending_chunks)
+        self._num_files += len(completed_files)
+
+        self._pending_chunks = []
+
+    def _add_parsed_file(self, document_file, file_hash, chunks):
+        self._parsed_files[document_file] = (file_hash, len(chunks))
+        self._num_pending_chunks[document_file] = len(chunks)
+
+        if len(chunks) == 0:
+            self._vector_store.record_indexed_files({document_file: self._parsed_files.pop(document_file)})
+            del self._num_pending_chunks[document_file]
+            return
+
+        for chunk_index, text in enumerate(chunks):
+            self._pending_chunks.append((document_file, file_hash, chunk_index, text))
+
+        if len(self._pending_chunks) >= self._write_batch_size:
+            self._flush()
+
+    def _add_reparsed_file(self, document_file):
+        # The indexed copy this file was to reuse is gone (e.g. its file changed meanwhile), parse it here instead
+        try:
+            _, file_hash, chunks = parse_document_file(document_file, self._vector_store.chunk_size, self._vector_store.chunk_overlap, set())
+
+        except Exception as e:
+            logger.error(f"Failed to ingest {document_file}: {type(e).__name__}: {e}")
+            return False
+
+        self._add_parsed_file(document_file, file_hash, chunks)
+
+        return True
+
+    def ingest(self, paths):
+        start_time = time.perf_counter()
+
+        document_files = find_document_files(paths)
+        indexed_hashes = self._vector_store.get_indexed_hashes()
+
+        num_skipped_files = 0
+        num_reused_files = 0
+        num_failed_files = 0
+
+        # Files repeating the content of another file of this run are only recorded once that one is written
+        ingested_hashes = set()
+        duplicated_files = {}
+
+        logger.info(f"Ingesting {len(document_files)} files with {self._num_workers} workers ...")
+
+        # Spawned workers, a fork would copy the locks and client threads of the parent (e.g. Chroma's) in any state
+        with ProcessPoolExecutor(max_workers = self._num_workers, mp_context = multiprocessing.get_context("spawn")) as executor:
+            futures = {
+                executor.submit(parse_document_file, document_file, self._vector_store.chunk_size, self._vector_store.chunk_overlap, indexed_hashes): document_file
+                for document_file in document_files
+            }
+
+            for future in as_completed(futures):
+                try:
+                    document_file, file_hash, chunks = future.result()
+
+                except Exception as e:
+                    logger.error(f"Failed to ingest {futures[future]}: {type(e).__name__}: {e}")
+                    num_failed_files += 1
+                    continue
+
+                if self._vector_store.is_indexed(document_file, file_hash):
+                    num_skipped_files += 1
+
+                elif chunks is None:
+                    # Same content is already indexed under another path
+                    if len(self._vector_store.record_indexed_files({document_file: (file_hash, None)})) == 0:
+                        num_reused_files += 1
+
+                    elif not self._add_reparsed_file(document_file):
+                        num_failed_files += 1
+
+                elif file_hash in ingested_hashes:
+                    duplicated_files[document_file] = (file_hash, None)
+                    num_reused_files += 1
+
+                else:
+                    ingested_hashes.add(file_hash)
+                    self._add_parsed_file(document_file, file_hash, chunks)
+
+        self._flush()
+
+        if len(duplicated_files) > 0:
+            for document_file in self._vector_store.record_indexed_files(duplicated_files):
+                num_reused_files -= 1
+                num_failed_files += int(not self._add_reparsed_file(document_file))
+
+            self._flush()
+
+        elapsed_time = time.perf_counter() - start_time
+
+        report = {
+            "num_files": len(document_files),
+            "num_ingested_files": self._num_files,
+            "num_skipped_files": num_skipped_files,
+            "num_reused_files": num_reused_files,
+            "num_failed_files": num_failed_files,
+            "num_chunks": self._num_chunks,
+            "elapsed_time": elapsed_time,
+            "files_per_second": len(document_files) / elapsed_time if elapsed_time > 0 else 0.0,
+            "chunks_per_second": self._num_chunks / elapsed_time if elapsed_time > 0 else 0.0
+        }
+
+        logger.info(
+            f"Ingested {report['num_ingested_files']} files ({report['num_chunks']} chunks), "
+            f"skipped {num_skipped_files} unchanged and reused {num_reused_files} duplicated files, {num_failed_files} failed, "
+            f"in {elapsed_time:.1f}s: {report['files_per_second']:.2f} files/s, {report['chunks_per_second']:.2f} chunks/s"
+        )
+
+        self._num_files = 0
+        self._num_chunks = 0
+
+        return report
@@ -0,0 +1,293 @@
+import os
+import json
+import time
+import tempfile
+import threading
+import contextvars
+
+from uuid import uuid4
+from contextlib import contextmanager
+from collections import defaultdict
+
+from modules.app_logging import setup_logging
+
+# ==
+logger = setup_logging(__name__)
+
+# Both are off when empty: a JSON report per run, and a Prometheus textfile rewritten after every run
+metrics_report_directory = os.environ.get('METRICS_REPORT_DIRECTORY', '')
+metrics_prometheus_file = os.environ.get('METRICS_PROMETHEUS_FILE', '')
+
+duration_buckets = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+_current_run = contextvars.ContextVar("metrics_run", default = None)
+_current_stage = contextvars.ContextVar("metrics_stage", default = None)
+_current_counts = contextvars.ContextVar("metrics_counts", default = None)
+
+# == Utils functions
+def escape_label_value(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def format_labels(labels):
+    return ",".join(f"{key}=\"{escape_label_value(value)}\"" for key, value in labels)
+
+@contextmanager
+def open_atomically(file):
+    # Binary file that replaces `file` once fully written. Each writer gets its own temporary file,
+    # so threads replacing the same file never clash
+    directory = os.path.dirname(file)
+
+    if directory:
+        os.makedirs(directory, exist_ok = True)
+
+    output_file = tempfile.NamedTemporaryFile(dir = directory or ".", prefix = f"{os.path.basename(file)}.", suffix = ".tmp", delete = False)
+
+    try:
+        with output_file:
+            yield output_file
+
+        # Readable like a file written with open(), rather than only by its owner
+        os.chmod(output_file.name, 0o644)
+        os.replace(output_file.name, file)
+
+    except BaseException:
+        if os.path.exists(output_file.name):
+            os.remove(output_file.name)
+
+        raise
+
+def write_file_atomically(file, data):
+    with open_atomically(file) as output_file:
+        output_file.write(data.encode("utf-8") if isinstance(data, str) else data)
+
+# == Process-wide registry, exported in Prometheus text format
+class MetricsRegistry():
+    def __init__(self, buckets = duration_buckets):
+        self._buckets = buckets
+
+        self._durations = {} # labels -> [bucket counts, sum, count]
+        self._errors = defaultdict(int) # labels -> errors
+        self._counts = defaultdict(float) # (count name, labels) -> total
+
+        self._lock = threading.Lock()
+
+    def observe(self, kind, name, stage, duration, error, counts):
+        labels = (("kind", kind), ("name", name), ("stage", stage or ""))
+
+        with self._lock:
+            histogram = self._durations.setdefault(labels, [[0] * len(self._buckets), 0.0, 0])
+
+            for bucket_index, bucket in enumerate(self._buckets):
+                if duration <= bucket:
+                    histogram[0][bucket_index] += 1
+
+            histogram[1] += duration
+            histogram[2] += 1
+
+            if error:
+                self._errors[labels] += 1
+
+            for count_name, value in counts.items():
+                self._counts[(count_name, labels)] += value
+
+    def reset(self):
+        with self._lock:
+            self._durations.clear()
+            self._errors.clear()
+            self._counts.clear()
+
+    def to_prometheus(self):
+        with self._lock:
+            durations = {labels: (list(histogram[0]), histogram[1], histogram[2]) for labels, histogram in self._durations.items()}
+            errors = dict(self._errors)
+            counts = dict(self._counts)
+
+        lines = [
+            "# HELP slidesgen_operation_duration_seconds Wall time of pipeline stages, LLM, search and vector store calls.",
+            "# TYPE slidesgen_operation_duration_seconds histogram"
+        ]
+
+        for labels, (bucket_counts, total_duration, num_calls) in sorted(durations.items()):
+            for bucket, bucket_count in zip(self._buckets, bucket_counts):
+                lines.append(f"slidesgen_operation_duration_seconds_bucket{{{format_labels(labels + (('le', bucket),))}}} {bucket_count}")
+
+            lines.append(f"slidesgen_operation_duration_seconds_bucket{{{format_labels(labels + (('le', '+Inf'),))}}} {num_calls}")
+            lines.append(f"slidesgen_operation_duration_seconds_sum{{{format_labels(labels)}}} {total_duration}")
+            lines.append(f"slidesgen_operation_duration_seconds_count{{{format_labels(labels)}}} {num_calls}")
+
+        lines.append("# HELP slidesgen_operation_errors_total Operations that raised.")
+        lines.append("# TYPE slidesgen_operation_errors_total counter")
+
+        for labels, num_errors in sorted(errors.items()):
+            lines.append(f"slidesgen_operation_errors_total{{{format_labels(labels)}}} {num_errors}")
+
+        for count_name in sorted({count_name for count_name, _ in counts}):
+            lines.append(f"# HELP slidesgen_{count_name}_total Sum of {count_name.replace('_', ' ')} over operations.")
+            lines.append(f"# TYPE slidesgen_{count_name}_total counter")
+
+            for (name, labels), value in sorted(counts.items()):
+                if name == count_name:
+                    lines.append(f"slidesgen_{count_name}_total{{{format_labels(labels)}}} {int(value) if value == int(value) else value}")
+
+        return "\n".join(lines) + "\n"
+
+registry = MetricsRegistry()
+
+# == Per-run collection
+class RunMetrics():
+    def __init__(self, run_id = None):
+        self.run_id = run_id or uuid4().hex
+
+        self._started_at = time.time()
+        self._finished_at = None
+
+        self._events = []
+        self._lock = threading.Lock()
+
+    def bind(self, func):
+        # Work done by func is attributed to this run, whichever thread it runs in
+        def bound_func(*args, **kwargs):
+            return contextvars.copy_context().run(self._run_bound, func, args, kwargs)
+
+        return bound_func
+
+    def _run_bound(self, func, args, kwargs):
+        _current_run.set(self)
+
+        return func(*args, **kwargs)
+
+    def add_event(self, event):
+        with self._lock:
+            self._events.append(event)
+
+    def finish(self):
+        self._finished_at = time.time()
+
+    def report(self):
+        with self._lock:
+            events = list(self._events)
+
+        stages = {}
+        operations = {}
+
+        for event in events:
+            if event["kind"] == "stage":
+                stage = stages.setdefault(event["name"], {"duration": 0.0, "errors": 0})
+                stage["duration"] += event["duration"]
+                stage["errors"] += int(event["error"])
+
+                continue
+
+            operation = operations.setdefault(f"{event['kind']}:{event['name']}", {"calls": 0, "duration": 0.0, "max_duration": 0.0, "errors": 0})
+            operation["calls"] += 1
+            operation["duration"] += event["duration"]
+            operation["max_duration"] = max(operation["max_duration"], event["duration"])
+            operation["errors"] += int(event["error"])
+
+            for count_name, value in event["counts"].items():
+                operation[count_name] = operation.get(count_name, 0) + value
+
+            # Calls made inside a stage are also summed up on the stage, e.g. its LLM tokens and searches
+            if event["stage"] is not None:
+                stage = stages.setdefault(event["stage"], {"duration": 0.0, "errors": 0})
+                stage[f"{event['kind']}_calls"] = stage.get(f"{event['kind']}_calls", 0) + 1
+                stage[f"{event['kind']}_duration"] = stage.get(f"{event['kind']}_duration", 0.0) + event["duration"]
+
+                for count_name, value in event["counts"].items():
+                    stage[f"{event['kind']}_{count_name}"] = stage.get(f"{event['kind']}_{count_name}", 0) + value
+
+        finished_at = self._finished_at or time.time()
+
+        return {
+            "run_id": self.run_id,
+            "started_at": self._started_at,
+            "duration": finished_at - self._started_at,
+            "slowest_stage": max(stages, key = lambda name: stages[name]["duration"], default = None),
+            "stages": stages,
+            "operations": operations
+        }
+
+    def to_json(self):
+        return json.dumps(self.report(), indent = 2)
+
+# ==
+def get_current_run():
+    return _current_run.get()
+
+def record(kind, name, duration, error = False, counts = None, stage = None):
+    stage = stage if stage is not None else _current_stage.get()
+    counts = counts or {}
+
+    registry.observe(kind, name, stage, duration, error, counts)
+
+    run_metrics = _current_run.get()
+
+    if run_metrics is not None:
+        run_metrics.add_event({
+            "kind": kind,
+            "name": name,
+            "stage": stage,
+            "duration": duration,
+            "error": error,
+            "counts": dict(counts)
+        })
+
+def add_count(count_name, value = 1):
+    # Adds to the innermost tracked operation of this thread, a no-op outside of one
+    counts = _current_counts.get()
+
+    if counts is not None:
+        counts[count_name] = counts.get(count_name, 0) + value
+
+@contextmanager
+def track(kind, name, **counts):
+    counts_token = _current_counts.set(counts)
+    stage_token = _current_stage.set(name) if kind == "stage" else None
+
+    error = False
+    start_time = time.perf_counter()
+
+    try:
+        yield counts
+
+    except BaseException:
+        error = True
+        raise
+
+    finally:
+        duration = time.perf_counter() - start_time
+
+        _current_counts.reset(counts_token)
+
+        if stage_token is not None:
+            _current_stage.reset(stage_token)
+
+        record(
+            kind = kind,
+            name = name,
+            duration = duration,
+            error = error,
+            counts = counts,
+            stage = name if kind == "stage" else None
+        )
+
+def to_prometheus():
+    return registry.to_prometheus()
+
+def export_run(run_metrics, report_directory = None, prometheus_file = None):
+    report_directory = metrics_report_directory if report_directory is None else report_directory
+    prometheus_file = metrics_prometheus_file if prometheus_file is None else prometheus_file
+
+    run_metrics.finish()
+    report = run_metrics.report()
+
+    stage_durations = ", ".join(f"{name} {stage['duration']:.1f}s" for name, stage in sorted(report["stages"].items(), key = lambda item: -item[1]["duration"]))
+    logger.info(f"Run {run_metrics.run_id} took {report['duration']:.1f}s: {stage_durations}")
+
+    if report_directory:
+        write_file_atomically(os.path.join(report_directory, f"{run_metrics.run_id}.json"), json.dumps(report, indent = 2))
+
+    if prometheus_file:
+        write_file_atomically(prometheus_file, to_prometheus())
+
+    return report
@@ -0,0 +1,224 @@
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from modules.metrics import track
+
+# ==
+class Stage():
+    def __init__(self, name, func, inputs = (), estimated_duration = 1.0, output_type = None):
+        # func is called with one keyword argument per input, its result is stored under the stage name.
+        # inputs is a list of value names, or a dict of argument name -> value name.
+        # Only stages with an output_type are checkpointed
+        self.name = name
+        self.func = func
+        self.arguments = dict(inputs) if isinstance(inputs, dict) else {input_name: input_name for input_name in inputs}
+        self.inputs = list(self.arguments.values())
+        self.estimated_duration = estimated_duration
+        self.output_type = output_type
+
+class StageGraph():
+    def __init__(self, stages):
+        self._stages = {}
+
+        for stage in stages:
+            if stage.name in self._stages:
+                raise ValueError(f"Duplicated stage: {stage.name}")
+
+            self._stages[stage.name] = stage
+
+        self._order = self._sort_stages()
+
+    @property
+    def stages(self):
+        return [self._stages[name] for name in self._order]
+
+    def _sort_stages(self):
+        order = []
+        visiting = set()
+        visited = set()
+
+        def visit(name, path):
+            if name in visited:
+                return
+
+            if name in visiting:
+                raise ValueError(f"Cycle between stages: {' -> '.join(path + [name])}")
+
+            visiting.add(name)
+
+            for input_name in self._stages[name].inputs:
+                if input_name in self._stages:
+                    visit(input_name, path + [name])
+
+            visiting.remove(name)
+            visited.add(name)
+            order.append(name)
+
+        for name in self._stages:
+            visit(name, [])
+
+        return order
+
+    def get_dependencies(self, names):
+        dependencies = set()
+        pending_names = list(names)
+
+        while len(pending_names) > 0:
+            name = pending_names.pop()
+
+            if name in dependencies or name not in self._stages:
+                continue
+
+            dependencies.add(name)
+            pending_names.extend(self._stages[name].inputs)
+
+        return dependencies
+
+    def _run_stage(self, stage, arguments, checkpoints = None):
+        with track("stage", stage.name):
+            value = stage.func(**arguments)
+
+        if checkpoints is not None and stage.output_type is not None:
+            if value is None:
+                raise ValueError(f"Stage {stage.name} returned nothing")
+
+            # Saved from the stage's thread, so it is kept even if another stage fails meanwhile
+            checkpoints.save(stage.name, value, stage.output_type)
+
+        return value
+
+    def iter_run(self, initial_values = None, max_concurrency = 4, targets = None, run_metrics = None, checkpoints = None):
+        # Stages whose output is already in initial_values are not run again, targets limits the run to what they need
+        # With run_metrics, the stages and every call they make are recorded on that run.
+        # With checkpoints, stage results are saved as they are done, and those saved by an earlier attempt are loaded instead of run
+        values = dict(initial_values or {})
+        needed_stages = self.get_dependencies(targets) if targets is not None else set(self._stages)
+
+        remaining_stages = [self._stages[name] for name in self._order if name not in values and name in needed_stages]
+
+        if checkpoints is not None:
+            saved_values = self.load_checkpoints(checkpoints, names = [stage.name for stage in remaining_stages])
+
+            for stage in list(remaining_stages):
+                if stage.name in saved_values:
+                    values[stage.name] = saved_values[stage.name]
+                    remaining_stages.remove(stage)
+
+                    yield stage.name, values[stage.name]
+
+        for stage in remaining_stages:
+            missing_inputs = [input_name for input_name in stage.inputs if input_name not in values and input_name not in self._stages]
+
+            if len(missing_inputs) > 0:
+                raise ValueError(f"Stage {stage.name} is missing inputs: {missing_inputs}")
+
+        run_stage = run_metrics.bind(self._run_stage) if run_metrics is not None else self._run_stage
+        running = {}
+
+        with ThreadPoolExecutor(max_workers = max(1, max_concurrency)) as executor:
+            try:
+                while len(remaining_stages) > 0 or len(running) > 0:
+                    # Start every stage whose dependencies are all done
+                    for stage in list(remaining_stages):
+                        if all(input_name in values for input_name in stage.inputs):
+                            future = executor.submit(run_stage, stage, {argument: values[input_name] for argument, input_name in stage.arguments.items()}, checkpoints)
+                            running[future] = stage.name
+
+                            remaining_stages.remove(stage)
+
+                    done, _ = wait(running, return_when = FIRST_COMPLETED)
+
+                    for future in done:
+                        name = running.pop(future)
+                        values[name] = future.result()
+
+                        yield name, values[name]
+
+            except BaseException:
+                for future in running:
+                    future.cancel()
+
+                raise
+
+    def load_checkpoints(self, checkpoints, names = None):
+        # Results of the checkpointed stages among names (all by default) that were saved
+        names = set(self._stages) if names is None else set(names)
+
+        return {
+            stage.name: checkpoints.load(stage.name, stage.output_type)
+            for stage in self.stages
+            if stage.name in names and stage.output_type is not None and checkpoints.has(stage.name)
+        }
+
+    def save_checkpoints(self, values, checkpoints):
+        # For results not made by a run, e.g. its initial values, so that its checkpoints hold every stage result
+        for name, value in values.items():
+            stage = self._stages.get(name)
+
+            if stage is not None and stage.output_type is not None and not checkpoints.has(name):
+                checkpoints.save(name, value, stage.output_type)
+
+    def run(self, initial_values = None, max_concurrency = 4, targets = None, run_metrics = None, checkpoints = None):
+        values = dict(initial_values or {})
+
+        for name, value in self.iter_run(initial_values = initial_values, max_concurrency = max_concurrency, targets = targets, run_metrics = run_metrics, checkpoints = checkpoints):
+            values[name] = value
+
+        return values
+
+    def schedule(self, durations = None):
+        # Earliest start and finish of every stage, with unlimited concurrency
+        durations = durations or {}
+        timings = {}
+
+        for name in self._order:
+            stage = self._stages[name]
+
+            start_time = max((timings[input_name][1] for input_name in stage.inputs if input_name in timings), default = 0.0)
+            timings[name] = (start_time, start_time + durations.get(name, stage.estimated_duration))
+
+        return timings
+
+    def critical_path(self, durations = None):
+        timings = self.schedule(durations)
+
+        if len(timings) == 0:
+            return 0.0, []
+
+        # Walk back from the last stage to finish, always through the input that finished last
+        name = max(timings, key = lambda stage_name: timings[stage_name][1])
+        path = [name]
+
+        while True:
+            stage_inputs = [input_name for input_name in self._stages[name].inputs if input_name in timings]
+
+            if len(stage_inputs) == 0:
+                break
+
+            name = max(stage_inputs, key = lambda input_name: timings[input_name][1])
+            path.append(name)
+
+        path.reverse()
+
+        return timings[path[-1]][1], path
+
+    def describe(self, durations = None):
+        durations = durations or {}
+
+        timings = self.schedule(durations)
+        total_duration, path = self.critical_path(durations)
+        serial_duration = sum(durations.get(name, stage.estimated_duration) for name, stage in self._stages.items())
+
+        lines = []
+
+        for name in sorted(self._order, key = lambda stage_name: timings[stage_name]):
+            start_time, finish_time = timings[name]
+            marker = "*" if name in path else " "
+            inputs = ", ".join(self._stages[name].inputs) or "-"
+
+            lines.append(f"{marker} {name:<28} {start_time:>7.1f} -> {finish_time:>7.1f}   needs: {inputs}")
+
+        lines.append("")
+        lines.append(f"Critical path: {' -> '.join(path)}")
+        lines.append(f"Critical path duration: {total_duration:.1f}, serial duration: {serial_duration:.1f}")
+
+        return "\n".join(lines)
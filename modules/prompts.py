@@ -0,0 +1,72 @@
+import os
+import glob
+import threading
+
+# ==
+prompts_directory = os.environ.get('PROMPTS_DIRECTORY', 'prompts')
+
+# ==
+class PromptRegistry():
+    def __init__(self, prompts_directory = prompts_directory):
+        self._prompts_directory = prompts_directory
+
+        self._templates = {} # prompt name -> (mtime, system prompt)
+        self._chains = {} # (prompt name, human message) -> (mtime, runnable, chain)
+
+        self._lock = threading.Lock()
+
+        for prompt_file in glob.glob(os.path.join(self._prompts_directory, "*.txt")):
+            self.get_system_prompt(os.path.splitext(os.path.basename(prompt_file))[0])
+
+    def _get_prompt_file(self, prompt_name):
+        return os.path.join(self._prompts_directory, f"{prompt_name}.txt")
+
+    def get_system_prompt(self, prompt_name):
+        # A stat per call is all it costs to notice an edited template, the file is only read again when it changed
+        prompt_file = self._get_prompt_file(prompt_name)
+        mtime = os.stat(prompt_file).st_mtime_ns
+
+        with self._lock:
+            cached_template = self._templates.get(prompt_name)
+
+            if cached_template is not None and cached_template[0] == mtime:
+                return mtime, cached_template[1]
+
+        with open(prompt_file, 'r') as file:
+            system_prompt = file.read()
+
+        with self._lock:
+            self._templates[prompt_name] = (mtime, system_prompt)
+
+        return mtime, system_prompt
+
+    def get_chain(self, prompt_name, human_message, runnable):
+        from langchain.prompts import ChatPromptTemplate
+
+        mtime, system_prompt = self.get_system_prompt(prompt_name)
+        chain_key = (prompt_name, human_message)
+
+        with self._lock:
+            cached_chain = self._chains.get(chain_key)
+
+            if cached_chain is not None and cached_chain[0] == mtime and cached_chain[1] is runnable:
+                return cached_chain[2]
+
+        messages = [
+            {
+                "role": "system", "content": system_prompt
+            },
+
+            {
+                "role": "human", "content": human_message
+            }
+        ]
+
+        prompt = ChatPromptTemplate.from_messages(messages)
+
+        chain = prompt | runnable
+
+        with self._lock:
+            self._chains[chain_key] = (mtime, runnable, chain)
+
+        return chain
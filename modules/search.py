@@ -0,0 +1,259 @@
+import os
+import time
+import hashlib
+import threading
+
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError
+
+from modules.caching import SQLiteCache
+from modules.metrics import track
+from modules.app_logging import setup_logging
+
+# ==
+logger = setup_logging(__name__)
+
+search_cache_file = os.environ.get('SEARCH_CACHE_FILE', 'database/search_cache.sqlite')
+search_cache_ttl = float(os.environ.get('SEARCH_CACHE_TTL', 24 * 60 * 60))
+search_cache_max_entries = int(os.environ.get('SEARCH_CACHE_MAX_ENTRIES', 10000))
+
+search_rate = float(os.environ.get('SEARCH_RATE', 1.0)) # searches per second
+search_burst = int(os.environ.get('SEARCH_BURST', 3))
+search_max_concurrency = int(os.environ.get('SEARCH_MAX_CONCURRENCY', 4))
+search_timeout = float(os.environ.get('SEARCH_TIMEOUT', 20)) # seconds for one search call
+search_max_wait = float(os.environ.get('SEARCH_MAX_WAIT', 60)) # seconds for a query, queueing, rate limits and retries included
+
+# == Utils functions
+def normalize_query(query):
+    return " ".join(query.lower().split())
+
+def hash_content(text):
+    return hashlib.sha256(text.strip().encode("utf-8")).hexdigest()
+
+def is_throttling_error(error):
+    message = str(error).lower()
+    
+    return "ratelimit" in message or "rate limit" in message or "429" in message or "too many requests" in message
+
+def deduplicate_documents(documents, new_documents):
+    # Keep only the new documents whose content is not already in documents, nor repeated among themselves
+    seen_hashes = {hash_content(document.page_content) for document in documents}
+    unique_documents = []
+
+    for document in new_documents:
+        content_hash = hash_content(document.page_content)
+
+        if content_hash not in seen_hashes:
+            seen_hashes.add(content_hash)
+            unique_documents.append(document)
+
+    return unique_documents
+
+# ==
+class CachedSearch():
+    def __init__(self, search_tool, cache = None):
+        self._search_tool = search_tool
+
+        self._cache = cache if cache is not None else SQLiteCache(
+            cache_file = search_cache_file,
+            max_entries = search_cache_max_entries,
+            ttl = search_cache_ttl
+        )
+
+    def _make_key(self, query):
+        return hashlib.sha256(normalize_query(query).encode("utf-8")).hexdigest()
+
+    def get_cached(self, query):
+        cached_result = self._cache.get(self._make_key(query))
+
+        return cached_result.decode("utf-8") if cached_result is not None else None
+
+    def invoke(self, query):
+        cached_result = self.get_cached(query)
+
+        if cached_result is not None:
+            return cached_result
+
+        result = self._search_tool.invoke(query)
+
+        self._cache.set(self._make_key(query), result.encode("utf-8"))
+
+        return result
+
+    def stats(self):
+        return self._cache.stats()
+
+class TokenBucket():
+    def __init__(self, rate, capacity):
+        self._rate = rate
+        self._capacity = capacity
+
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+
+        self._lock = threading.Lock()
+
+    def acquire(self, deadline = None):
+        # False when no token is free before the deadline (a time.monotonic() value)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+
+                self._tokens = min(self._capacity, self._tokens + (now - self._updated_at) * self._rate)
+                self._updated_at = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+
+                wait_time = (1 - self._tokens) / self._rate
+
+            if deadline is not None and now + wait_time > deadline:
+                return False
+
+            time.sleep(wait_time)
+
+class SearchTask():
+    # One query of search_many, given up on once its deadline passes, wherever it is then
+    def __init__(self, query, deadline):
+        self.query = query
+        self.deadline = deadline
+
+    def get_remaining_time(self):
+        return max(0.0, self.deadline - time.monotonic())
+
+class SearchScheduler():
+    def __init__(
+        self,
+        search,
+        rate = search_rate, burst = search_burst, max_concurrency = search_max_concurrency, timeout = search_timeout,
+        max_wait = search_max_wait, max_retries = 3, initial_backoff = 2.0, max_backoff = 60.0
+    ):
+        # timeout bounds each search call, max_wait a whole query from submission
+        self._search = search
+        self._timeout = timeout
+        self._max_wait = max_wait
+
+        self._max_retries = max_retries
+        self._initial_backoff = initial_backoff
+        self._max_backoff = max_backoff
+
+        self._bucket = TokenBucket(
+            rate = rate,
+            capacity = burst
+        )
+
+        self._executor = ThreadPoolExecutor(
+            max_workers = max_concurrency,
+            thread_name_prefix = "search"
+        )
+
+        # Shared by every query: a throttled search pauses all of them, not just its own section
+        self._backoff = 0.0
+        self._paused_until = 0.0
+        self._backoff_lock = threading.Lock()
+
+    def _wait_for_slot(self, deadline):
+        # False when the query would still be paused or out of rate budget at its deadline
+        while True:
+            with self._backoff_lock:
+                wait_time = self._paused_until - time.monotonic()
+
+            if wait_time <= 0:
+                break
+
+            if time.monotonic() + wait_time > deadline:
+                return False
+
+            time.sleep(wait_time)
+
+        return self._bucket.acquire(deadline)
+
+    def _on_throttled(self):
+        with self._backoff_lock:
+            self._backoff = min(self._max_backoff, self._backoff * 2 if self._backoff > 0 else self._initial_backoff)
+            self._paused_until = max(self._paused_until, time.monotonic() + self._backoff)
+
+            return self._backoff
+
+    def _on_success(self):
+        with self._backoff_lock:
+            self._backoff = self._backoff / 2 if self._backoff >= self._initial_backoff else 0.0
+
+    def _invoke(self, task):
+        # The call runs in a thread of its own: a hung search cannot be interrupted, but it only keeps that
+        # thread, never a worker of the scheduler. The rate limit bounds how many such threads can pile up
+        future = Future()
+
+        def call():
+            try:
+                future.set_result(self._search.invoke(task.query))
+
+            except BaseException as e:
+                future.set_exception(e)
+
+        threading.Thread(target = call, name = "search_call", daemon = True).start()
+
+        return future.result(timeout = min(self._timeout, task.get_remaining_time()))
+
+    def _run(self, task):
+        # Returns (result, whether it came from the cache), cache hits do not count against the rate budget
+        cached_result = self._search.get_cached(task.query)
+
+        if cached_result is not None:
+            return cached_result, True
+
+        for attempt in range(self._max_retries + 1):
+            if not self._wait_for_slot(task.deadline):
+                logger.error(f"Search for '{task.query}' gave up after waiting {self._max_wait}s for the rate limit")
+                return None, False
+
+            try:
+                result = self._invoke(task)
+                self._on_success()
+
+                return result, False
+
+            except TimeoutError:
+                logger.error(f"Search for '{task.query}' timed out after {min(self._timeout, self._max_wait)}s")
+                return None, False
+
+            except Exception as e:
+                if not is_throttling_error(e):
+                    logger.error(f"Search failed for '{task.query}': {e}")
+                    return None, False
+
+                backoff = self._on_throttled()
+
+                logger.warning(f"Search throttled for '{task.query}' (attempt {attempt + 1}), backing off {backoff:.1f}s")
+
+        logger.error(f"Search for '{task.query}' still throttled after {self._max_retries + 1} attempts")
+        return None, False
+
+    def search_many(self, queries):
+        with track("search", "search_many", queries = len(queries), cache_hits = 0, failures = 0) as counts:
+            # Every step of a query gives up at its deadline, queries still queued by then are cancelled
+            deadline = time.monotonic() + self._max_wait
+
+            tasks = [SearchTask(query, deadline) for query in queries]
+            futures = [self._executor.submit(self._run, task) for task in tasks]
+
+            results = []
+            for task, future in zip(tasks, futures):
+                try:
+                    result, is_cached = future.result(timeout = task.get_remaining_time())
+
+                except TimeoutError:
+                    future.cancel()
+
+                    logger.error(f"Search for '{task.query}' did not run within {self._max_wait}s")
+                    result, is_cached = None, False
+
+                counts["cache_hits"] += int(is_cached)
+                counts["failures"] += int(result is None)
+
+                results.append(result)
+
+        return results
+
+    def search(self, query):
+        return self.search_many([query])[0]
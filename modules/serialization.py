@@ -0,0 +1,235 @@
+import os
+
+from typing import Annotated, Literal, Union
+
+import msgpack
+
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError, Tag, Discriminator, WrapSerializer
+from pydantic_core import from_json, to_json
+
+from modules.metrics import open_atomically
+from modules.core import SlidesgenPresentation, TitleSlide, AgendaSlide, SectionTransitionSlide, SimpleContentSlide, QuoteSlide, ImpressionSlide, TwoColumnsSlide, ThankYouSlide
+
+# ==
+presentation_format = "slidesgen.presentation"
+format_version = 1
+
+# The tag lives here rather than on the slide models, so the schemas given to the LLM stay as they are.
+# Tags are part of the format: never rename one, add a migration instead
+slide_types = {
+    "title": TitleSlide,
+    "agenda": AgendaSlide,
+    "section_transition": SectionTransitionSlide,
+    "simple_content": SimpleContentSlide,
+    "quote": QuoteSlide,
+    "impression": ImpressionSlide,
+    "two_columns": TwoColumnsSlide,
+    "thank_you": ThankYouSlide
+}
+
+slide_tags = {slide_type: tag for tag, slide_type in slide_types.items()}
+
+# File extension -> encoding, .jsonl and .msgpack files can be read one slide at a time
+file_encodings = {
+    ".json": "json",
+    ".jsonl": "jsonl",
+    ".msgpack": "msgpack"
+}
+
+# == Tagged slides
+def get_slide_tag(value):
+    if isinstance(value, dict):
+        return value.get("type")
+
+    return slide_tags.get(type(value))
+
+def add_slide_tag(slide, handler):
+    return {"type": slide_tags[type(slide)], **handler(slide)}
+
+TaggedSlide = Annotated[
+    Union[tuple(Annotated[slide_type, Tag(tag)] for tag, slide_type in slide_types.items())],
+    Discriminator(get_slide_tag),
+    WrapSerializer(add_slide_tag)
+]
+
+slide_adapter = TypeAdapter(TaggedSlide)
+
+class PresentationDocument(BaseModel):
+    format: Literal["slidesgen.presentation"]
+    version: int
+
+    slides: list[TaggedSlide] = Field(
+        default_factory = list
+    )
+
+# == Versions
+def upgrade_untagged_document(document):
+    # Version 0 is SlidesgenPresentation.model_dump() as written before the format existed: its slides have to be guessed once
+    presentation = SlidesgenPresentation.model_validate(document)
+
+    return {
+        "format": presentation_format,
+        "version": 1,
+        "slides": [slide_adapter.dump_python(slide) for slide in presentation.slides]
+    }
+
+# Version -> function turning a document of that version into one of the next version
+migrations = {
+    0: upgrade_untagged_document
+}
+
+def get_version(header):
+    if not isinstance(header, dict):
+        raise ValueError(f"Not a presentation: expected an object, got {type(header).__name__}")
+
+    if "format" not in header:
+        return 0
+
+    if header["format"] != presentation_format:
+        raise ValueError(f"Not a presentation: unknown format {header['format']!r}")
+
+    version = header.get("version")
+
+    if not isinstance(version, int) or version < 1:
+        raise ValueError(f"Invalid presentation version: {version!r}")
+
+    if version > format_version:
+        raise ValueError(f"Presentation version {version} is newer than the supported version {format_version}")
+
+    return version
+
+def upgrade_document(document):
+    version = get_version(document)
+
+    while version < format_version:
+        document = migrations[version](document)
+        version += 1
+
+    return document
+
+def check_stream_header(header):
+    # Streams exist since version 1 and have no older version to upgrade from yet
+    if get_version(header) != format_version:
+        raise ValueError("Presentation streams need a header with the format and its version")
+
+def make_header():
+    return {"format": presentation_format, "version": format_version}
+
+def make_document(slides):
+    return PresentationDocument.model_construct(format = presentation_format, version = format_version, slides = list(slides))
+
+def to_presentation(document):
+    return SlidesgenPresentation.model_construct(slides = document.slides)
+
+# == JSON, one document
+def encode_json(presentation):
+    return make_document(presentation.slides).model_dump_json().encode("utf-8")
+
+def decode_json(data):
+    try:
+        # Fast path: the current version is parsed and validated in a single pass
+        document = PresentationDocument.model_validate_json(data)
+
+    except ValidationError:
+        # Older versions go through their migrations, anything else fails the same way again
+        return decode_document(from_json(data))
+
+    get_version({"format": document.format, "version": document.version})
+
+    return to_presentation(document)
+
+def decode_document(document):
+    return to_presentation(PresentationDocument.model_validate(upgrade_document(document)))
+
+# == msgpack, a header then one object per slide
+def encode_msgpack(presentation):
+    packer = msgpack.Packer()
+
+    return packer.pack(make_header()) + b"".join(packer.pack(slide_adapter.dump_python(slide)) for slide in presentation.slides)
+
+def decode_msgpack(data):
+    unpacker = msgpack.Unpacker(raw = False)
+    unpacker.feed(data)
+
+    header = next(unpacker, None)
+    check_stream_header(header)
+
+    return decode_document({**header, "slides": list(unpacker)})
+
+# == Streams, a slide at a time
+def write_slides(slides, file, encoding = "jsonl"):
+    # slides may be lazy, e.g. iter_presentation(): each slide is written as soon as it is made.
+    # file is opened in binary mode
+    if encoding == "jsonl":
+        header = to_json(make_header()) + b"\n"
+        encode_slide = lambda slide: slide_adapter.dump_json(slide) + b"\n"
+
+    elif encoding == "msgpack":
+        packer = msgpack.Packer()
+
+        header = packer.pack(make_header())
+        encode_slide = lambda slide: packer.pack(slide_adapter.dump_python(slide))
+
+    else:
+        raise ValueError(f"Unknown stream encoding: {encoding}")
+
+    file.write(header)
+    num_slides = 0
+
+    for slide in slides:
+        file.write(encode_slide(slide))
+        num_slides += 1
+
+    return num_slides
+
+def iter_slides(file, encoding = "jsonl"):
+    # Only one slide is held in memory at a time, whatever the size of the deck
+    if encoding == "jsonl":
+        check_stream_header(from_json(file.readline()))
+
+        for line in file:
+            if line.strip():
+                yield slide_adapter.validate_json(line)
+
+    elif encoding == "msgpack":
+        unpacker = msgpack.Unpacker(file, raw = False)
+
+        check_stream_header(next(unpacker, None))
+
+        for slide in unpacker:
+            yield slide_adapter.validate_python(slide)
+
+    else:
+        raise ValueError(f"Unknown stream encoding: {encoding}")
+
+# == Files
+def get_file_encoding(file):
+    extension = os.path.splitext(file)[1].lower()
+
+    if extension not in file_encodings:
+        raise ValueError(f"Unknown presentation file extension: {extension or file}, expected one of {', '.join(file_encodings)}")
+
+    return file_encodings[extension]
+
+def save_presentation(presentation, file):
+    # The encoding follows the file extension, the file is replaced only once fully written
+    encoding = get_file_encoding(file)
+
+    with open_atomically(file) as output_file:
+        if encoding == "json":
+            output_file.write(encode_json(presentation))
+
+        else:
+            write_slides(presentation.slides, output_file, encoding = encoding)
+
+def load_presentation(file):
+    encoding = get_file_encoding(file)
+
+    with open(file, 'rb') as input_file:
+        if encoding == "json":
+            return decode_json(input_file.read())
+
+        if encoding == "msgpack":
+            return decode_msgpack(input_file.read())
+
+        return SlidesgenPresentation.model_construct(slides = list(iter_slides(input_file, encoding = encoding)))
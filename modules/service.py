@@ -0,0 +1,329 @@
+import os
+import sys
+
+sys.path.append('../')
+
+# ==
+import json
+import time
+import asyncio
+import functools
+import itertools
+
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web
+from pydantic import ValidationError
+
+from modules.batch_jobs import BatchJob, BatchJobRunner
+from modules.metrics import RunMetrics
+from modules.serialization import slide_adapter
+from modules.app_logging import setup_logging
+
+# ==
+logger = setup_logging(__name__)
+
+# Seconds between comments sent on idle event streams, so that proxies keep them open
+keep_alive_interval = 15.0
+
+finished_statuses = ("done", "failed")
+
+# == Utils functions
+def format_event(event_id, name, data):
+    return f"id: {event_id}\nevent: {name}\ndata: {json.dumps(data, ensure_ascii = False)}\n\n".encode("utf-8")
+
+def json_error(status, message):
+    return web.json_response({"error": message}, status = status)
+
+# ==
+class ProgressMetrics(RunMetrics):
+    # Run metrics that also report each finished stage, from whichever thread ran it
+    def __init__(self, run_id, on_stage):
+        super().__init__(run_id = run_id)
+
+        self._on_stage = on_stage
+
+    def add_event(self, event):
+        super().add_event(event)
+
+        if event["kind"] == "stage":
+            self._on_stage(event)
+
+class ServiceJob():
+    # Lives in the event loop: worker threads hand their events over with call_soon_threadsafe
+    def __init__(self, job_id, job):
+        self.job_id = job_id
+        self.job = job
+        self.status = "queued"
+        self.result = None
+        self.error = None
+
+        self.events = []
+        self._changed = asyncio.Event()
+
+        self.add_event("status", {"status": "queued"})
+
+    @property
+    def is_finished(self):
+        return self.status in finished_statuses
+
+    def add_event(self, name, data):
+        self.events.append((name, data))
+
+        # Wakes up every stream waiting on this job
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def set_status(self, status, data = None):
+        self.status = status
+        self.error = (data or {}).get("error")
+        self.add_event(status if status in finished_statuses else "status", {"status": status, **(data or {})})
+
+    async def iter_events(self, start_index = 0, keep_alive_interval = keep_alive_interval):
+        # (event id, name, data) from start_index on, then as they come until the job is finished.
+        # None is yielded when nothing happened for keep_alive_interval seconds
+        index = start_index
+
+        while True:
+            changed = self._changed
+
+            while index < len(self.events):
+                yield index, *self.events[index]
+                index += 1
+
+            if self.is_finished:
+                return
+
+            try:
+                await asyncio.wait_for(changed.wait(), timeout = keep_alive_interval)
+
+            except asyncio.TimeoutError:
+                yield None
+
+class PresentationService():
+    def __init__(self, runner, num_workers = 4, max_queued_jobs = 100):
+        # Jobs wait in a bounded queue, num_workers of them run at a time in threads sharing the process clients
+        self._runner = runner
+        self._num_workers = num_workers
+
+        self._jobs = {}
+        self._queue = asyncio.Queue(maxsize = max_queued_jobs)
+        self._executor = ThreadPoolExecutor(max_workers = num_workers, thread_name_prefix = "slidesgen_job")
+        self._workers = []
+
+    async def start(self):
+        self._runner.configure_limits()
+        self._workers = [asyncio.create_task(self._work()) for _ in range(self._num_workers)]
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+
+        await asyncio.gather(*self._workers, return_exceptions = True)
+
+        # Queued jobs are dropped, running ones are waited for so that none outlives the clients it shares
+        await asyncio.get_running_loop().run_in_executor(None, functools.partial(self._executor.shutdown, wait = True, cancel_futures = True))
+
+    def get_job(self, job_id):
+        return self._jobs.get(job_id)
+
+    def submit(self, job):
+        # A job already queued, running or done is not submitted again, a failed one is resumed
+        job_id = job.get_id()
+        service_job = self._jobs.get(job_id)
+
+        if service_job is not None and service_job.status != "failed":
+            return service_job, False
+
+        service_job = ServiceJob(job_id, job)
+        self._queue.put_nowait(service_job) # Raises asyncio.QueueFull when the queue is full
+        self._jobs[job_id] = service_job
+
+        return service_job, True
+
+    def get_counts(self):
+        statuses = [service_job.status for service_job in self._jobs.values()]
+
+        return {status: statuses.count(status) for status in ("queued", "running", "done", "failed")}
+
+    async def _work(self):
+        loop = asyncio.get_running_loop()
+
+        while True:
+            service_job = await self._queue.get()
+
+            try:
+                service_job.set_status("running")
+
+                result = await loop.run_in_executor(self._executor, self._run_job, service_job, loop)
+                service_job.result = result
+
+                if result["error"] is None:
+                    service_job.set_status("done", {"num_slides": result["num_slides"], "elapsed_time": result["elapsed_time"], "pptx_url": f"/jobs/{service_job.job_id}/presentation.pptx"})
+
+                else:
+                    service_job.set_status("failed", {"error": result["error"]})
+
+            except Exception as e:
+                logger.error(f"Job {service_job.job_id} could not be run: {e}")
+                service_job.set_status("failed", {"error": f"{type(e).__name__}: {e}"})
+
+            finally:
+                self._queue.task_done()
+
+    def _run_job(self, service_job, loop):
+        # Runs in a worker thread
+        def emit(name, data):
+            try:
+                loop.call_soon_threadsafe(service_job.add_event, name, data)
+
+            except RuntimeError: # The server has stopped, the job goes on without listeners
+                pass
+
+        slide_indices = itertools.count()
+
+        run_metrics = ProgressMetrics(
+            run_id = service_job.job_id,
+            on_stage = lambda event: emit("stage", {"stage": event["name"], "duration": event["duration"], "error": event["error"]})
+        )
+
+        return self._runner.run_job(
+            job_id = service_job.job_id,
+            job = service_job.job,
+            on_slide = lambda slide: emit("slide", {"index": next(slide_indices), "slide": slide_adapter.dump_python(slide, mode = "json")}),
+            run_metrics = run_metrics
+        )
+
+    # == HTTP handlers
+    async def handle_submit(self, request):
+        try:
+            job = BatchJob.model_validate_json(await request.read())
+
+        except ValidationError as e:
+            return web.json_response({"error": "Invalid job", "details": json.loads(e.json())}, status = 400)
+
+        try:
+            service_job, is_new = self.submit(job)
+
+        except asyncio.QueueFull:
+            return json_error(503, "Too many queued jobs, retry later")
+
+        return web.json_response(
+            {
+                "job_id": service_job.job_id,
+                "status": service_job.status,
+                "status_url": f"/jobs/{service_job.job_id}",
+                "events_url": f"/jobs/{service_job.job_id}/events"
+            },
+            status = 202 if is_new else 200
+        )
+
+    async def handle_status(self, request):
+        job_id = request.match_info["job_id"]
+        service_job = self.get_job(job_id)
+
+        if service_job is None:
+            # Jobs of an earlier process are known from their status file
+            status = self._runner.load_status(job_id)
+
+            if status is None:
+                return json_error(404, f"Unknown job: {job_id}")
+
+            return web.json_response({key: value for key, value in status.items() if key not in ("presentation_file", "pptx_file")})
+
+        return web.json_response({
+            "job_id": job_id,
+            "status": service_job.status,
+            "num_slides": len([event for event in service_job.events if event[0] == "slide"]),
+            "stages": [data["stage"] for name, data in service_job.events if name == "stage"],
+            "error": service_job.error
+        })
+
+    async def handle_events(self, request):
+        # Server-sent events: status, stage, slide, then done or failed. Reconnecting clients send Last-Event-ID
+        service_job = self.get_job(request.match_info["job_id"])
+
+        if service_job is None:
+            return json_error(404, f"Unknown job: {request.match_info['job_id']}")
+
+        last_event_id = request.headers.get("Last-Event-ID", "")
+        start_index = int(last_event_id) + 1 if last_event_id.isdigit() else 0
+
+        response = web.StreamResponse(headers = {"Content-Type": "text/event-stream", "Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+        await response.prepare(request)
+
+        try:
+            async for event in service_job.iter_events(start_index):
+                await response.write(b": keep-alive\n\n" if event is None else format_event(*event))
+
+        except ConnectionResetError: # The client went away, the job goes on
+            return response
+
+        await response.write_eof()
+
+        return response
+
+    async def handle_download(self, request):
+        job_id = request.match_info["job_id"]
+        service_job = self.get_job(job_id)
+
+        status = service_job.result if service_job is not None else self._runner.load_status(job_id)
+
+        if status is None and service_job is None:
+            return json_error(404, f"Unknown job: {job_id}")
+
+        if status is None or status.get("status") != "done" or not os.path.exists(status["pptx_file"]):
+            return json_error(409, f"Job {job_id} has no presentation yet")
+
+        return web.FileResponse(
+            status["pptx_file"],
+            headers = {"Content-Disposition": f"attachment; filename=\"{job_id}.pptx\""}
+        )
+
+    async def handle_health(self, request):
+        return web.json_response({"status": "ok", "queued_jobs": self._queue.qsize(), "jobs": self.get_counts(), "time": time.time()})
+
+service_key = web.AppKey("service", PresentationService)
+
+def make_app(
+    output_directory, template_file, num_workers = 4, max_queued_jobs = 100,
+    llm_max_concurrency = None, search_max_concurrency = None
+):
+    runner = BatchJobRunner(
+        output_directory = output_directory,
+        template_file = template_file,
+        llm_max_concurrency = llm_max_concurrency,
+        search_max_concurrency = search_max_concurrency
+    )
+
+    app = web.Application()
+
+    async def start_service(app):
+        # The queue belongs to the event loop of the server, so the service is made once it runs
+        app[service_key] = PresentationService(
+            runner = runner,
+            num_workers = num_workers,
+            max_queued_jobs = max_queued_jobs
+        )
+
+        await app[service_key].start()
+
+    async def stop_service(app):
+        await app[service_key].stop()
+
+    def route(handler_name):
+        async def handler(request):
+            return await getattr(request.app[service_key], handler_name)(request)
+
+        return handler
+
+    app.on_startup.append(start_service)
+    app.on_cleanup.append(stop_service)
+
+    app.router.add_post("/jobs", route("handle_submit"))
+    app.router.add_get("/jobs/{job_id}", route("handle_status"))
+    app.router.add_get("/jobs/{job_id}/events", route("handle_events"))
+    app.router.add_get("/jobs/{job_id}/presentation.pptx", route("handle_download"))
+    app.router.add_get("/health", route("handle_health"))
+
+    return app
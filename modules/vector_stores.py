@@ -4,29 +4,76 @@ import sys
 sys.path.append('../')
 
 # ==
-from uuid import uuid4
+import json
+import hashlib
+import threading
 
-from langchain_community.document_loaders import PyMuPDFLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_core.documents import Document
 
 from langchain_chroma import Chroma
 
 from modules.embeddings import get_embedding_model
+from modules.metrics import track, add_count, open_atomically
+from modules.app_logging import setup_logging
 
 from functools import lru_cache
 
 # ==
-embeddings = get_embedding_model(
-    provider = os.environ['EMBEDDING_PROVIDER'],
-    model_name = os.environ['EMBEDDING_MODEL_NAME']
-)
+logger = setup_logging(__name__)
+
+# == Utils functions
+def hash_file(document_file):
+    file_hash = hashlib.sha256()
+    
+    with open(document_file, 'rb') as file:
+        for block in iter(lambda: file.read(1024 * 1024), b''):
+            file_hash.update(block)
+            
+    return file_hash.hexdigest()
+
+def load_txt_file(document_file):
+    with open(document_file, 'r', encoding = "utf-8") as file:
+        content = file.read()
+        
+    return [content]
+
+def load_pdf_file(document_file):
+    from langchain_community.document_loaders import PyMuPDFLoader
+    
+    loader = PyMuPDFLoader(document_file)
+    documents = loader.load()
+    
+    return [doc.page_content for doc in documents]
+
+def make_chunk_ids(file_hash, num_chunks):
+    return [f"{file_hash}-{chunk_index}" for chunk_index in range(num_chunks)]
+
+def make_search_filter(file_hashes, run_id):
+    # Chunks added for a run carry scope "run", they are left out unless the run is given.
+    # $ne also matches the chunks without a scope, i.e. the chunks of the user files
+    if file_hashes is None:
+        files_filter = {"scope": {"$ne": "run"}}
+        
+    elif len(file_hashes) > 0:
+        files_filter = {"file_hash": {"$in": list(file_hashes)}}
+        
+    else:
+        files_filter = None
+    
+    if run_id is None:
+        return files_filter
+    
+    run_filter = {"run_id": run_id}
+    
+    return {"$or": [files_filter, run_filter]} if files_filter is not None else run_filter
 
 # ==        
 class ChromaDB():
     def __init__(
         self, 
         collection_name, embeddings_provider, embeddings_model_name, persist_directory,
-        chunk_size = 2048, chunk_overlap = 128
+        chunk_size = 2048, chunk_overlap = 128, embeddings = None
     ):
         self._chunk_size = chunk_size
         self._chunk_overlap = chunk_overlap
@@ -38,42 +85,243 @@ class ChromaDB():
         
         self._vector_store = Chroma(
             collection_name = collection_name,
-            embedding_function = get_embedding_model(
+            embedding_function = embeddings or get_embedding_model(
                 provider = embeddings_provider,
                 model_name = embeddings_model_name
             ),
             persist_directory = persist_directory
         )
+        
+        # Manifest of indexed files: absolute path -> content hash and chunking used
+        self._manifest_file = os.path.join(persist_directory, f"{collection_name}_manifest.json") if persist_directory else None
+        self._manifest_lock = threading.Lock()
+        self._manifest = self._load_manifest()
+        
+    def _load_manifest(self):
+        if self._manifest_file is None or not os.path.exists(self._manifest_file):
+            return {}
+        
+        with open(self._manifest_file, 'r', encoding = "utf-8") as file:
+            return json.load(file)
+        
+    def _save_manifest(self):
+        if self._manifest_file is None:
+            return
+        
+        # A temporary file of its own then a rename, so neither a crash nor another process leaves a half-written manifest behind
+        with open_atomically(self._manifest_file) as file:
+            file.write(json.dumps(self._manifest, indent = 2).encode("utf-8"))
+        
+    def _make_manifest_entry(self, file_hash, num_chunks):
+        return {
+            "hash": file_hash,
+            "num_chunks": num_chunks,
+            "chunk_size": self._chunk_size,
+            "chunk_overlap": self._chunk_overlap
+        }
+        
+    def _find_indexed_entry(self, file_hash):
+        for entry in self._manifest.values():
+            if entry["hash"] == file_hash and entry["chunk_size"] == self._chunk_size and entry["chunk_overlap"] == self._chunk_overlap:
+                return entry
+            
+        return None
+    
+    def _record_indexed_file(self, document_file, entry):
+        # Must be called with the manifest lock held
+        previous_entry = self._manifest.get(document_file)
+        self._manifest[document_file] = entry
+        
+        if previous_entry is not None and previous_entry != entry:
+            # Drop the old chunks of this file, unless another indexed file still shares them
+            used_ids = set()
+            
+            for other_entry in self._manifest.values():
+                used_ids.update(make_chunk_ids(other_entry["hash"], other_entry["num_chunks"]))
+            
+            outdated_ids = [chunk_id for chunk_id in make_chunk_ids(previous_entry["hash"], previous_entry["num_chunks"]) if chunk_id not in used_ids]
+            
+            if len(outdated_ids) > 0:
+                logger.info(f"Removing {len(outdated_ids)} outdated chunks of {document_file}")
+                
+                self._vector_store.delete(
+                    ids = outdated_ids
+                )
+        
+    @property
+    def chunk_size(self):
+        return self._chunk_size
+    
+    @property
+    def chunk_overlap(self):
+        return self._chunk_overlap
+    
+    @property
+    def embeddings(self):
+        return self._vector_store.embeddings
+        
+    def get_indexed_hashes(self):
+        with self._manifest_lock:
+            return {
+                entry["hash"] for entry in self._manifest.values()
+                if entry["chunk_size"] == self._chunk_size and entry["chunk_overlap"] == self._chunk_overlap
+            }
+        
+    def is_indexed(self, document_file, file_hash = None):
+        document_file = os.path.abspath(document_file)
+        file_hash = file_hash or hash_file(document_file)
+        
+        with self._manifest_lock:
+            entry = self._manifest.get(document_file)
+            
+            return entry is not None and entry == self._make_manifest_entry(file_hash, entry["num_chunks"])
 
-    @lru_cache(maxsize = 32)
-    def add_document_from_txt_file(self, document_file):
-        with open(document_file, 'r', encoding = "utf-8") as file:
-            content = file.read()
+    def add_document_from_file(self, document_file, load_texts):
+        document_file = os.path.abspath(document_file)
+        file_hash = hash_file(document_file)
+        
+        if self.is_indexed(document_file, file_hash):
+            logger.info(f"Skipping {document_file}, already indexed")
+            return
+        
+        with self._manifest_lock:
+            indexed_entry = self._find_indexed_entry(file_hash)
+            
+            # Same content already indexed under another path, no need to embed it again
+            if indexed_entry is not None:
+                self._record_indexed_file(document_file, dict(indexed_entry))
+                self._save_manifest()
+                return
+        
+        chunks = self._text_splitter.create_documents(load_texts(document_file))
+        
+        for chunk in chunks:
+            chunk.metadata.update({"source": document_file, "file_hash": file_hash})
+        
+        if len(chunks) > 0:
+            # Deterministic ids, re-adding the same file overwrites instead of duplicating
+            with track("vector_store", "add_documents", documents = len(chunks)):
+                self._vector_store.add_documents(
+                    documents = chunks,
+                    ids = make_chunk_ids(file_hash, len(chunks)),
+                )
         
-        chunks = self._text_splitter.create_documents([content])
+        with self._manifest_lock:
+            self._record_indexed_file(document_file, self._make_manifest_entry(file_hash, len(chunks)))
+            self._save_manifest()
         
-        self._vector_store.add_documents(
-            documents = chunks,
-            ids = [str(uuid4()) for _ in range(len(chunks))],
+        ChromaDB._cached_similarity_search.cache_clear()
+
+    def upsert_embedded_chunks(self, ids, texts, embeddings, metadatas):
+        # Chunks are embedded by the caller, write them to the collection in a single batch
+        with track("vector_store", "upsert_embedded_chunks", documents = len(ids)):
+            self._vector_store._collection.upsert(
+                ids = ids,
+                documents = texts,
+                embeddings = embeddings,
+                metadatas = metadatas
+            )
+        
+        ChromaDB._cached_similarity_search.cache_clear()
+        
+    def record_indexed_files(self, indexed_files):
+        # indexed_files maps document file -> (file hash, number of chunks), None chunks reuses an indexed copy.
+        # Returns the files left unrecorded because their indexed copy is gone since, they must be parsed again
+        unrecorded_files = []
+        
+        with self._manifest_lock:
+            for document_file, (file_hash, num_chunks) in indexed_files.items():
+                if num_chunks is None:
+                    indexed_entry = self._find_indexed_entry(file_hash)
+                    
+                    if indexed_entry is None:
+                        logger.warning(f"Indexed copy of {document_file} is gone, it must be parsed again")
+                        unrecorded_files.append(document_file)
+                        continue
+                    
+                    entry = dict(indexed_entry)
+                    
+                else:
+                    entry = self._make_manifest_entry(file_hash, num_chunks)
+                    
+                self._record_indexed_file(os.path.abspath(document_file), entry)
+                
+            self._save_manifest()
+            
+        return unrecorded_files
+
+    def add_document_from_txt_file(self, document_file):
+        self.add_document_from_file(
+            document_file = document_file,
+            load_texts = load_txt_file
         )
 
-    @lru_cache(maxsize = 32)
     def add_document_from_pdf_file(self, document_file):        
-        loader = PyMuPDFLoader(document_file)
-        documents = loader.load()
+        self.add_document_from_file(
+            document_file = document_file,
+            load_texts = load_pdf_file
+        )
+    
+    def add_documents(self, documents, run_id = None):
+        # Ids come from the chunk content, so chunks stored earlier are neither duplicated nor embedded again.
+        # With a run_id, the chunks (e.g. web search results) are tagged with it and only found by searches of that run
+        chunks = {}
+
+        for document in documents:
+            chunk_id = f"chunk-{hashlib.sha256(document.page_content.encode('utf-8')).hexdigest()}"
+            
+            if run_id is not None:
+                chunk_id = f"{run_id}-{chunk_id}"
+                document = Document(page_content = document.page_content, metadata = {**document.metadata, "scope": "run", "run_id": run_id})
+            
+            chunks.setdefault(chunk_id, document)
+
+        if len(chunks) == 0:
+            return
+
+        stored_ids = set(self._vector_store.get(ids = list(chunks), include = [])["ids"])
+        new_chunks = {chunk_id: document for chunk_id, document in chunks.items() if chunk_id not in stored_ids}
+
+        if len(new_chunks) == 0:
+            return
         
-        chunks = self._text_splitter.create_documents([doc.page_content for doc in documents])
+        with track("vector_store", "add_documents", documents = len(new_chunks)):
+            self._vector_store.add_documents(
+                documents = list(new_chunks.values()),
+                ids = list(new_chunks),
+            )
         
-        self._vector_store.add_documents(
-            documents = chunks,
-            ids = [str(uuid4()) for _ in range(len(chunks))],
-        )
+        # Cached search results are stale once new chunks are stored
+        ChromaDB._cached_similarity_search.cache_clear()
+    
+    def similarity_search(self, query, num_chunks, file_hashes = None, run_id = None):
+        # file_hashes restricts the search to the chunks of these files, whatever else the collection holds.
+        # Chunks added for a run are only searched with its run_id
+        if file_hashes is not None:
+            file_hashes = tuple(sorted(set(file_hashes)))
+
+            if len(file_hashes) == 0 and run_id is None:
+                return []
+
+        with track("vector_store", "similarity_search", cache_hits = 0, cache_misses = 0) as counts:
+            results = self._cached_similarity_search(query, num_chunks, file_hashes, run_id)
+            
+            # The search only ran, and counted its miss, when the results were not cached
+            if counts["cache_misses"] == 0:
+                add_count("cache_hits", 1)
+            
+            counts["documents"] = len(results)
+            
+        return results
     
     @lru_cache(maxsize = 32)
-    def similarity_search(self, query, num_chunks):
+    def _cached_similarity_search(self, query, num_chunks, file_hashes = None, run_id = None):
+        add_count("cache_misses", 1) # Only runs on a cache miss
+        
         results = self._vector_store.similarity_search(
             query = query,
             k = num_chunks,
+            filter = make_search_filter(file_hashes, run_id)
         )
         
         return results
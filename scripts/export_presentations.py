@@ -0,0 +1,51 @@
+import sys
+sys.path.append('../')
+
+from dotenv import load_dotenv
+load_dotenv(
+    override = True
+)
+
+# ==
+import json
+import argparse
+
+from modules.batch_export import BatchExporter
+
+# ==
+def main():
+    parser = argparse.ArgumentParser(description = "Export directories, globs or files of saved presentations (.json, .jsonl, .msgpack) to .pptx in parallel.")
+    
+    parser.add_argument("paths", nargs = "+", help = "Directories, glob patterns or presentation files to export.")
+    parser.add_argument("--template", required = True, help = "Template .pptx file.")
+    parser.add_argument("--output-directory", default = "outputs")
+    parser.add_argument("--workers", type = int, default = None, help = "Number of export processes, defaults to the number of CPUs.")
+    parser.add_argument("--max-tasks-per-child", type = int, default = 50, help = "Presentations exported by a worker before it is replaced.")
+    parser.add_argument("--lean", action = "store_true", help = "Leave the template's prototype slides and their media out of the outputs.")
+    parser.add_argument("--report", default = None, help = "Also write the report to this JSON file.")
+    
+    args = parser.parse_args()
+    
+    exporter = BatchExporter(
+        template_file = args.template,
+        output_directory = args.output_directory,
+        num_workers = args.workers,
+        max_tasks_per_child = args.max_tasks_per_child,
+        lean = args.lean
+    )
+    
+    report = exporter.export(args.paths)
+    
+    if args.report:
+        with open(args.report, 'w', encoding = "utf-8") as file:
+            json.dump(report, file, indent = 2)
+            
+    for error in report["errors"]:
+        print(f"FAILED {error['file']}: {error['error']}")
+        
+    print(f"{report['num_exported']}/{report['num_files']} presentations exported in {report['elapsed_time']:.1f}s ({report['decks_per_second']:.2f} decks/s)")
+    
+    sys.exit(1 if report["num_failed"] > 0 else 0)
+
+if __name__ == "__main__":
+    main()
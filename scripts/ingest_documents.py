@@ -0,0 +1,47 @@
+import os
+import sys
+sys.path.append('../')
+
+from dotenv import load_dotenv
+load_dotenv(
+    override = True
+)
+
+# ==
+import argparse
+
+from modules.vector_stores import ChromaDB
+from modules.ingestion import BulkIngestor
+
+# ==
+def main():
+    parser = argparse.ArgumentParser(description = "Ingest directories, globs or files of .txt and .pdf documents into ChromaDB.")
+    
+    parser.add_argument("paths", nargs = "+", help = "Directories, glob patterns or files to ingest.")
+    parser.add_argument("--collection", default = "local_pdfs")
+    parser.add_argument("--workers", type = int, default = None, help = "Number of parsing processes, defaults to the number of CPUs.")
+    parser.add_argument("--embedding-batch-size", type = int, default = 64)
+    parser.add_argument("--max-concurrency", type = int, default = 4, help = "Number of embedding requests in flight.")
+    parser.add_argument("--write-batch-size", type = int, default = 4096)
+    
+    args = parser.parse_args()
+    
+    vector_store = ChromaDB(
+        collection_name = args.collection,
+        embeddings_provider = os.environ['EMBEDDING_PROVIDER'],
+        embeddings_model_name = os.environ['EMBEDDING_MODEL_NAME'],
+        persist_directory = os.environ['CHROMA_PERSIST_DIRECTORY']
+    )
+    
+    ingestor = BulkIngestor(
+        vector_store = vector_store,
+        num_workers = args.workers,
+        embedding_batch_size = args.embedding_batch_size,
+        max_concurrency = args.max_concurrency,
+        write_batch_size = args.write_batch_size
+    )
+    
+    ingestor.ingest(args.paths)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import sys
+sys.path.append('../')
+
+# ==
+import argparse
+import subprocess
+
+# ==
+def measure_import_time(module_name):
+    # -X importtime writes "import time: self [us] | cumulative | imported package" lines to stderr
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module_name}"],
+        capture_output = True,
+        text = True
+    )
+    
+    if result.returncode != 0:
+        raise RuntimeError(f"Failed to import {module_name}:\n{result.stderr}")
+    
+    timings = []
+    
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        
+        _, cumulative, imported_module = line[len("import time:"):].split("|")
+        timings.append((int(cumulative) / 1e6, imported_module.rstrip()))
+    
+    total_time = next(cumulative for cumulative, imported_module in timings if imported_module.strip() == module_name)
+    
+    return total_time, timings
+
+def main():
+    parser = argparse.ArgumentParser(description = "Measure how long importing a module takes.")
+    
+    parser.add_argument("modules", nargs = "*", default = ["modules.core", "main"])
+    parser.add_argument("--top", type = int, default = 10, help = "Number of slowest imports to show.")
+    parser.add_argument("--budget", type = float, default = None, help = "Fail when an import takes longer than this, in seconds.")
+    
+    args = parser.parse_args()
+    
+    is_over_budget = False
+    
+    for module_name in args.modules:
+        total_time, timings = measure_import_time(module_name)
+        
+        print(f"{module_name}: {total_time:.3f}s")
+        
+        for cumulative, imported_module in sorted(timings, reverse = True)[1:args.top + 1]:
+            print(f"  {cumulative:.3f}s {imported_module.strip()}")
+            
+        if args.budget is not None and total_time > args.budget:
+            is_over_budget = True
+            
+    sys.exit(1 if is_over_budget else 0)
+
+if __name__ == "__main__":
+    main()
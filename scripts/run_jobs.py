@@ -0,0 +1,51 @@
+import sys
+sys.path.append('../')
+
+from dotenv import load_dotenv
+load_dotenv(
+    override = True
+)
+
+# ==
+import json
+import argparse
+
+from modules.batch_jobs import BatchJobRunner
+
+# ==
+def main():
+    parser = argparse.ArgumentParser(description = "Make a presentation and its .pptx for every job of a JSONL file, several jobs at a time.")
+    
+    parser.add_argument("jobs_file", help = "JSONL file, one {\"instruction\": ..., \"documents\": [...], \"template\": ..., \"id\": ...} job per line.")
+    parser.add_argument("--template", default = "templates/minimal-template.pptx", help = "Template .pptx file of jobs that do not set one.")
+    parser.add_argument("--output-directory", default = "outputs/jobs", help = "Each job writes its status, presentation and .pptx to <output directory>/<job id>/.")
+    parser.add_argument("--workers", type = int, default = 4, help = "Number of jobs run at a time.")
+    parser.add_argument("--llm-max-concurrency", type = int, default = None, help = "LLM calls in flight across all jobs.")
+    parser.add_argument("--search-max-concurrency", type = int, default = None, help = "Searches in flight across all jobs.")
+    parser.add_argument("--report", default = None, help = "Also write the report to this JSON file.")
+    
+    args = parser.parse_args()
+    
+    runner = BatchJobRunner(
+        output_directory = args.output_directory,
+        template_file = args.template,
+        num_workers = args.workers,
+        llm_max_concurrency = args.llm_max_concurrency,
+        search_max_concurrency = args.search_max_concurrency
+    )
+    
+    report = runner.run(args.jobs_file)
+    
+    if args.report:
+        with open(args.report, 'w', encoding = "utf-8") as file:
+            json.dump(report, file, indent = 2)
+            
+    for error in report["errors"]:
+        print(f"FAILED {error['job_id']}: {error['error']}")
+        
+    print(f"{report['num_done']}/{report['num_jobs']} jobs done, {report['num_skipped']} skipped, in {report['elapsed_time']:.1f}s ({report['jobs_per_hour']:.1f} jobs/hour)")
+    
+    sys.exit(1 if report["num_failed"] > 0 else 0)
+
+if __name__ == "__main__":
+    main()
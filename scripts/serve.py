@@ -0,0 +1,56 @@
+import os
+import sys
+sys.path.append('../')
+
+from dotenv import load_dotenv
+load_dotenv(
+    override = True
+)
+
+# ==
+import argparse
+
+from aiohttp import web
+
+from modules.service import make_app
+
+# ==
+def main():
+    parser = argparse.ArgumentParser(description = "Serve presentation jobs over HTTP, with progress and slides streamed as server-sent events.")
+    
+    parser.add_argument("--host", default = "127.0.0.1")
+    parser.add_argument("--port", type = int, default = 8000)
+    parser.add_argument("--template", default = "templates/minimal-template.pptx", help = "Template .pptx file of jobs that do not set one.")
+    parser.add_argument("--output-directory", default = "outputs/jobs")
+    parser.add_argument("--workers", type = int, default = 4, help = "Number of jobs run at a time.")
+    parser.add_argument("--max-queued-jobs", type = int, default = 100, help = "Submissions beyond this many waiting jobs are refused.")
+    parser.add_argument("--llm-max-concurrency", type = int, default = None, help = "LLM calls in flight across all jobs.")
+    parser.add_argument("--search-max-concurrency", type = int, default = None, help = "Searches in flight across all jobs.")
+    parser.add_argument("--fake-backends", action = "store_true", help = "Use the offline stand-ins of the benchmarks for the LLM, embeddings and search.")
+    parser.add_argument("--fake-latency", type = float, default = 0.5, help = "Seconds per fake LLM call.")
+    
+    args = parser.parse_args()
+    
+    if args.fake_backends:
+        from benchmarks.fakes import install_fakes, make_template
+        
+        install_fakes(llm_latency = args.fake_latency)
+        
+        # A stand-in template too, when the real one is missing
+        if not os.path.exists(args.template):
+            os.makedirs(args.output_directory, exist_ok = True)
+            args.template = make_template(os.path.join(args.output_directory, "fake-template.pptx"))
+    
+    app = make_app(
+        output_directory = args.output_directory,
+        template_file = args.template,
+        num_workers = args.workers,
+        max_queued_jobs = args.max_queued_jobs,
+        llm_max_concurrency = args.llm_max_concurrency,
+        search_max_concurrency = args.search_max_concurrency
+    )
+    
+    web.run_app(app, host = args.host, port = args.port)
+
+if __name__ == "__main__":
+    main()
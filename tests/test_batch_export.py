@@ -0,0 +1,39 @@
+import os
+import sys
+sys.path.append("..")
+
+from benchmarks.fakes import make_template, make_deck
+from modules.batch_export import BatchExporter, find_presentation_files, make_output_files
+
+# ==
+def test_make_output_files_avoids_name_clashes(tmp_path):
+    output_files = make_output_files(["/a/deck.json", "/b/deck.json", "/b/other.json"], str(tmp_path))
+    
+    assert sorted(os.path.basename(output_file) for output_file in output_files.values()) == ["deck.pptx", "deck_1.pptx", "other.pptx"]
+
+def test_exports_decks_and_reports_errors(tmp_path):
+    template_file = make_template(str(tmp_path / "template.pptx"))
+    
+    decks_directory = tmp_path / "decks"
+    decks_directory.mkdir()
+    
+    for deck_index in range(3):
+        (decks_directory / f"deck_{deck_index}.json").write_text(make_deck(10 + deck_index).model_dump_json(), encoding = "utf-8")
+        
+    (decks_directory / "broken.json").write_text("{\"slides\": [{\"nothing\": 1}]}", encoding = "utf-8")
+    
+    assert len(find_presentation_files([str(decks_directory)])) == 4
+    
+    report = BatchExporter(
+        template_file = template_file,
+        output_directory = str(tmp_path / "pptx"),
+        num_workers = 2,
+        max_tasks_per_child = 1
+    ).export([str(decks_directory)])
+    
+    assert report["num_exported"] == 3
+    assert report["num_failed"] == 1
+    assert report["errors"][0]["file"].endswith("broken.json")
+    assert "ValidationError" in report["errors"][0]["error"]
+    assert report["decks_per_second"] > 0
+    assert sorted(os.listdir(tmp_path / "pptx")) == ["deck_0.pptx", "deck_1.pptx", "deck_2.pptx"]
@@ -0,0 +1,148 @@
+import os
+import sys
+sys.path.append("..")
+
+import json
+
+import pytest
+
+from benchmarks.fakes import install_fakes, make_template
+from modules import checkpoints
+from modules.batch_jobs import BatchJobRunner, read_jobs
+from modules.components import reset_components
+from modules.bedrock_llm import configure_llm_concurrency
+from modules.serialization import load_presentation
+
+# ==
+@pytest.fixture
+def fakes(tmp_path, monkeypatch):
+    monkeypatch.setattr(checkpoints, "checkpoints_directory", str(tmp_path / "runs"))
+    
+    yield install_fakes(
+        llm_latency = 0.0,
+        search_latency = 0.0,
+        num_sections = 2,
+        slides_per_section = 2
+    )
+    
+    reset_components()
+    configure_llm_concurrency(0)
+
+# ==
+def test_runs_jobs_and_skips_done_ones(fakes, tmp_path):
+    jobs_file = tmp_path / "jobs.jsonl"
+    jobs_file.write_text("\n".join([
+        json.dumps({"id": "solar", "instruction": "Solar energy"}),
+        json.dumps({"instruction": "Wind energy"}),
+        "",
+        "{\"documents\": []}"
+    ]), encoding = "utf-8")
+    
+    assert [job_id for job_id, _, _ in read_jobs(str(jobs_file))][::2] == ["solar", "line-4"]
+    
+    runner = BatchJobRunner(
+        output_directory = str(tmp_path / "jobs"),
+        template_file = make_template(str(tmp_path / "template.pptx")),
+        num_workers = 2,
+        llm_max_concurrency = 2
+    )
+    
+    report = runner.run(str(jobs_file))
+    
+    assert (report["num_jobs"], report["num_done"], report["num_failed"]) == (3, 2, 1)
+    assert report["errors"][0]["job_id"] == "line-4"
+    assert report["jobs_per_hour"] > 0
+    
+    status = runner.load_status("solar")
+    
+    assert status["status"] == "done"
+    assert os.path.exists(status["pptx_file"])
+    assert len(load_presentation(status["presentation_file"]).slides) == status["num_slides"] == 2 + 2 * 3 + 1
+    
+    report = runner.run(str(jobs_file))
+    
+    assert (report["num_done"], report["num_skipped"], report["num_failed"]) == (0, 2, 1)
+
+def test_retrieves_only_the_documents_of_the_job(fakes, tmp_path):
+    from modules.components import get_embeddings, set_component
+    from modules.vector_stores import ChromaDB
+    from modules.batch_jobs import BatchJob
+    
+    set_component("vector_store", ChromaDB(
+        collection_name = "jobs",
+        embeddings_provider = None,
+        embeddings_model_name = None,
+        persist_directory = str(tmp_path / "chroma"),
+        embeddings = get_embeddings()
+    ))
+    
+    for name in ("solar", "wind"):
+        (tmp_path / name).mkdir()
+        (tmp_path / name / f"{name}.txt").write_text(f"Notes about {name} energy and the grid.", encoding = "utf-8")
+    
+    runner = BatchJobRunner(
+        output_directory = str(tmp_path / "jobs"),
+        template_file = None,
+        num_chunks = 4
+    )
+    
+    solar_job = BatchJob(instruction = "Energy and the grid", documents = [str(tmp_path / "solar")])
+    solar_documents, _ = runner._load_documents(solar_job)
+    
+    runner._load_documents(BatchJob(instruction = "Energy and the grid", documents = [str(tmp_path / "wind")]))
+    
+    # The wind job's files do not change what the solar job retrieves
+    assert [document.metadata["source"] for document in solar_documents] == [str(tmp_path / "solar" / "solar.txt")]
+    assert runner._load_documents(solar_job)[0] == solar_documents
+
+def test_section_retrieval_stays_within_the_job(fakes, tmp_path):
+    from modules.components import get_embeddings, set_component
+    from modules.vector_stores import ChromaDB
+    
+    vector_store = ChromaDB(
+        collection_name = "jobs",
+        embeddings_provider = None,
+        embeddings_model_name = None,
+        persist_directory = str(tmp_path / "chroma"),
+        embeddings = get_embeddings()
+    )
+    
+    set_component("vector_store", vector_store)
+    
+    searches = []
+    similarity_search = vector_store.similarity_search
+    
+    def record_search(query, num_chunks, file_hashes = None, run_id = None):
+        results = similarity_search(query, num_chunks, file_hashes = file_hashes, run_id = run_id)
+        searches.append((file_hashes, run_id, results))
+        return results
+    
+    vector_store.similarity_search = record_search
+    
+    jobs = []
+    for name in ("solar", "wind"):
+        (tmp_path / name).mkdir()
+        (tmp_path / name / f"{name}.txt").write_text(f"Notes about {name} energy, its sections and the grid.", encoding = "utf-8")
+        jobs.append(json.dumps({"id": name, "instruction": f"{name} energy", "documents": [str(tmp_path / name)]}))
+    
+    jobs_file = tmp_path / "jobs.jsonl"
+    jobs_file.write_text("\n".join(jobs), encoding = "utf-8")
+    
+    runner = BatchJobRunner(
+        output_directory = str(tmp_path / "jobs"),
+        template_file = make_template(str(tmp_path / "template.pptx")),
+        num_workers = 2,
+        retrieval_num_chunks = 4
+    )
+    
+    assert runner.run(str(jobs_file))["num_done"] == 2
+    
+    # Every search, the per-section ones included, only returned chunks of the files of its job or web results of its run
+    def is_own_chunk(document, file_hashes, run_id):
+        return document.metadata.get("file_hash") in file_hashes or document.metadata.get("run_id") == run_id
+    
+    assert len(searches) > 2
+    assert all(
+        file_hashes is not None and len(file_hashes) == 1 and all(is_own_chunk(document, file_hashes, run_id) for document in results)
+        for file_hashes, run_id, results in searches
+    )
@@ -0,0 +1,214 @@
+import sys
+sys.path.append("..")
+
+import time
+import asyncio
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from modules.bedrock_llm import configure_llm_cache, invoke_llm_or_chains, get_llm_cache, RetryPolicy, CircuitBreaker, CircuitOpenError, LLMCallError, safe_llm_call, is_retryable_error, configure_llm_concurrency, acquire_llm_slot, aacquire_llm_slot
+
+# ==
+class FlakyCall():
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.num_calls = 0
+        
+    def __call__(self):
+        self.num_calls += 1
+        
+        if self.errors:
+            raise self.errors.pop(0)
+        
+        return "ok"
+
+def make_policy(max_retries = 2):
+    return RetryPolicy(
+        max_retries = max_retries,
+        base_delay = 0.001,
+        max_delay = 0.01
+    )
+
+# ==
+def test_classifies_errors():
+    assert is_retryable_error(ValueError("Error raised by bedrock service: An error occurred (ThrottlingException)"))
+    assert is_retryable_error(TimeoutError())
+    assert not is_retryable_error(ValueError("An error occurred (ValidationException): malformed input"))
+    
+    try:
+        try:
+            raise ValueError("An error occurred (AccessDeniedException)")
+        except ValueError as e:
+            raise RuntimeError("wrapped") from e
+        
+    except RuntimeError as e:
+        assert not is_retryable_error(e)
+
+def test_retries_transient_errors():
+    call = FlakyCall([Exception("ThrottlingException"), TimeoutError("read timed out")])
+    
+    wrapped = safe_llm_call(policy = make_policy(), circuit_breaker = CircuitBreaker())(call)
+    
+    assert wrapped() == "ok"
+    assert call.num_calls == 3
+
+def test_does_not_retry_fatal_errors():
+    call = FlakyCall([ValueError("ValidationException: bad request")])
+    
+    wrapped = safe_llm_call(policy = make_policy(), circuit_breaker = CircuitBreaker())(call)
+    
+    with pytest.raises(LLMCallError):
+        wrapped()
+        
+    assert call.num_calls == 1
+
+def test_returns_fallback_when_exhausted():
+    call = FlakyCall([Exception("throttled")] * 3)
+    
+    wrapped = safe_llm_call(fallback = "fallback", policy = make_policy(), circuit_breaker = CircuitBreaker())(call)
+    
+    assert wrapped() == "fallback"
+
+def test_circuit_breaker_sheds_load():
+    circuit_breaker = CircuitBreaker(
+        failure_rate = 0.5,
+        window = 4,
+        cooldown = 60,
+        min_calls = 2
+    )
+    
+    call = FlakyCall([Exception("throttled")] * 10)
+    wrapped = safe_llm_call(policy = make_policy(max_retries = 0), circuit_breaker = circuit_breaker)(call)
+    
+    for _ in range(2):
+        with pytest.raises(LLMCallError):
+            wrapped()
+    
+    with pytest.raises(CircuitOpenError):
+        wrapped()
+        
+    assert call.num_calls == 2
+
+def test_circuit_breaker_lets_a_single_probe_through():
+    circuit_breaker = CircuitBreaker(
+        failure_rate = 0.5,
+        window = 4,
+        cooldown = 0.05,
+        min_calls = 2
+    )
+    
+    for _ in range(2):
+        circuit_breaker.record(success = False)
+        
+    assert not circuit_breaker.allow_request()
+    time.sleep(0.06)
+    
+    # Half-open: one probe, the others are shed until it reports back
+    assert circuit_breaker.allow_request()
+    assert not any(circuit_breaker.allow_request() for _ in range(5))
+    
+    # A failed probe opens the circuit for another cooldown
+    circuit_breaker.record(success = False)
+    assert not circuit_breaker.allow_request()
+    time.sleep(0.06)
+    
+    assert circuit_breaker.allow_request()
+    assert not circuit_breaker.allow_request()
+    
+    # A successful one closes it
+    circuit_breaker.record(success = True)
+    assert not circuit_breaker.is_open
+    assert all(circuit_breaker.allow_request() for _ in range(5))
+
+def test_async_variant_retries():
+    errors = [Exception("ServiceUnavailable")]
+    
+    async def call():
+        if errors:
+            raise errors.pop(0)
+        
+        return "ok"
+    
+    wrapped = safe_llm_call(policy = make_policy(), circuit_breaker = CircuitBreaker())(call)
+    
+    assert asyncio.run(wrapped()) == "ok"
+
+
+def test_limits_llm_calls_in_flight():
+    in_flight = []
+    max_in_flight = []
+    lock = threading.Lock()
+    
+    def call():
+        with acquire_llm_slot():
+            with lock:
+                in_flight.append(1)
+                max_in_flight.append(len(in_flight))
+                
+            time.sleep(0.02)
+            
+            with lock:
+                in_flight.pop()
+    
+    async def acall():
+        async with aacquire_llm_slot():
+            await asyncio.sleep(0.02)
+    
+    configure_llm_concurrency(2)
+    
+    try:
+        with ThreadPoolExecutor(max_workers = 6) as executor:
+            list(executor.map(lambda _: call(), range(12)))
+            
+        async def run_all():
+            await asyncio.gather(*(acall() for _ in range(4)))
+            
+        asyncio.run(run_all())
+        
+    finally:
+        configure_llm_concurrency(0)
+        
+    assert max(max_in_flight) == 2
+
+def test_caches_responses_as_json(tmp_path):
+    from langchain_core.messages import AIMessage
+    from langchain_core.runnables import RunnableLambda
+    
+    from modules.core import PresentationOutline
+    
+    outline = PresentationOutline.model_validate({
+        "title": "Solar energy",
+        "sections": [{"title": "Panels", "objective": "Explain panels", "subsections_title": ["Cells", "Inverters"]}]
+    })
+    
+    num_calls = []
+    
+    def make_response(input):
+        num_calls.append(input)
+        return AIMessage(content = "", tool_calls = [{"name": "search", "args": {"query": input}, "id": "1"}]) if input.startswith("search") else outline
+    
+    chains = RunnableLambda(make_response)
+    
+    configure_llm_cache("on", cache_file = str(tmp_path / "llm_cache.sqlite"))
+    
+    try:
+        message = invoke_llm_or_chains(chains, "search panels")
+        
+        assert invoke_llm_or_chains(chains, "search panels") == message
+        assert invoke_llm_or_chains(chains, "outline", output_type = PresentationOutline) == outline
+        assert invoke_llm_or_chains(chains, "outline", output_type = PresentationOutline) == outline
+        assert len(num_calls) == 2
+        
+        # Without its type a structured output cannot be read back, the LLM is called again
+        assert invoke_llm_or_chains(chains, "outline") == outline
+        assert len(num_calls) == 3
+        
+        configure_llm_cache("replay")
+        
+        assert invoke_llm_or_chains(chains, "search panels").tool_calls[0]["args"] == {"query": "search panels"}
+        
+    finally:
+        configure_llm_cache("off")
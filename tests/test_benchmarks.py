@@ -0,0 +1,69 @@
+import os
+import sys
+sys.path.append("..")
+
+import pytest
+
+from langchain_core.documents import Document
+
+from benchmarks.fakes import install_fakes, make_template, make_deck, HashEmbeddings
+from benchmarks.run_benchmarks import percentile, find_regressions
+from modules.components import reset_components
+
+# ==
+@pytest.fixture
+def fakes():
+    yield install_fakes(
+        llm_latency = 0.0,
+        search_latency = 0.0,
+        num_sections = 3,
+        slides_per_section = 2
+    )
+    
+    reset_components()
+
+# ==
+def test_pipeline_runs_offline(fakes):
+    from modules.core import make_presentation
+    
+    presentation = make_presentation(
+        user_instruction = "Make a presentation about renewable energy",
+        provided_documents = [Document(page_content = "Solar panels convert sunlight into electricity.")]
+    )
+    
+    # Title, agenda, 3 x (transition + 2 content slides), thank you
+    assert len(presentation.slides) == 2 + 3 * 3 + 1
+
+def test_hash_embeddings_are_deterministic():
+    embeddings = HashEmbeddings(dimensions = 64)
+    
+    assert embeddings.embed_query("solar energy") == embeddings.embed_documents(["solar energy"])[0]
+    assert len(embeddings.embed_query("solar energy")) == 64
+
+def test_export_with_generated_template(tmp_path):
+    from pptx import Presentation
+    from modules.converter import presentation2pptx
+    
+    template_file = make_template(str(tmp_path / "template.pptx"))
+    presentation = make_deck(20)
+    
+    presentation2pptx(
+        presentation = presentation,
+        template_file = template_file,
+        output_file = str(tmp_path / "output.pptx")
+    )
+    
+    assert os.path.exists(tmp_path / "output.pptx")
+    assert len(Presentation(str(tmp_path / "output.pptx")).slides) >= len(presentation.slides)
+
+def test_percentile():
+    assert percentile([1, 2, 3, 4, 5], 0.5) == 3
+    assert percentile([1, 2], 0.5) == 1.5
+    assert percentile([7], 0.99) == 7
+
+def test_find_regressions():
+    baseline = {"export": {"p50": 1.0}}
+    
+    assert find_regressions({"export": {"p50": 1.1}}, baseline, tolerance = 0.2) == []
+    assert len(find_regressions({"export": {"p50": 1.5}}, baseline, tolerance = 0.2)) == 1
+    assert find_regressions({"pipeline": {"p50": 9.0}}, baseline, tolerance = 0.2) == []
@@ -0,0 +1,122 @@
+import sys
+sys.path.append("..")
+
+import time
+
+import pytest
+
+from modules.caching import SQLiteCache
+
+# ==
+def test_get_and_set(tmp_path):
+    cache = SQLiteCache(
+        cache_file = str(tmp_path / "cache.sqlite")
+    )
+    
+    cache.set("a", b"1")
+    
+    assert cache.get("a") == b"1"
+    assert cache.get("b") is None
+    assert cache.stats() == {"hits": 1, "misses": 1, "entries": 1}
+
+def test_persists_across_instances(tmp_path):
+    cache_file = str(tmp_path / "cache.sqlite")
+    
+    SQLiteCache(cache_file = cache_file).set_many({"a": b"1", "b": b"2"})
+    
+    assert SQLiteCache(cache_file = cache_file).get_many(["a", "b", "c"]) == {"a": b"1", "b": b"2"}
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = SQLiteCache(
+        cache_file = str(tmp_path / "cache.sqlite"),
+        max_entries = 2
+    )
+    
+    cache.set("a", b"1")
+    time.sleep(0.01)
+    cache.set("b", b"2")
+    time.sleep(0.01)
+    cache.get("a")
+    time.sleep(0.01)
+    cache.set("c", b"3")
+    
+    assert cache.get_many(["a", "b", "c"]) == {"a": b"1", "c": b"3"}
+
+def test_expires_entries(tmp_path):
+    cache = SQLiteCache(
+        cache_file = str(tmp_path / "cache.sqlite"),
+        ttl = 0.01
+    )
+    
+    cache.set("a", b"1")
+    time.sleep(0.05)
+    
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+def test_cached_embeddings_only_embed_misses(tmp_path):
+    pytest.importorskip("langchain_core")
+    
+    from modules.embeddings import CachedEmbeddings
+    
+    class CountingEmbeddings():
+        def __init__(self):
+            self.num_texts = 0
+            
+        def embed_documents(self, texts):
+            self.num_texts += len(texts)
+            return [[float(len(text)), 0.5] for text in texts]
+        
+        def embed_query(self, text):
+            self.num_texts += 1
+            return [float(len(text)), 0.5]
+    
+    remote_embeddings = CountingEmbeddings()
+    
+    embeddings = CachedEmbeddings(
+        embeddings = remote_embeddings,
+        provider = "test",
+        model_name = "test",
+        cache = SQLiteCache(cache_file = str(tmp_path / "embeddings.sqlite"))
+    )
+    
+    assert embeddings.embed_documents(["ab", "abc", "ab"]) == [[2.0, 0.5], [3.0, 0.5], [2.0, 0.5]]
+    assert embeddings.embed_documents(["abc", "abcd"]) == [[3.0, 0.5], [4.0, 0.5]]
+    assert embeddings.embed_query("ab") == [2.0, 0.5]
+    assert embeddings.embed_query("ab") == [2.0, 0.5]
+    
+    assert remote_embeddings.num_texts == 4
+
+def test_cached_search_normalizes_queries(tmp_path):
+    from modules.search import CachedSearch
+    
+    class CountingSearch():
+        def __init__(self):
+            self.num_calls = 0
+            
+        def invoke(self, query):
+            self.num_calls += 1
+            return f"results for {query}"
+    
+    search_tool = CountingSearch()
+    
+    cached_search = CachedSearch(
+        search_tool = search_tool,
+        cache = SQLiteCache(cache_file = str(tmp_path / "search.sqlite"))
+    )
+    
+    assert cached_search.invoke("Large  Language Models") == "results for Large  Language Models"
+    assert cached_search.invoke("large language models ") == "results for Large  Language Models"
+    assert search_tool.num_calls == 1
+
+def test_deduplicate_documents():
+    from modules.search import deduplicate_documents
+    
+    class Document():
+        def __init__(self, page_content):
+            self.page_content = page_content
+    
+    documents = [Document("a"), Document("b")]
+    new_documents = [Document("b "), Document("c"), Document("c"), Document("d")]
+    
+    assert [document.page_content for document in deduplicate_documents(documents, new_documents)] == ["c", "d"]
@@ -0,0 +1,118 @@
+import os
+import sys
+sys.path.append("..")
+
+import pytest
+
+from langchain_core.documents import Document
+from langchain_core.runnables import RunnableLambda
+
+from benchmarks.fakes import install_fakes
+from modules import checkpoints
+from modules.components import get_llm, set_component, reset_components
+from modules.core import ContentSlides, MetaSlides, make_presentation, regenerate_presentation, load_run_values
+
+# ==
+@pytest.fixture
+def fakes(tmp_path, monkeypatch):
+    monkeypatch.setattr(checkpoints, "checkpoints_directory", str(tmp_path / "runs"))
+    
+    yield install_fakes(
+        llm_latency = 0.0,
+        search_latency = 0.0,
+        num_sections = 3,
+        slides_per_section = 2
+    )
+    
+    reset_components()
+
+def install_counting_component(name, runnable, calls, failing_section = None):
+    def invoke(prompt_value):
+        calls.append(name)
+        
+        if failing_section is not None and f"Section {failing_section}:" in prompt_value.to_string():
+            raise ValueError(f"{name} is down")
+        
+        return runnable.invoke(prompt_value)
+    
+    set_component(name, RunnableLambda(invoke))
+
+def install_content_slides_maker(calls, failing_section = None):
+    install_counting_component("content_slides_maker", get_llm().with_structured_output(ContentSlides), calls, failing_section)
+
+# ==
+def test_resumes_a_failed_run_from_its_missing_stages(fakes, tmp_path):
+    documents = [Document(page_content = "Solar panels convert sunlight into electricity.")]
+    calls = []
+    
+    install_content_slides_maker(calls, failing_section = 2)
+    
+    with pytest.raises(Exception, match = "down"):
+        make_presentation(user_instruction = "Renewable energy", provided_documents = documents, run_id = "run1")
+        
+    saved_stages = checkpoints.RunCheckpoints("run1").list_stages()
+    
+    assert "presentation_outline" in saved_stages and "meta_slides" in saved_stages
+    assert "content_slides_1" not in saved_stages
+    
+    calls.clear()
+    install_content_slides_maker(calls)
+    
+    presentation = make_presentation(user_instruction = "Renewable energy", provided_documents = documents, run_id = "run1")
+    
+    # Only the failed section is made again
+    assert len(calls) == 3 - len([name for name in saved_stages if name.startswith("content_slides_")])
+    assert len(presentation.slides) == 2 + 3 * 3 + 1
+    
+    calls.clear()
+    
+    assert make_presentation(user_instruction = "Renewable energy", provided_documents = documents, run_id = "run1") == presentation
+    assert len(calls) == 0
+    
+    with pytest.raises(ValueError, match = "other inputs"):
+        make_presentation(user_instruction = "Something else", provided_documents = documents, run_id = "run1")
+
+def test_regenerates_only_edited_sections(fakes):
+    calls = []
+    
+    install_content_slides_maker(calls)
+    install_counting_component("meta_slides_maker", get_llm().with_structured_output(MetaSlides), calls)
+    install_counting_component("documents_enricher", get_llm().bind_tools([fakes[1]]), calls)
+    
+    presentation = make_presentation(user_instruction = "Renewable energy", provided_documents = [], run_id = "first")
+    presentation_outline = load_run_values("first")["presentation_outline"]
+    
+    # A new objective for the second section: only that section is enriched and made again
+    edited_outline = presentation_outline.model_copy(deep = True)
+    edited_outline.sections[1].objective = "Convince the audience that wind power is cheap."
+    
+    calls.clear()
+    edited_presentation = regenerate_presentation(
+        user_instruction = "Renewable energy",
+        provided_documents = [],
+        presentation_outline = edited_outline,
+        previous_run_id = "first",
+        run_id = "second"
+    )
+    
+    assert "meta_slides_maker" not in calls
+    assert calls.count("content_slides_maker") == 1
+    assert len(edited_presentation.slides) == len(presentation.slides)
+    assert edited_presentation.slides[:5] == presentation.slides[:5]
+    
+    # Reordered sections keep their slides, the meta slides are made again for the new order
+    reordered_outline = edited_outline.model_copy(deep = True)
+    reordered_outline.sections.reverse()
+    
+    calls.clear()
+    reordered_presentation = regenerate_presentation(
+        user_instruction = "Renewable energy",
+        provided_documents = [],
+        presentation_outline = reordered_outline,
+        previous_run_id = "second",
+        run_id = "third"
+    )
+    
+    assert calls == ["meta_slides_maker"]
+    assert reordered_presentation.slides[3:5] == edited_presentation.slides[-3:-1]
+    assert sorted(load_run_values("third")) == sorted(load_run_values("second"))
@@ -0,0 +1,94 @@
+import sys
+sys.path.append("..")
+
+import os
+import time
+import threading
+import subprocess
+
+import pytest
+
+from modules.components import get_component, set_component, reset_components
+
+# ==
+def test_builds_each_component_once():
+    reset_components()
+    
+    num_builds = []
+    
+    def factory():
+        num_builds.append(1)
+        return object()
+    
+    assert get_component("thing", factory) is get_component("thing", factory)
+    assert len(num_builds) == 1
+    
+    reset_components()
+
+def test_uses_injected_components():
+    reset_components()
+    
+    component = object()
+    set_component("thing", component)
+    
+    assert get_component("thing", lambda: None) is component
+    
+    reset_components()
+
+def test_slow_builds_do_not_block_other_components():
+    reset_components()
+    
+    started = threading.Event()
+    
+    def slow_factory():
+        started.set()
+        time.sleep(0.5)
+        return "slow"
+    
+    thread = threading.Thread(target = get_component, args = ("slow", slow_factory))
+    thread.start()
+    started.wait()
+    
+    start_time = time.monotonic()
+    
+    assert get_component("fast", lambda: "fast") == "fast"
+    assert time.monotonic() - start_time < 0.2
+    
+    thread.join()
+    reset_components()
+
+def test_replacing_a_component_rebuilds_its_dependents():
+    reset_components()
+    
+    set_component("llm", "old model")
+    
+    def get_outliner():
+        return get_component("outliner", lambda: f"outliner of {get_component('llm', lambda: None)}")
+    
+    assert get_outliner() == "outliner of old model"
+    
+    set_component("llm", "new model")
+    
+    assert get_outliner() == "outliner of new model"
+    
+    reset_components()
+
+def test_importing_core_builds_no_clients():
+    pytest.importorskip("pydantic")
+    
+    # No credentials in the environment: any client built at import time would fail
+    env = {key: value for key, value in os.environ.items() if not key.startswith(("AWS_", "EMBEDDING_", "CHROMA_", "BASE_LLM"))}
+    
+    result = subprocess.run(
+        [
+            sys.executable, "-c",
+            "import sys, modules.core; print(','.join(name for name in ('langchain_aws', 'langchain_chroma', 'chromadb') if name in sys.modules))"
+        ],
+        capture_output = True,
+        text = True,
+        env = env,
+        cwd = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    )
+    
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == ""
@@ -0,0 +1,87 @@
+import sys
+sys.path.append("..")
+
+from langchain_core.documents import Document
+
+from modules.context import ContextPacker, estimate_tokens, no_documents_text
+
+# ==
+def make_packer(max_tokens, diversity = 0.7, duplicate_threshold = 0.9):
+    return ContextPacker(
+        budgets = {"stage": max_tokens},
+        diversity = diversity,
+        duplicate_threshold = duplicate_threshold
+    )
+
+# ==
+def test_ranks_relevant_documents_first():
+    documents = [
+        Document(page_content = "Bananas are rich in potassium and grow in tropical climates."),
+        Document(page_content = "Solar panels convert sunlight into electricity using photovoltaic cells."),
+        Document(page_content = "Wind turbines also produce renewable electricity.")
+    ]
+    
+    packed = make_packer(1000).pack(documents, query = "solar electricity from sunlight", stage = "stage")
+    
+    assert packed.text.startswith("Solar panels")
+    assert packed.report["num_packed"] == 3
+    assert packed.report["dropped_tokens"] == 0
+
+def test_drops_near_duplicates():
+    text = "Solar panels convert sunlight into electricity using photovoltaic cells."
+    documents = [Document(page_content = text), Document(page_content = text + " "), Document(page_content = "Wind turbines spin.")]
+    
+    packed = make_packer(1000).pack(documents, query = "solar panels", stage = "stage")
+    
+    assert packed.report["num_duplicates"] == 1
+    assert packed.report["num_packed"] == 2
+    assert packed.text.count("Solar panels") == 1
+
+def test_respects_token_budget():
+    documents = [Document(page_content = f"chunk {i} " + "word " * 40) for i in range(10)]
+    
+    packed = make_packer(150, duplicate_threshold = 1.1).pack(documents, query = "word", stage = "stage")
+    
+    assert packed.report["packed_tokens"] <= 150
+    assert estimate_tokens(packed.text) <= 150
+    assert packed.report["num_packed"] + packed.report["num_over_budget"] == 10
+    assert packed.report["dropped_tokens"] == sum(estimate_tokens(document.page_content) for document in documents[packed.report["num_packed"]:])
+
+def test_truncates_single_oversized_document():
+    packed = make_packer(20).pack([Document(page_content = "x" * 1000)], query = "x", stage = "stage")
+    
+    assert packed.report["num_truncated"] == 1
+    assert estimate_tokens(packed.text) <= 20
+
+def test_empty_documents():
+    packed = make_packer(100).pack([], query = "anything", stage = "stage")
+    
+    assert packed.text == no_documents_text
+    assert packed.report["packed_tokens"] == 0
+
+def test_fit_cuts_long_text():
+    packer = make_packer(10)
+    
+    assert packer.fit("short", stage = "stage").text == "short"
+    assert packer.fit("y" * 400, stage = "stage").report["num_truncated"] == 1
+
+def test_stops_ranking_once_the_budget_is_full(monkeypatch):
+    from modules import context
+    
+    num_similarities = []
+    cosine_similarity = context.cosine_similarity
+    
+    def count_similarity(vector1, vector2):
+        num_similarities.append(1)
+        return cosine_similarity(vector1, vector2)
+    
+    monkeypatch.setattr(context, "cosine_similarity", count_similarity)
+    
+    documents = [Document(page_content = f"chunk {i} about topic {i % 17} " + "word " * 40) for i in range(200)]
+    
+    packed = make_packer(150, duplicate_threshold = 1.1).pack(documents, query = "topic 3", stage = "stage")
+    
+    assert packed.report["num_packed"] + packed.report["num_over_budget"] == 200
+    assert packed.report["dropped_tokens"] == packed.report["total_tokens"] - sum(estimate_tokens(text) for text in packed.text.split(context.documents_separator))
+    # A full ranking would take about 200 * 200 / 2 similarities
+    assert len(num_similarities) < 200 * 10
@@ -9,15 +9,14 @@ load_dotenv(
 )
 
 # ==
-import json
-
 from langchain_aws.chat_models.bedrock import ChatBedrock
 
 from modules.vector_stores import ChromaDB
 from modules.app_logging import setup_logging
 
-from modules.core import SlidesgenPresentation, make_presentation
+from modules.core import make_presentation
 from modules.converter import presentation2pptx
+from modules.serialization import load_presentation
 
 import os
 
@@ -43,9 +42,7 @@ vector_store = ChromaDB(
    
 # ==
 def main():  
-    with open("outputs/output.json", "r", encoding = "utf-8") as file:
-        data = json.load(file)
-        presentation = SlidesgenPresentation(**data)
+    presentation = load_presentation("outputs/output.json")
     
     presentation2pptx(
         presentation = presentation,
@@ -0,0 +1,57 @@
+import sys
+sys.path.append("..")
+
+import threading
+
+import pytest
+
+from langchain_core.documents import Document
+from langchain_core.runnables import RunnableLambda
+
+from benchmarks.fakes import install_fakes
+from modules.components import get_llm, set_component, reset_components
+from modules.core import AgendaSlide, ContentSlides, TitleSlide, iter_presentation
+
+# ==
+@pytest.fixture
+def fakes():
+    yield install_fakes(
+        llm_latency = 0.0,
+        search_latency = 0.0,
+        num_sections = 3,
+        slides_per_section = 2
+    )
+
+    reset_components()
+
+# ==
+def test_yields_the_first_slides_before_the_sections_are_done(fakes):
+    sections_released = threading.Event()
+    waits = []
+
+    content_slides_maker = get_llm().with_structured_output(ContentSlides)
+
+    def make_content_slides(prompt_value):
+        # Times out, rather than hangs, if the first slides wait for the sections
+        waits.append(sections_released.wait(timeout = 5))
+
+        return content_slides_maker.invoke(prompt_value)
+
+    set_component("content_slides_maker", RunnableLambda(make_content_slides))
+
+    slides = iter_presentation(
+        user_instruction = "Renewable energy",
+        provided_documents = [Document(page_content = "Solar panels convert sunlight into electricity.")],
+        max_concurrency = 8,
+        retrieval_num_chunks = 0
+    )
+
+    first_slides = [next(slides), next(slides)]
+
+    assert not sections_released.is_set()
+    assert isinstance(first_slides[0], TitleSlide) and isinstance(first_slides[1], AgendaSlide)
+
+    sections_released.set()
+
+    assert len(list(slides)) == 3 * 3 + 1
+    assert waits == [True] * 3
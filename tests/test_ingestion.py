@@ -0,0 +1,95 @@
+import sys
+sys.path.append("..")
+
+from benchmarks.fakes import HashEmbeddings
+from modules.ingestion import BulkIngestor
+from modules.vector_stores import ChromaDB
+
+# ==
+class CountingEmbeddings(HashEmbeddings):
+    def __init__(self):
+        super().__init__()
+        
+        self.num_embedded_texts = 0
+        
+    def embed_documents(self, texts):
+        self.num_embedded_texts += len(texts)
+        
+        return super().embed_documents(texts)
+
+def make_ingestor(tmp_path):
+    embeddings = CountingEmbeddings()
+    
+    vector_store = ChromaDB(
+        collection_name = "ingested",
+        embeddings_provider = None,
+        embeddings_model_name = None,
+        persist_directory = str(tmp_path / "chroma"),
+        chunk_size = 64,
+        chunk_overlap = 0,
+        embeddings = embeddings
+    )
+    
+    return BulkIngestor(vector_store, num_workers = 1), vector_store, embeddings
+
+def write_documents(directory, documents):
+    directory.mkdir(exist_ok = True)
+    
+    for name, content in documents.items():
+        (directory / name).write_bytes(content if isinstance(content, bytes) else content.encode("utf-8"))
+        
+    return str(directory)
+
+# ==
+def test_skips_unchanged_files(tmp_path):
+    ingestor, _, embeddings = make_ingestor(tmp_path)
+    documents_directory = write_documents(tmp_path / "data", {"solar.txt": "Solar panels turn sunlight into electricity.", "wind.txt": "Wind turbines spin."})
+    
+    assert ingestor.ingest([documents_directory])["num_ingested_files"] == 2
+    num_embedded_texts = embeddings.num_embedded_texts
+    
+    report = ingestor.ingest([documents_directory])
+    
+    assert (report["num_ingested_files"], report["num_skipped_files"], report["num_chunks"]) == (0, 2, 0)
+    assert embeddings.num_embedded_texts == num_embedded_texts
+
+def test_embeds_content_shared_by_two_paths_once(tmp_path):
+    ingestor, vector_store, embeddings = make_ingestor(tmp_path)
+    
+    content = "Solar panels turn sunlight into electricity."
+    first_directory = write_documents(tmp_path / "first", {"solar.txt": content})
+    second_directory = write_documents(tmp_path / "second", {"solar.txt": content, "copy.txt": content})
+    
+    report = ingestor.ingest([first_directory, second_directory])
+    
+    assert (report["num_ingested_files"], report["num_reused_files"]) == (1, 2)
+    assert embeddings.num_embedded_texts == 1
+    
+    # A later run reuses the indexed copy as well
+    third_directory = write_documents(tmp_path / "third", {"solar.txt": content})
+    
+    assert ingestor.ingest([third_directory])["num_reused_files"] == 1
+    assert embeddings.num_embedded_texts == 1
+    assert all(vector_store.is_indexed(str(tmp_path / name / "solar.txt")) for name in ("first", "second", "third"))
+
+def test_a_failing_file_does_not_stop_the_others(tmp_path):
+    ingestor, vector_store, _ = make_ingestor(tmp_path)
+    documents_directory = write_documents(tmp_path / "data", {"solar.txt": "Solar panels turn sunlight into electricity.", "broken.txt": b"\xff\xfe\xfa not utf-8"})
+    
+    report = ingestor.ingest([documents_directory])
+    
+    assert (report["num_ingested_files"], report["num_failed_files"]) == (1, 1)
+    assert vector_store.is_indexed(str(tmp_path / "data" / "solar.txt"))
+    assert not vector_store.is_indexed(str(tmp_path / "data" / "broken.txt"))
+
+def test_records_files_without_chunks(tmp_path):
+    ingestor, vector_store, embeddings = make_ingestor(tmp_path)
+    documents_directory = write_documents(tmp_path / "data", {"empty.txt": ""})
+    
+    report = ingestor.ingest([documents_directory])
+    
+    assert (report["num_ingested_files"], report["num_failed_files"], report["num_chunks"]) == (0, 0, 0)
+    assert embeddings.num_embedded_texts == 0
+    assert vector_store.is_indexed(str(tmp_path / "data" / "empty.txt"))
+    
+    assert ingestor.ingest([documents_directory])["num_skipped_files"] == 1
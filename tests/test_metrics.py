@@ -0,0 +1,111 @@
+import os
+import sys
+sys.path.append("..")
+
+import pytest
+
+from modules import metrics
+from modules.metrics import RunMetrics, track, add_count
+from modules.pipeline import Stage, StageGraph
+
+# ==
+@pytest.fixture(autouse = True)
+def reset_registry():
+    metrics.registry.reset()
+    yield
+    metrics.registry.reset()
+
+# ==
+def test_track_records_counts_on_the_run():
+    run_metrics = RunMetrics("run")
+    
+    def work():
+        with track("llm", "call", input_tokens = 10) as counts:
+            add_count("retries")
+            add_count("retries")
+            counts["output_tokens"] = 5
+            
+    run_metrics.bind(work)()
+    
+    operation = run_metrics.report()["operations"]["llm:call"]
+    
+    assert operation["calls"] == 1
+    assert operation["input_tokens"] == 10
+    assert operation["output_tokens"] == 5
+    assert operation["retries"] == 2
+
+def test_add_count_outside_of_track_is_ignored():
+    add_count("retries")
+
+def test_errors_are_recorded():
+    run_metrics = RunMetrics()
+    
+    def fail():
+        with track("search", "search_many"):
+            raise RuntimeError("boom")
+        
+    with pytest.raises(RuntimeError):
+        run_metrics.bind(fail)()
+        
+    assert run_metrics.report()["operations"]["search:search_many"]["errors"] == 1
+
+def test_stage_graph_attributes_calls_to_stages():
+    def make_stage_func(num_tokens):
+        def func(**values):
+            with track("llm", "call", input_tokens = num_tokens):
+                pass
+            
+            return num_tokens
+        
+        return func
+    
+    graph = StageGraph([
+        Stage("a", make_stage_func(1)),
+        Stage("b", make_stage_func(2), ["a"]),
+        Stage("c", make_stage_func(3), ["a"])
+    ])
+    
+    run_metrics = RunMetrics()
+    graph.run(run_metrics = run_metrics)
+    
+    report = run_metrics.report()
+    
+    assert set(report["stages"]) == {"a", "b", "c"}
+    assert report["stages"]["c"]["llm_input_tokens"] == 3
+    assert report["stages"]["b"]["llm_calls"] == 1
+    assert report["operations"]["llm:call"]["input_tokens"] == 6
+
+def test_prometheus_export():
+    with track("vector_store", "similarity_search", documents = 4):
+        pass
+    
+    text = metrics.to_prometheus()
+    
+    assert "# TYPE slidesgen_operation_duration_seconds histogram" in text
+    assert 'slidesgen_operation_duration_seconds_count{kind="vector_store",name="similarity_search",stage=""} 1' in text
+    assert 'slidesgen_documents_total{kind="vector_store",name="similarity_search",stage=""} 4' in text
+
+def test_export_run_writes_report(tmp_path):
+    run_metrics = RunMetrics("exported")
+    
+    metrics.export_run(
+        run_metrics,
+        report_directory = str(tmp_path),
+        prometheus_file = str(tmp_path / "slidesgen.prom")
+    )
+    
+    assert (tmp_path / "exported.json").exists()
+    assert (tmp_path / "slidesgen.prom").exists()
+
+def test_concurrent_atomic_writes_of_one_file(tmp_path):
+    from concurrent.futures import ThreadPoolExecutor
+    
+    file = str(tmp_path / "metrics.prom")
+    
+    with ThreadPoolExecutor(max_workers = 8) as executor:
+        list(executor.map(lambda index: metrics.write_file_atomically(file, f"run {index}\n" * 1000), range(200)))
+        
+    with open(file, 'r', encoding = "utf-8") as input_file:
+        assert len(set(input_file.read().splitlines())) == 1
+        
+    assert sorted(os.listdir(tmp_path)) == ["metrics.prom"]
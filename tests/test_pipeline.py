@@ -0,0 +1,139 @@
+import sys
+sys.path.append("..")
+
+import time
+
+import pytest
+
+from modules.pipeline import Stage, StageGraph
+
+# ==
+def make_sleeping_stage(name, inputs = (), delay = 0.1, estimated_duration = 1.0):
+    def func(**values):
+        time.sleep(delay)
+        return f"{name}({', '.join(str(values[input_name]) for input_name in sorted(values))})"
+    
+    return Stage(
+        name = name,
+        func = func,
+        inputs = inputs,
+        estimated_duration = estimated_duration
+    )
+
+# ==
+def test_runs_independent_stages_concurrently():
+    graph = StageGraph([
+        make_sleeping_stage("a"),
+        make_sleeping_stage("b", ["a"]),
+        make_sleeping_stage("c", ["a"]),
+        make_sleeping_stage("d", ["b", "c"])
+    ])
+    
+    start_time = time.monotonic()
+    values = graph.run()
+    
+    assert values["d"] == "d(b(a()), c(a()))"
+    assert time.monotonic() - start_time < 0.38
+
+def test_starts_stages_as_soon_as_their_inputs_are_ready():
+    graph = StageGraph([
+        make_sleeping_stage("slow", delay = 0.3),
+        make_sleeping_stage("fast", delay = 0.05),
+        make_sleeping_stage("after_fast", ["fast"], delay = 0.05)
+    ])
+    
+    names = [name for name, _ in graph.iter_run()]
+    
+    assert names.index("after_fast") < names.index("slow")
+
+def test_skips_stages_with_initial_values_and_honours_targets():
+    graph = StageGraph([
+        make_sleeping_stage("a", delay = 0),
+        make_sleeping_stage("b", ["a"], delay = 0),
+        make_sleeping_stage("c", ["b"], delay = 0)
+    ])
+    
+    assert [name for name, _ in graph.iter_run(initial_values = {"a": "cached"})] == ["b", "c"]
+    assert [name for name, _ in graph.iter_run(targets = ["b"])] == ["a", "b"]
+
+def test_maps_inputs_to_arguments():
+    graph = StageGraph([
+        Stage(name = "a", func = lambda: 2),
+        Stage(name = "b", func = lambda value: value * 10, inputs = {"value": "a"})
+    ])
+    
+    assert graph.run()["b"] == 20
+
+def test_rejects_cycles_and_missing_inputs():
+    with pytest.raises(ValueError):
+        StageGraph([
+            make_sleeping_stage("a", ["b"]),
+            make_sleeping_stage("b", ["a"])
+        ])
+        
+    with pytest.raises(ValueError):
+        StageGraph([make_sleeping_stage("a", ["missing"])]).run()
+
+def test_propagates_stage_errors():
+    def fail():
+        raise RuntimeError("boom")
+    
+    graph = StageGraph([
+        Stage(name = "a", func = fail),
+        make_sleeping_stage("b", ["a"])
+    ])
+    
+    with pytest.raises(RuntimeError):
+        graph.run()
+
+def test_critical_path():
+    graph = StageGraph([
+        make_sleeping_stage("outline"),
+        make_sleeping_stage("meta", ["outline"]),
+        make_sleeping_stage("enrich", ["outline"], estimated_duration = 3),
+        make_sleeping_stage("content", ["enrich"])
+    ])
+    
+    assert graph.critical_path() == (5.0, ["outline", "enrich", "content"])
+    assert graph.critical_path({"meta": 10}) == (11.0, ["outline", "meta"])
+    assert "Critical path: outline -> enrich -> content" in graph.describe()
+
+class MemoryCheckpoints():
+    def __init__(self):
+        self.values = {}
+    
+    def has(self, name):
+        return name in self.values
+    
+    def save(self, name, value, value_type):
+        self.values[name] = value_type(value)
+    
+    def load(self, name, value_type):
+        return self.values[name]
+
+def test_resumes_from_checkpoints():
+    calls = []
+    
+    def make_stage(name, inputs = (), fail = False):
+        def func(**values):
+            calls.append(name)
+            
+            if fail:
+                raise RuntimeError(f"{name} failed")
+            
+            return f"{name}({', '.join(values[input_name] for input_name in sorted(values))})"
+        
+        return Stage(name = name, func = func, inputs = inputs, output_type = str)
+    
+    checkpoints = MemoryCheckpoints()
+    
+    with pytest.raises(RuntimeError, match = "c failed"):
+        StageGraph([make_stage("a"), make_stage("b", ["a"]), make_stage("c", ["b"], fail = True)]).run(checkpoints = checkpoints)
+        
+    assert sorted(checkpoints.values) == ["a", "b"]
+    
+    calls.clear()
+    values = StageGraph([make_stage("a"), make_stage("b", ["a"]), make_stage("c", ["b"])]).run(checkpoints = checkpoints)
+    
+    assert calls == ["c"]
+    assert values["c"] == "c(b(a()))"
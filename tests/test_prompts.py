@@ -0,0 +1,35 @@
+import sys
+sys.path.append("..")
+
+import os
+
+from modules.prompts import PromptRegistry
+
+# ==
+def test_reloads_only_edited_templates(tmp_path):
+    prompt_file = tmp_path / "outliner.txt"
+    prompt_file.write_text("first version")
+    
+    registry = PromptRegistry(
+        prompts_directory = str(tmp_path)
+    )
+    
+    first_mtime, system_prompt = registry.get_system_prompt("outliner")
+    assert system_prompt == "first version"
+    
+    prompt_file.write_text("second version")
+    os.utime(prompt_file, ns = (first_mtime + 10 ** 9, first_mtime + 10 ** 9))
+    
+    second_mtime, system_prompt = registry.get_system_prompt("outliner")
+    assert system_prompt == "second version"
+    assert second_mtime != first_mtime
+
+def test_loads_repo_prompts():
+    registry = PromptRegistry(
+        prompts_directory = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "prompts")
+    )
+    
+    for prompt_name in ["presentation_outliner", "documents_enricher", "meta_slides_maker", "slides_planner"]:
+        _, system_prompt = registry.get_system_prompt(prompt_name)
+        
+        assert len(system_prompt) > 0
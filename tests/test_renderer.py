@@ -0,0 +1,112 @@
+import os
+import sys
+sys.path.append("..")
+
+import base64
+import zipfile
+
+from io import BytesIO
+
+import pytest
+
+from lxml import etree
+from pptx import Presentation
+
+from benchmarks.fakes import make_template, make_deck
+from benchmarks.formatting import set_formatted_content_reference
+from modules.converter import PresentationRenderer, get_renderer, slide_renderers, presentation2pptx, set_formatted_content
+from modules.core import SlidesgenPresentation, TitleSlide, SectionTransitionSlides
+
+# ==
+def test_every_slide_type_has_a_renderer():
+    deck = make_deck(30)
+    
+    assert {type(slide) for slide in deck.slides} <= set(slide_renderers)
+
+def test_renders_many_decks_from_one_template(tmp_path):
+    template_file = make_template(str(tmp_path / "template.pptx"))
+    renderer = PresentationRenderer(template_file)
+    
+    for deck_index, num_slides in enumerate([10, 20]):
+        deck = make_deck(num_slides)
+        output_file = str(tmp_path / f"output_{deck_index}.pptx")
+        
+        renderer.render(deck, output_file)
+        
+        slides = Presentation(output_file).slides
+        
+        # The 8 prototype slides come first, then one slide per deck slide
+        assert len(slides) == 8 + len(deck.slides)
+        assert slides[8].shapes[0].text_frame.text == deck.slides[0].master_title
+
+def test_skips_slides_without_renderer(tmp_path):
+    template_file = make_template(str(tmp_path / "template.pptx"))
+    
+    presentation = SlidesgenPresentation()
+    presentation.slides = [TitleSlide(master_title = "Title", subtitle = "Subtitle"), SectionTransitionSlides(slides = [])]
+    
+    presentation2pptx(presentation, template_file, str(tmp_path / "output.pptx"))
+    
+    assert len(Presentation(str(tmp_path / "output.pptx")).slides) == 8 + 1
+
+def test_renderer_is_rebuilt_when_template_changes(tmp_path):
+    template_file = make_template(str(tmp_path / "template.pptx"))
+    renderer = get_renderer(template_file)
+    
+    assert get_renderer(template_file) is renderer
+    
+    make_template(template_file)
+    os.utime(template_file, ns = (0, os.stat(template_file).st_mtime_ns + 1000))
+    
+    assert get_renderer(template_file) is not renderer
+
+@pytest.mark.parametrize("content", [
+    "- first bullet\n- second & <third>\n> a paragraph\nplain line",
+    "  - indented bullet\n>\n-\n\n  ",
+    "tab\tand bell\x07 and\vsoft break\r",
+    ""
+])
+def test_fast_formatting_matches_reference(content):
+    presentation = Presentation()
+    slide = presentation.slides.add_slide(presentation.slide_layouts[1])
+    
+    reference_shape, shape = slide.shapes[0], slide.shapes[1]
+    
+    set_formatted_content_reference(reference_shape, content)
+    set_formatted_content(shape, content)
+    
+    assert [etree.tostring(p) for p in reference_shape.text_frame._txBody.p_lst] == [etree.tostring(p) for p in shape.text_frame._txBody.p_lst]
+
+def add_picture_to_prototype(template_file, image_file):
+    # 1x1 transparent PNG
+    with open(image_file, 'wb') as file:
+        file.write(base64.b64decode("iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg=="))
+        
+    template = Presentation(template_file)
+    template.slides[0].shapes.add_picture(image_file, 0, 0)
+    template.save(template_file)
+
+def test_lean_render_drops_prototypes_and_their_media(tmp_path):
+    template_file = make_template(str(tmp_path / "template.pptx"))
+    add_picture_to_prototype(template_file, str(tmp_path / "image.png"))
+    
+    renderer = PresentationRenderer(template_file)
+    deck = make_deck(12)
+    
+    full_output = BytesIO()
+    renderer.render(deck, full_output)
+    
+    lean_output = renderer.render_to_bytes(deck)
+    
+    full_names = zipfile.ZipFile(full_output).namelist()
+    lean_names = zipfile.ZipFile(BytesIO(lean_output)).namelist()
+    
+    assert any(name.startswith("ppt/media/") for name in full_names)
+    assert not any(name.startswith("ppt/media/") for name in lean_names)
+    assert len(lean_names) == len(set(lean_names))
+    
+    slides = Presentation(BytesIO(lean_output)).slides
+    
+    assert len(slides) == len(deck.slides)
+    assert slides[0].shapes[0].text_frame.text == deck.slides[0].master_title
+    assert len(lean_output) < len(full_output.getvalue())
@@ -0,0 +1,165 @@
+import sys
+sys.path.append("..")
+
+import time
+import threading
+
+from modules.search import TokenBucket, SearchScheduler
+
+# ==
+class FakeSearch():
+    def __init__(self, delay = 0.0, errors = None):
+        self.delay = delay
+        self.errors = list(errors or [])
+        
+        self.num_calls = 0
+        self.max_running = 0
+        
+        self._running = 0
+        self._lock = threading.Lock()
+        
+    def get_cached(self, query):
+        return None
+        
+    def invoke(self, query):
+        with self._lock:
+            self.num_calls += 1
+            self._running += 1
+            self.max_running = max(self.max_running, self._running)
+            
+            error = self.errors.pop(0) if self.errors else None
+            
+        try:
+            time.sleep(self.delay)
+            
+            if error is not None:
+                raise error
+            
+            return f"results for {query}"
+        
+        finally:
+            with self._lock:
+                self._running -= 1
+
+# ==
+def test_token_bucket_limits_rate():
+    bucket = TokenBucket(
+        rate = 20,
+        capacity = 1
+    )
+    
+    start_time = time.monotonic()
+    
+    for _ in range(5):
+        bucket.acquire()
+        
+    assert time.monotonic() - start_time >= 0.15
+
+def test_runs_queries_concurrently_in_order():
+    search = FakeSearch(delay = 0.1)
+    
+    scheduler = SearchScheduler(
+        search = search,
+        rate = 100, burst = 4, max_concurrency = 4
+    )
+    
+    start_time = time.monotonic()
+    results = scheduler.search_many(["a", "b", "c", "d"])
+    
+    assert results == ["results for a", "results for b", "results for c", "results for d"]
+    assert search.max_running > 1
+    assert time.monotonic() - start_time < 0.35
+
+def test_retries_throttled_queries_with_backoff():
+    search = FakeSearch(errors = [Exception("202 Ratelimit")])
+    
+    scheduler = SearchScheduler(
+        search = search,
+        rate = 100, burst = 4, initial_backoff = 0.05
+    )
+    
+    assert scheduler.search("a") == "results for a"
+    assert search.num_calls == 2
+
+def test_gives_up_on_other_errors():
+    search = FakeSearch(errors = [ValueError("bad query")])
+    
+    scheduler = SearchScheduler(
+        search = search,
+        rate = 100, burst = 4
+    )
+    
+    assert scheduler.search("a") is None
+    assert search.num_calls == 1
+
+def test_times_out_slow_queries():
+    scheduler = SearchScheduler(
+        search = FakeSearch(delay = 0.5),
+        rate = 100, burst = 4, timeout = 0.05
+    )
+    
+    start_time = time.monotonic()
+    
+    assert scheduler.search("a") is None
+    assert time.monotonic() - start_time < 0.3
+
+def test_timeouts_do_not_count_the_wait_for_the_rate_budget():
+    scheduler = SearchScheduler(
+        search = FakeSearch(),
+        rate = 10, burst = 3, max_concurrency = 4, timeout = 0.3
+    )
+    
+    queries = [f"r{index}" for index in range(8)]
+    
+    assert scheduler.search_many(queries) == [f"results for {query}" for query in queries]
+
+def test_timed_out_queries_are_not_retried():
+    search = FakeSearch(delay = 0.2, errors = [Exception("202 Ratelimit")])
+    
+    scheduler = SearchScheduler(
+        search = search,
+        rate = 100, burst = 4, timeout = 0.05, initial_backoff = 0.05
+    )
+    
+    assert scheduler.search("a") is None
+    
+    time.sleep(0.4)
+    
+    assert search.num_calls == 1
+
+def test_hung_searches_do_not_block_later_queries():
+    release = threading.Event()
+    
+    class HangingSearch(FakeSearch):
+        def invoke(self, query):
+            if query.startswith("hang"):
+                release.wait()
+                
+            return super().invoke(query)
+    
+    scheduler = SearchScheduler(
+        search = HangingSearch(),
+        rate = 100, burst = 10, max_concurrency = 2, timeout = 0.1
+    )
+    
+    try:
+        start_time = time.monotonic()
+        
+        # More hung calls than the scheduler has workers
+        assert scheduler.search_many([f"hang {index}" for index in range(4)]) == [None] * 4
+        assert scheduler.search_many(["a", "b"]) == ["results for a", "results for b"]
+        assert time.monotonic() - start_time < 0.6
+        
+    finally:
+        release.set()
+
+def test_gives_up_on_queries_that_cannot_run_in_time():
+    scheduler = SearchScheduler(
+        search = FakeSearch(),
+        rate = 1, burst = 1, max_concurrency = 1, max_wait = 0.2
+    )
+    
+    start_time = time.monotonic()
+    
+    assert scheduler.search_many(["a", "b", "c"]) == ["results for a", None, None]
+    assert time.monotonic() - start_time < 0.5
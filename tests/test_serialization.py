@@ -0,0 +1,72 @@
+import os
+import sys
+sys.path.append("..")
+
+import json
+
+from io import BytesIO
+
+import pytest
+
+from pydantic import ValidationError
+
+from benchmarks.fakes import make_deck
+from modules.serialization import slide_types, encode_json, decode_json, encode_msgpack, decode_msgpack, write_slides, iter_slides, save_presentation, load_presentation
+
+# ==
+def test_every_slide_type_has_a_tag():
+    deck = make_deck(30)
+
+    assert {type(slide) for slide in deck.slides} <= set(slide_types.values())
+    assert all(slide["type"] in slide_types for slide in json.loads(encode_json(deck))["slides"])
+
+@pytest.mark.parametrize("encode, decode", [(encode_json, decode_json), (encode_msgpack, decode_msgpack)])
+def test_round_trips_every_slide_type(encode, decode):
+    deck = make_deck(40)
+    decoded_deck = decode(encode(deck))
+
+    assert decoded_deck == deck
+    assert [type(slide) for slide in decoded_deck.slides] == [type(slide) for slide in deck.slides]
+
+def test_loads_untagged_presentations():
+    deck = make_deck(20)
+
+    assert decode_json(deck.model_dump_json()) == deck
+
+def test_rejects_newer_and_foreign_documents():
+    document = json.loads(encode_json(make_deck(5)))
+
+    with pytest.raises(ValueError, match = "newer"):
+        decode_json(json.dumps({**document, "version": 99}))
+
+    with pytest.raises(ValueError, match = "unknown format"):
+        decode_json(json.dumps({**document, "format": "something.else"}))
+
+    with pytest.raises(ValidationError):
+        decode_json(json.dumps({**document, "slides": [{"type": "quote", "quote": "No author"}]}))
+
+@pytest.mark.parametrize("encoding", ["jsonl", "msgpack"])
+def test_streams_slides_one_at_a_time(encoding):
+    deck = make_deck(50)
+    stream = BytesIO()
+
+    assert write_slides(iter(deck.slides), stream, encoding = encoding) == len(deck.slides)
+
+    stream.seek(0)
+    slides = iter_slides(stream, encoding = encoding)
+
+    assert next(slides) == deck.slides[0]
+    assert [deck.slides[0]] + list(slides) == deck.slides
+
+@pytest.mark.parametrize("extension", [".json", ".jsonl", ".msgpack"])
+def test_saves_and_loads_files(tmp_path, extension):
+    deck = make_deck(25)
+    file = str(tmp_path / "decks" / f"deck{extension}")
+
+    save_presentation(deck, file)
+
+    assert os.listdir(tmp_path / "decks") == [f"deck{extension}"]
+    assert load_presentation(file) == deck
+
+    with pytest.raises(ValueError, match = "extension"):
+        save_presentation(deck, str(tmp_path / "deck.txt"))
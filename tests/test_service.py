@@ -0,0 +1,107 @@
+import os
+import sys
+sys.path.append("..")
+
+import json
+import asyncio
+import threading
+
+from io import BytesIO
+
+import pytest
+
+from aiohttp.test_utils import TestServer, TestClient
+from pptx import Presentation
+
+from benchmarks.fakes import install_fakes, make_template
+from modules import checkpoints
+from modules.service import make_app
+from modules.components import reset_components
+
+# ==
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setattr(checkpoints, "checkpoints_directory", str(tmp_path / "runs"))
+    
+    install_fakes(
+        llm_latency = 0.01,
+        search_latency = 0.0,
+        num_sections = 2,
+        slides_per_section = 2
+    )
+    
+    yield make_app(
+        output_directory = str(tmp_path / "jobs"),
+        template_file = make_template(str(tmp_path / "template.pptx")),
+        num_workers = 2,
+        max_queued_jobs = 2
+    )
+    
+    reset_components()
+
+def parse_events(text):
+    events = []
+    
+    for block in text.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.split("\n") if not line.startswith(":"))
+        events.append((int(fields["id"]), fields["event"], json.loads(fields["data"])))
+        
+    return events
+
+async def run_client(app, scenario):
+    async with TestClient(TestServer(app)) as client:
+        return await scenario(client)
+
+# ==
+def test_streams_progress_and_serves_the_pptx(app):
+    async def scenario(client):
+        response = await client.post("/jobs", json = {"id": "solar", "instruction": "Solar energy"})
+        
+        assert response.status == 202
+        
+        events = parse_events(await (await client.get("/jobs/solar/events")).text())
+        
+        # A reconnecting client only gets what it missed
+        replayed_events = parse_events(await (await client.get("/jobs/solar/events", headers = {"Last-Event-ID": str(events[-3][0])})).text())
+        
+        status = await (await client.get("/jobs/solar")).json()
+        pptx = await (await client.get("/jobs/solar/presentation.pptx")).read()
+        resubmitted = await client.post("/jobs", json = {"id": "solar", "instruction": "Solar energy"})
+        
+        return events, replayed_events, status, pptx, resubmitted.status
+    
+    events, replayed_events, status, pptx, resubmitted_status = asyncio.run(run_client(app, scenario))
+    names = [name for _, name, _ in events]
+    
+    assert names[:2] == ["status", "status"] and names[-1] == "done"
+    assert {"presentation_outline", "meta_slides", "content_slides_0", "content_slides_1"} <= {data["stage"] for _, name, data in events if name == "stage"}
+    
+    slides = [data for _, name, data in events if name == "slide"]
+    
+    assert [slide["index"] for slide in slides] == list(range(2 + 2 * 3 + 1))
+    assert slides[0]["slide"]["type"] == "title"
+    assert events[-1][2]["pptx_url"] == "/jobs/solar/presentation.pptx"
+    
+    assert replayed_events == events[-2:]
+    assert status["status"] == "done" and status["num_slides"] == len(slides)
+    # Followed by the template's 8 prototype slides, as presentation2pptx keeps them
+    assert len(Presentation(BytesIO(pptx)).slides) == len(slides) + 8
+    assert resubmitted_status == 200
+
+def test_rejects_invalid_jobs_and_a_full_queue(app):
+    async def scenario(client):
+        invalid = await client.post("/jobs", json = {"documents": []})
+        pending = await client.get("/jobs/missing/presentation.pptx")
+        
+        statuses = [(await client.post("/jobs", json = {"instruction": f"Topic {index}"})).status for index in range(8)]
+        
+        return invalid.status, pending.status, statuses
+    
+    invalid_status, pending_status, statuses = asyncio.run(run_client(app, scenario))
+    
+    assert invalid_status == 400
+    assert pending_status == 404
+    assert 503 in statuses and statuses[0] == 202
+    
+    # Jobs still running when the server stopped were waited for
+    assert not any(thread.name.startswith("slidesgen_job") for thread in threading.enumerate())
@@ -0,0 +1,159 @@
+import sys
+sys.path.append("..")
+
+from langchain_core.documents import Document
+
+from benchmarks.fakes import HashEmbeddings
+from modules.metrics import RunMetrics
+from modules.vector_stores import ChromaDB, hash_file, make_chunk_ids
+
+# ==
+class CountingEmbeddings(HashEmbeddings):
+    def __init__(self):
+        super().__init__()
+        
+        self.num_calls = 0
+        
+    def embed_documents(self, texts):
+        self.num_calls += 1
+        
+        return super().embed_documents(texts)
+
+def make_vector_store(tmp_path, embeddings = None):
+    return ChromaDB(
+        collection_name = "chunks",
+        embeddings_provider = None,
+        embeddings_model_name = None,
+        persist_directory = str(tmp_path / "chroma"),
+        chunk_size = 64,
+        chunk_overlap = 0,
+        embeddings = embeddings or HashEmbeddings()
+    )
+
+def write_document(document_file, content):
+    document_file.write_text(content, encoding = "utf-8")
+    
+    return str(document_file), hash_file(document_file)
+
+def get_stored_ids(vector_store, file_hash, num_chunks):
+    return vector_store._vector_store.get(ids = make_chunk_ids(file_hash, num_chunks), include = [])["ids"]
+
+long_content = " ".join(f"Solar panel fact number {index}." for index in range(20))
+
+# ==
+def test_adding_the_same_chunks_again_stores_them_once(tmp_path):
+    vector_store = make_vector_store(tmp_path)
+    
+    documents = [Document(page_content = f"Search result {index} about solar panels.") for index in range(3)]
+    
+    for _ in range(3):
+        vector_store.add_documents(documents + documents[:1])
+        
+    results = vector_store.similarity_search("solar panels", num_chunks = 10)
+    
+    assert sorted(document.page_content for document in results) == sorted(document.page_content for document in documents)
+
+def test_counts_cache_hits_of_similarity_searches(tmp_path):
+    vector_store = make_vector_store(tmp_path)
+    vector_store.add_documents([Document(page_content = "Wind turbines produce electricity.")])
+    
+    run_metrics = RunMetrics("run")
+    
+    for query in ("wind", "wind", "turbines"):
+        run_metrics.bind(vector_store.similarity_search)(query, num_chunks = 1)
+        
+    operation = run_metrics.report()["operations"]["vector_store:similarity_search"]
+    
+    assert (operation["calls"], operation["cache_hits"], operation["cache_misses"]) == (3, 1, 2)
+
+def test_chunks_of_a_run_are_only_found_by_that_run(tmp_path):
+    vector_store = make_vector_store(tmp_path)
+    
+    document_file = tmp_path / "notes.txt"
+    document_file.write_text("User notes about solar panels.", encoding = "utf-8")
+    
+    vector_store.add_document_from_txt_file(str(document_file))
+    vector_store.add_documents([Document(page_content = "Web result about solar panels.")], run_id = "run-a")
+    
+    def search(**kwargs):
+        return sorted(document.page_content for document in vector_store.similarity_search("solar panels", num_chunks = 10, **kwargs))
+    
+    assert search() == ["User notes about solar panels."]
+    assert search(run_id = "run-b") == ["User notes about solar panels."]
+    assert search(run_id = "run-a") == ["User notes about solar panels.", "Web result about solar panels."]
+    assert search(file_hashes = [], run_id = "run-a") == ["Web result about solar panels."]
+    assert search(file_hashes = ["other"], run_id = "run-b") == []
+
+def test_reusing_a_copy_that_is_gone_leaves_the_file_unrecorded(tmp_path):
+    vector_store = make_vector_store(tmp_path)
+    
+    document_file = str(tmp_path / "notes.txt")
+    
+    assert vector_store.record_indexed_files({document_file: ("gone", None)}) == [document_file]
+    assert not vector_store.is_indexed(document_file, "gone")
+
+def test_unchanged_files_are_not_embedded_again(tmp_path):
+    embeddings = CountingEmbeddings()
+    document_file, _ = write_document(tmp_path / "solar.txt", long_content)
+    
+    make_vector_store(tmp_path, embeddings).add_document_from_txt_file(document_file)
+    assert embeddings.num_calls == 1
+    
+    # Neither by the same store nor by a new one reading the manifest back
+    make_vector_store(tmp_path, embeddings).add_document_from_txt_file(document_file)
+    assert embeddings.num_calls == 1
+
+def test_changed_files_drop_their_old_chunks(tmp_path):
+    vector_store = make_vector_store(tmp_path)
+    
+    document_file, old_hash = write_document(tmp_path / "solar.txt", long_content)
+    vector_store.add_document_from_txt_file(document_file)
+    
+    num_old_chunks = len(get_stored_ids(vector_store, old_hash, 100))
+    assert num_old_chunks > 1
+    
+    _, new_hash = write_document(tmp_path / "solar.txt", "Wind turbines spin.")
+    vector_store.add_document_from_txt_file(document_file)
+    
+    assert get_stored_ids(vector_store, old_hash, num_old_chunks) == []
+    assert get_stored_ids(vector_store, new_hash, 1) == [f"{new_hash}-0"]
+
+def test_identical_files_are_embedded_once(tmp_path):
+    embeddings = CountingEmbeddings()
+    vector_store = make_vector_store(tmp_path, embeddings)
+    
+    for name in ("solar.txt", "copy.txt"):
+        document_file, _ = write_document(tmp_path / name, long_content)
+        vector_store.add_document_from_txt_file(document_file)
+        
+        assert vector_store.is_indexed(document_file)
+    
+    assert embeddings.num_calls == 1
+
+def test_chunks_shared_with_another_file_survive_its_change(tmp_path):
+    vector_store = make_vector_store(tmp_path)
+    
+    document_file, shared_hash = write_document(tmp_path / "solar.txt", long_content)
+    copy_file, _ = write_document(tmp_path / "copy.txt", long_content)
+    
+    for file in (document_file, copy_file):
+        vector_store.add_document_from_txt_file(file)
+    
+    num_shared_chunks = len(get_stored_ids(vector_store, shared_hash, 100))
+    
+    write_document(tmp_path / "solar.txt", "Wind turbines spin.")
+    vector_store.add_document_from_txt_file(document_file)
+    
+    # copy.txt still uses them
+    assert len(get_stored_ids(vector_store, shared_hash, num_shared_chunks)) == num_shared_chunks
+    assert vector_store.is_indexed(copy_file)
+
+def test_manifest_is_replaced_without_leftover_files(tmp_path):
+    vector_store = make_vector_store(tmp_path)
+    
+    for name in ("solar.txt", "wind.txt"):
+        document_file, _ = write_document(tmp_path / name, f"Notes from {name}.")
+        vector_store.add_document_from_txt_file(document_file)
+    
+    assert sorted(file.name for file in (tmp_path / "chroma").iterdir() if file.is_file()) == ["chroma.sqlite3", "chunks_manifest.json"]
+    assert make_vector_store(tmp_path).is_indexed(str(tmp_path / "wind.txt"))